@@ -8,6 +8,7 @@ import subprocess
 from os import getpid
 import socket
 from utils.jwt import JWTBearer
+from utils import io_executor
 
 
 router = APIRouter()
@@ -99,3 +100,8 @@ async def get_in_loop_tasks(_=Depends(JWTBearer())) -> api.Response:
             "tasks": tasks_data
         },
     )
+
+
+@router.get("/io-executor", include_in_schema=False)
+async def get_io_executor_stats(_=Depends(JWTBearer())) -> api.Response:
+    return api.Response(status=api.Status.success, attributes=io_executor.stats())
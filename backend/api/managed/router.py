@@ -1,12 +1,11 @@
 from copy import copy
 import csv
 from datetime import datetime
-import hashlib
 import os
 from re import sub as res_sub
 from time import time
-from fastapi import APIRouter, Body, Depends, Query, UploadFile, Path, Form, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Body, Depends, Header, Query, Response, UploadFile, Path, Form, status
+from fastapi.responses import FileResponse, JSONResponse
 from starlette.responses import StreamingResponse
 from utils.generate_email import generate_email_from_template, generate_subject
 from utils.custom_validations import validate_csv_with_schema, validate_jsonl_with_schema, validate_uniqueness
@@ -29,16 +28,17 @@ from models.enums import (
     TaskType,
 )
 import utils.db as db
+from utils import storage_codec
 import utils.regex as regex
 import sys
 import json
 from utils.jwt import JWTBearer, GetJWTToken, remove_redis_active_session
 from utils.access_control import access_control
 from utils.spaces import get_spaces, initialize_spaces
-from typing import Any
+from typing import Annotated, Any
 import utils.repository as repository
+from utils import query_stream
 from utils.helpers import (
-    branch_path,
     camel_case,
     csv_file_to_json,
     flatten_dict,
@@ -177,14 +177,19 @@ async def csv_entries(query: api.Query, user_shortname=Depends(JWTBearer())):
     new_keys: set = set()
     deprecated_keys: set = set()
     async with RedisServices() as redis_services:
-        for redis_document in search_res:
-            redis_doc_dict = json.loads(redis_document)
+        redis_docs = [json.loads(redis_document) for redis_document in search_res]
+        payload_docs = await redis_services.get_docs_map(
+            [doc["payload_doc_id"] for doc in redis_docs if doc.get("payload_doc_id")]
+            if query.retrieve_json_payload else []
+        )
+        for redis_doc_dict in redis_docs:
             if (
                     redis_doc_dict.get("payload_doc_id")
                     and query.retrieve_json_payload
             ):
-                payload_doc_content = await redis_services.get_payload_doc(
-                    redis_doc_dict["payload_doc_id"], redis_doc_dict["resource_type"]
+                payload_doc_content = redis_services.payload_doc_content(
+                    payload_docs.get(redis_doc_dict["payload_doc_id"]),
+                    redis_doc_dict["resource_type"],
                 )
                 redis_doc_dict.update(payload_doc_content)
 
@@ -486,8 +491,10 @@ async def serve_space(
 
 @router.post("/query", response_model=api.Response, response_model_exclude_none=True)
 async def query_entries(
-        query: api.Query, user_shortname=Depends(JWTBearer())
-) -> api.Response:
+        query: api.Query,
+        user_shortname=Depends(JWTBearer()),
+        accept: Annotated[str | None, Header()] = None,
+) -> api.Response | StreamingResponse:
     await plugin_manager.before_action(
         core.Event(
             space_name=query.space_name,
@@ -503,23 +510,28 @@ async def query_entries(
         user_shortname, query.space_name, query.subpath
     )
 
-    total, records = await repository.serve_query(
-        query, user_shortname, redis_query_policies
+    after_event = core.Event(
+        space_name=query.space_name,
+        branch_name=query.branch_name,
+        subpath=query.subpath,
+        action_type=core.ActionType.query,
+        user_shortname=user_shortname,
     )
-
-    await plugin_manager.after_action(
-        core.Event(
-            space_name=query.space_name,
-            branch_name=query.branch_name,
-            subpath=query.subpath,
-            action_type=core.ActionType.query,
-            user_shortname=user_shortname,
+    if query_stream.is_requested(accept):
+        streamed_response = await query_stream.response(
+            repository.serve_query_chunks(query, user_shortname, redis_query_policies)
         )
+        await plugin_manager.after_action(after_event)
+        return streamed_response
+
+    total, records, next_cursor = await repository.serve_query_page(
+        query, user_shortname, redis_query_policies
     )
+    await plugin_manager.after_action(after_event)
     return api.Response(
         status=api.Status.success,
         records=records,
-        attributes={"total": total, "returned": len(records)},
+        attributes={"total": total, "returned": len(records), "next_cursor": next_cursor},
     )
 
 
@@ -1575,7 +1587,7 @@ async def retrieve_entry_or_attachment_payload(
         ext: str = Path(..., pattern=regex.EXT, examples=["png"]),
         logged_in_user=Depends(JWTBearer()),
         branch_name: str | None = settings.default_branch,
-) -> FileResponse:
+) -> Response:
     await plugin_manager.before_action(
         core.Event(
             space_name=space_name,
@@ -1649,7 +1661,14 @@ async def retrieve_entry_or_attachment_payload(
         )
     )
 
-    return FileResponse(payload_path / str(meta.payload.body))
+    payload_file = payload_path / str(meta.payload.body)
+    if (
+            meta.payload.content_type == ContentType.json
+            and payload_file.is_file()
+            and storage_codec.is_encoded_file(payload_file)
+    ):
+        return JSONResponse(storage_codec.loads(payload_file.read_bytes()))
+    return FileResponse(payload_file)
 
 
 @router.post(
@@ -1745,19 +1764,6 @@ async def create_or_update_resource_with_payload(
             ),
         )
 
-    sha1 = hashlib.sha1()
-    sha1.update(payload_file.file.read())
-    checksum = sha1.hexdigest()
-    if isinstance(sha, str) and sha != checksum:
-        raise api.Exception(
-            status.HTTP_400_BAD_REQUEST,
-            api.Error(
-                type="request",
-                code=InternalErrorCode.INVALID_DATA,
-                message="The provided file doesn't match the sha",
-            ),
-        )
-    await payload_file.seek(0)
     if record.resource_type == ResourceType.ticket:
         record = await set_init_state_from_record(
             record, record.branch_name, owner_shortname, space_name
@@ -1768,15 +1774,6 @@ async def create_or_update_resource_with_payload(
         record = await set_init_state_from_record(
             record, record.branch_name, owner_shortname, space_name
         )
-    resource_obj.payload = core.Payload(
-        content_type=resource_content_type,
-        checksum=checksum,
-        client_checksum=sha if isinstance(sha, str) else None,
-        schema_shortname="meta_schema"
-        if record.resource_type == ResourceType.schema
-        else record.attributes.get("payload", {}).get("schema_shortname", None),
-        body=f"{record.shortname}." + payload_filename.split(".")[1],
-    )
     if (
             not isinstance(resource_obj, core.Attachment)
             and not isinstance(resource_obj, core.Content)
@@ -1792,23 +1789,56 @@ async def create_or_update_resource_with_payload(
             ),
         )
 
-    resource_obj.payload.body = f"{resource_obj.shortname}." + \
-                                payload_filename.split(".")[1]
-
-    if (
-            resource_content_type == ContentType.json
-            and resource_obj.payload.schema_shortname
-    ):
-        await validate_payload_with_schema(
-            payload_data=payload_file,
-            space_name=space_name,
-            branch_name=record.branch_name or settings.default_branch,
-            schema_shortname=resource_obj.payload.schema_shortname,
+    # The checksum is computed while streaming the upload to disk
+    staged_file, checksum = await db.stage_payload(
+        space_name, record.subpath, resource_obj, payload_file, record.branch_name
+    )
+    try:
+        if isinstance(sha, str) and sha != checksum:
+            raise api.Exception(
+                status.HTTP_400_BAD_REQUEST,
+                api.Error(
+                    type="request",
+                    code=InternalErrorCode.INVALID_DATA,
+                    message="The provided file doesn't match the sha",
+                ),
+            )
+        resource_obj.payload = core.Payload(
+            content_type=resource_content_type,
+            checksum=checksum,
+            client_checksum=sha if isinstance(sha, str) else None,
+            schema_shortname="meta_schema"
+            if record.resource_type == ResourceType.schema
+            else record.attributes.get("payload", {}).get("schema_shortname", None),
+            body=f"{record.shortname}." + payload_filename.split(".")[1],
         )
 
-    await db.save(space_name, record.subpath, resource_obj, record.branch_name)
+        resource_obj.payload.body = f"{resource_obj.shortname}." + \
+                                    payload_filename.split(".")[1]
+
+        if (
+                resource_content_type == ContentType.json
+                and resource_obj.payload.schema_shortname
+        ):
+            await payload_file.seek(0)
+            await validate_payload_with_schema(
+                payload_data=payload_file,
+                space_name=space_name,
+                branch_name=record.branch_name or settings.default_branch,
+                schema_shortname=resource_obj.payload.schema_shortname,
+            )
+
+        await db.save(space_name, record.subpath, resource_obj, record.branch_name)
+    except BaseException:
+        await db.discard_staged_payload(staged_file)
+        raise
     await db.save_payload(
-        space_name, record.subpath, resource_obj, payload_file, record.branch_name
+        space_name,
+        record.subpath,
+        resource_obj,
+        payload_file,
+        record.branch_name,
+        staged_file=staged_file,
     )
 
     await plugin_manager.after_action(
@@ -1856,8 +1886,7 @@ async def import_resources_from_csv(
             db.payload_path(space_name, "schema", core.Schema, branch_name)
             / f"{schema_shortname}.json"
     )
-    with open(schema_path) as schema_file:
-        schema_content = json.load(schema_file)
+    schema_content = storage_codec.loads(schema_path.read_bytes())
     schema_content = resolve_schema_references(schema_content)
 
     data_types_mapper: dict[str, Callable] = {
@@ -1874,6 +1903,7 @@ async def import_resources_from_csv(
     meta_class_attributes = resource_cls.model_fields
     failed_shortnames: list = []
     success_count = 0
+    batch: list[core.Record] = []
     for row in csv_reader:
         shortname: str = ""
         meta_object: dict = {}
@@ -1954,13 +1984,56 @@ async def import_resources_from_csv(
                 "schema_shortname": schema_shortname,
                 "body": payload_object,
             }
-            record = core.Record(
-                resource_type=resource_type,
-                shortname=shortname,
-                subpath=subpath,
-                branch_name=branch_name,
-                attributes=attributes,
+            batch.append(
+                core.Record(
+                    resource_type=resource_type,
+                    shortname=shortname,
+                    subpath=subpath,
+                    branch_name=branch_name,
+                    attributes=attributes,
+                )
             )
+            if len(batch) >= settings.bulk_import_batch_size:
+                batch_success_count, batch_failed_shortnames = await create_records_batch(
+                    space_name, batch, owner_shortname, branch_name
+                )
+                success_count += batch_success_count
+                failed_shortnames.extend(batch_failed_shortnames)
+                batch = []
+
+    if batch:
+        batch_success_count, batch_failed_shortnames = await create_records_batch(
+            space_name, batch, owner_shortname, branch_name
+        )
+        success_count += batch_success_count
+        failed_shortnames.extend(batch_failed_shortnames)
+
+    return api.Response(
+        status=api.Status.success,
+        attributes={
+            "success_count": success_count,
+            "failed_shortnames": failed_shortnames,
+        },
+    )
+
+
+async def create_records_batch(
+        space_name: str,
+        records: list[core.Record],
+        owner_shortname: str,
+        branch_name: str | None,
+) -> tuple[int, list[str]]:
+    """Create the records of one import batch, returns the success count and the failed shortnames
+
+    All the records share the same subpath and resource type. Their files are written
+    in parallel through db.create_many, and the plugins are notified of the events of
+    all the records at once, see PluginBase.hook_many
+    """
+    failed_shortnames: list[str] = []
+    if records[0].resource_type in [ResourceType.ticket, ResourceType.user]:
+        # Tickets and users need their per entry workflow and invitations
+        success_count = 0
+        for record in records:
             try:
                 await serve_request(
                     request=api.Request(
@@ -1973,15 +2046,95 @@ async def import_resources_from_csv(
                 )
                 success_count += 1
             except Exception:
-                failed_shortnames.append(shortname)
+                failed_shortnames.append(record.shortname)
+        return success_count, failed_shortnames
 
-    return api.Response(
-        status=api.Status.success,
-        attributes={
-            "success_count": success_count,
-            "failed_shortnames": failed_shortnames,
-        },
-    )
+    subpath = records[0].subpath if records[0].subpath[0] == "/" else f"/{records[0].subpath}"
+    resource_type = records[0].resource_type
+    schema_shortname = records[0].attributes["payload"].get("schema_shortname")
+
+    def create_event(shortname: str) -> core.Event:
+        return core.Event(
+            space_name=space_name,
+            branch_name=branch_name,
+            subpath=subpath,
+            shortname=shortname,
+            action_type=core.ActionType.create,
+            schema_shortname=schema_shortname,
+            resource_type=resource_type,
+            user_shortname=owner_shortname,
+        )
+
+    await plugin_manager.before_actions([create_event(record.shortname) for record in records])
+
+    entries: list[tuple[str, core.Meta, dict[str, Any] | None]] = []
+    for record in records:
+        record.subpath = subpath
+        try:
+            if not await access_control.check_access(
+                    user_shortname=owner_shortname,
+                    space_name=space_name,
+                    subpath=subpath,
+                    resource_type=resource_type,
+                    action_type=core.ActionType.create,
+                    record_attributes=record.attributes,
+            ):
+                raise api.Exception(
+                    status.HTTP_401_UNAUTHORIZED,
+                    api.Error(
+                        type="request",
+                        code=InternalErrorCode.NOT_ALLOWED,
+                        message="You don't have permission to this action [4]",
+                    ),
+                )
+            await validate_uniqueness(space_name, record)
+
+            resource_obj = core.Meta.from_record(
+                record=record, owner_shortname=owner_shortname
+            )
+            if "created_at" not in record.attributes:
+                resource_obj.created_at = datetime.now()
+                resource_obj.updated_at = datetime.now()
+
+            separate_payload_data = None
+            if (
+                    resource_obj.payload
+                    and resource_obj.payload.content_type == ContentType.json
+                    and resource_obj.payload.body is not None
+            ):
+                separate_payload_data = resource_obj.payload.body
+                resource_obj.payload.body = record.shortname + ".json"
+
+            if (
+                    resource_obj.payload
+                    and resource_obj.payload.schema_shortname
+                    and isinstance(separate_payload_data, dict)
+            ):
+                await validate_payload_with_schema(
+                    payload_data=separate_payload_data,
+                    space_name=space_name,
+                    branch_name=branch_name,
+                    schema_shortname=resource_obj.payload.schema_shortname,
+                )
+            entries.append((
+                subpath,
+                resource_obj,
+                separate_payload_data if isinstance(separate_payload_data, dict) else None,
+            ))
+        except Exception:  # noqa: BLE001 - any failure of a row is reported, as one of serve_request is
+            failed_shortnames.append(record.shortname)
+
+    errors = await db.create_many(space_name, entries, branch_name)
+    created_shortnames: list[str] = []
+    for (_, resource_obj, _), error in zip(entries, errors):
+        if error:
+            failed_shortnames.append(resource_obj.shortname)
+        else:
+            created_shortnames.append(resource_obj.shortname)
+
+    await plugin_manager.after_actions([create_event(shortname) for shortname in created_shortnames])
+
+    return len(created_shortnames), failed_shortnames
 
 
 @router.get(
@@ -2055,10 +2208,7 @@ async def retrieve_entry_meta(
         )
 
     attachments = {}
-    entry_path = (
-            settings.spaces_folder
-            / f"{space_name}/{branch_path(branch_name)}/{subpath}/.dm/{shortname}"
-    )
+    entry_path = db.entry_dm_path(space_name, subpath, shortname, branch_name)
     if retrieve_attachments:
         attachments = await repository.get_entry_attachments(
             subpath=subpath,
@@ -2240,14 +2390,7 @@ async def lock_entry(
         resource_type: ResourceType | None = ResourceType.ticket,
         logged_in_user=Depends(JWTBearer()),
 ):
-    folder_meta_path = (
-            settings.spaces_folder
-            / space_name
-            / branch_path(branch_name)
-            / subpath
-            / ".dm"
-            / shortname
-    )
+    folder_meta_path = db.entry_dm_path(space_name, subpath, shortname, branch_name)
     if not folder_meta_path.is_dir():
         raise api.Exception(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -2425,7 +2568,7 @@ async def execute(
         record: core.Record,
         branch_name: str | None = settings.default_branch,
         logged_in_user=Depends(JWTBearer()),
-):
+) -> api.Response:
     task_type = task_type
     meta = await db.load(
         space_name=space_name,
@@ -2482,9 +2625,12 @@ async def execute(
     if "to_date" in record.attributes:
         query_dict["to_date"] = record.attributes["to_date"]
 
-    return await query_entries(
-        query=api.Query(**query_dict), user_shortname=logged_in_user
+    response = await query_entries(
+        query=api.Query(**query_dict), user_shortname=logged_in_user, accept=None
     )
+    # Never streamed without the accept header asking for it
+    assert isinstance(response, api.Response)
+    return response
 
 
 @router.get(
@@ -2561,9 +2707,8 @@ async def data_asset(
     attachments: dict[str, list[core.Record]] = await repository.get_entry_attachments(
         subpath=f"{query.subpath}/{query.shortname}",
         branch_name=query.branch_name,
-        attachments_path=(
-                settings.spaces_folder
-                / f"{query.space_name}/{branch_path(query.branch_name)}/{query.subpath}/.dm/{query.shortname}"
+        attachments_path=db.entry_dm_path(
+            query.space_name, query.subpath, query.shortname, query.branch_name
         ),
         filter_types=[query.data_asset_type],
         filter_shortnames=query.filter_data_assets
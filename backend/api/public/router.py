@@ -1,19 +1,22 @@
 from re import sub as res_sub
 from uuid import uuid4
-from fastapi import APIRouter, Body, Query, Path, status, Depends
+from fastapi import APIRouter, Body, Header, Query, Path, status, Depends
 from models.enums import AttachmentType, ContentType, ResourceType, TaskType
 import utils.db as db
 import models.api as api
-from utils.helpers import branch_path, camel_case
+from utils.helpers import camel_case
 from utils.custom_validations import validate_payload_with_schema
 from utils.internal_error_code import InternalErrorCode
 import utils.regex as regex
 import models.core as core
-from fastapi.responses import FileResponse
-from typing import Any
+from fastapi.responses import FileResponse, JSONResponse, Response
+from starlette.responses import StreamingResponse
+from typing import Annotated, Any
 import sys
 from utils.access_control import access_control
 import utils.repository as repository
+from utils import query_stream
+from utils import storage_codec
 from utils.plugin_manager import plugin_manager
 from utils.settings import settings
 
@@ -24,7 +27,9 @@ router = APIRouter()
 
 
 @router.post("/query", response_model=api.Response, response_model_exclude_none=True)
-async def query_entries(query: api.Query) -> api.Response:
+async def query_entries(
+    query: api.Query, accept: Annotated[str | None, Header()] = None
+) -> api.Response | StreamingResponse:
 
     await plugin_manager.before_action(
         core.Event(
@@ -43,25 +48,29 @@ async def query_entries(query: api.Query) -> api.Response:
         query.subpath
     )
 
-    total, records = await repository.serve_query(
-        query, "anonymous", redis_query_policies
+    after_event = core.Event(
+        space_name=query.space_name,
+        branch_name=query.branch_name,
+        subpath=query.subpath,
+        action_type=core.ActionType.query,
+        user_shortname="anonymous",
+        attributes={"filter_shortnames": query.filter_shortnames},
     )
-
-    await plugin_manager.after_action(
-        core.Event(
-            space_name=query.space_name,
-            branch_name=query.branch_name,
-            subpath=query.subpath,
-            action_type=core.ActionType.query,
-            user_shortname="anonymous",
-            attributes={"filter_shortnames": query.filter_shortnames},
+    if query_stream.is_requested(accept):
+        streamed_response = await query_stream.response(
+            repository.serve_query_chunks(query, "anonymous", redis_query_policies)
         )
-    )
+        await plugin_manager.after_action(after_event)
+        return streamed_response
 
+    total, records, next_cursor = await repository.serve_query_page(
+        query, "anonymous", redis_query_policies
+    )
+    await plugin_manager.after_action(after_event)
     return api.Response(
         status=api.Status.success,
         records=records,
-        attributes={"total": total, "returned": len(records)},
+        attributes={"total": total, "returned": len(records), "next_cursor": next_cursor},
     )
 
 
@@ -134,10 +143,7 @@ async def retrieve_entry_meta(
         )
 
     attachments = {}
-    entry_path = (
-        settings.spaces_folder
-        / f"{space_name}/{branch_path(branch_name)}/{subpath}/.dm/{shortname}"
-    )
+    entry_path = db.entry_dm_path(space_name, subpath, shortname, branch_name)
     if retrieve_attachments:
         attachments = await repository.get_entry_attachments(
             subpath=subpath,
@@ -207,7 +213,7 @@ async def retrieve_entry_or_attachment_payload(
     shortname: str = Path(..., pattern=regex.SHORTNAME),
     ext: str = Path(..., pattern=regex.EXT),
     branch_name: str | None = settings.default_branch,
-) -> FileResponse:
+) -> Response:
 
     await plugin_manager.before_action(
         core.Event(
@@ -280,6 +286,12 @@ async def retrieve_entry_or_attachment_payload(
     )
 
     media_file = payload_path / str(meta.payload.body)
+    if (
+        meta.payload.content_type == ContentType.json
+        and media_file.is_file()
+        and storage_codec.is_encoded_file(media_file)
+    ):
+        return JSONResponse(storage_codec.loads(media_file.read_bytes()))
     return FileResponse(media_file)
 
 
@@ -315,7 +327,7 @@ async def query_via_urlparams(
         query.space_name,
         query.subpath
     )
-    total, records = await repository.serve_query(
+    total, records, next_cursor = await repository.serve_query_page(
         query, "anonymous", redis_query_policies
     )
 
@@ -333,7 +345,7 @@ async def query_via_urlparams(
     return api.Response(
         status=api.Status.success,
         records=records,
-        attributes={"total": total, "returned": len(records)},
+        attributes={"total": total, "returned": len(records), "next_cursor": next_cursor},
     )
 
 
@@ -3,7 +3,8 @@ import json
 import re
 from pathlib import Path
 from uuid import uuid4
-import aiofiles
+from utils import io_executor
+from utils import storage_codec
 from utils.async_request import AsyncRequest
 from utils.generate_email import generate_subject
 from utils.generate_email import generate_email_from_template
@@ -394,12 +395,9 @@ async def get_profile(shortname=Depends(JWTBearer())) -> api.Response:
             and user.payload.content_type == ContentType.json
             and (path / str(user.payload.body)).is_file()
         ):
-            async with aiofiles.open(
-                path / str(user.payload.body), "r"
-            ) as payload_file_content:
-                attributes["payload"].body = json.loads(
-                    await payload_file_content.read()
-                )
+            attributes["payload"].body = storage_codec.loads(
+                await io_executor.read_bytes(path / str(user.payload.body))
+            )
 
     attributes["type"] = user.type
     attributes["language"] = user.language
@@ -411,12 +409,8 @@ async def get_profile(shortname=Depends(JWTBearer())) -> api.Response:
     attributes["roles"] = user.roles
     attributes["groups"] = user.groups
 
-    attachments_path = (
-        settings.spaces_folder
-        / MANAGEMENT_SPACE
-        / USERS_SUBPATH
-        / ".dm"
-        / user.shortname
+    attachments_path = db.entry_dm_path(
+        MANAGEMENT_SPACE, USERS_SUBPATH, user.shortname, MANAGEMENT_BRANCH
     )
     user_avatar = await repository.get_entry_attachments(
         subpath=f"{USERS_SUBPATH}/{user.shortname}",
@@ -0,0 +1,153 @@
+#!/usr/bin/env -S BACKEND_ENV=config.env python3
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+from models.enums import ContentType
+from utils import blob_store, history_store, storage_codec
+from utils.db import payload_file_path
+from utils.file_writer import atomic_write
+from utils.settings import settings
+
+# A file that can't be read or decoded is reported and left as it is
+_COMPACT_ERRORS: tuple[type[Exception], ...] = (OSError, *storage_codec.DECODE_ERRORS)
+
+
+def compress_payload(file_path: Path, threshold: int) -> bool:
+    """Compress the payload file in place if it is above threshold, returns whether it changed"""
+    if os.stat(file_path).st_nlink > 1:
+        # Shared through the blob store, rewriting it would duplicate it
+        return False
+    raw = file_path.read_bytes()
+    if storage_codec.is_compressed(raw) or len(raw) <= threshold:
+        return False
+    compressed = storage_codec.compress(raw)
+    if len(compressed) >= len(raw):
+        return False
+    stat = os.stat(file_path)
+    atomic_write(file_path, compressed)
+    # Keep the file cold, its content didn't change
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return True
+
+
+def archive_history(history_file: Path) -> bool:
+    """Compress history.jsonl into history.jsonl.zst, the next write or read restores it"""
+    compressed_file = history_file.with_name(f"{history_file.name}.zst")
+    mtime_ns = os.stat(history_file).st_mtime_ns
+    storage_codec.compress_file(history_file, compressed_file)
+    if os.stat(history_file).st_mtime_ns != mtime_ns:
+        # Appended to meanwhile, it isn't cold anymore
+        compressed_file.unlink(missing_ok=True)
+        return False
+    history_file.unlink()
+    # The offsets index is rebuilt once the log is restored
+    history_store.index_path(history_file).unlink(missing_ok=True)
+    return True
+
+
+def compact_space(
+    space_name: str, cold_days: int, threshold: int | None = None, dry_run: bool = False
+) -> dict[str, int]:
+    space_path = settings.spaces_folder / space_name
+    space_meta_file = space_path / ".dm/meta.space.json"
+    if not space_meta_file.is_file():
+        raise FileNotFoundError(f"{space_meta_file} does not exist!")
+
+    if threshold is None:
+        threshold = int(json.loads(space_meta_file.read_bytes()).get("compression_threshold") or 0)
+    cold_before = time.time() - cold_days * 86400
+
+    counters = {"payload": 0, "history": 0, "blobs": 0, "failed": 0}
+    blobs_path = space_path / blob_store.BLOBS_FOLDER
+    for root, folders, files in os.walk(space_path):
+        if Path(root) == blobs_path.parent:
+            folders[:] = [one for one in folders if one != blobs_path.name]
+        for filename in files:
+            file_path = Path(root) / filename
+            try:
+                if file_path.stat().st_mtime > cold_before:
+                    continue
+
+                if filename == "history.jsonl":
+                    if dry_run or archive_history(file_path):
+                        counters["history"] += 1
+                    continue
+
+                if (
+                    not threshold
+                    or not filename.startswith("meta.")
+                    or not filename.endswith(".json")
+                    or filename in ["meta.space.json", "meta.branch.json"]
+                ):
+                    continue
+
+                payload = (storage_codec.loads(file_path.read_bytes()) or {}).get("payload") or {}
+                if (
+                    payload.get("content_type") != ContentType.json
+                    or not isinstance(payload.get("body"), str)
+                ):
+                    continue
+                payload_file = payload_file_path(file_path, payload["body"])
+                if not payload_file.is_file() or payload_file.stat().st_mtime > cold_before:
+                    continue
+                if dry_run:
+                    if payload_file.stat().st_size > threshold:
+                        counters["payload"] += 1
+                elif compress_payload(payload_file, threshold):
+                    counters["payload"] += 1
+            except _COMPACT_ERRORS as e:
+                counters["failed"] += 1
+                print(f"Failed to compact {file_path}: {e}")
+
+    if not dry_run:
+        counters["blobs"] = blob_store.sweep(space_name)
+
+    return counters
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compress the cold JSON payloads and history logs of spaces and drop their unreferenced blobs, meant to run from cron",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-p", "--space", help="the space to compact, all the spaces if omitted"
+    )
+    parser.add_argument(
+        "-d",
+        "--cold-days",
+        type=int,
+        default=30,
+        help="files not modified for this many days are compacted",
+    )
+    parser.add_argument(
+        "-t",
+        "--threshold",
+        type=int,
+        help="compress payloads bigger than this many bytes, defaults to the space compression_threshold",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only count the files to compact"
+    )
+
+    args = parser.parse_args()
+
+    if args.space:
+        spaces = [args.space]
+    else:
+        spaces = sorted(
+            one.name
+            for one in settings.spaces_folder.iterdir()
+            if (one / ".dm/meta.space.json").is_file()
+        )
+
+    for space in spaces:
+        result = compact_space(space, args.cold_days, args.threshold, args.dry_run)
+        print(
+            f"{space}: {result['payload']} payload and {result['history']} history files compacted, "
+            f"{result['blobs']} unreferenced blobs removed, {result['failed']} failed"
+        )
@@ -0,0 +1,113 @@
+#!/usr/bin/env -S BACKEND_ENV=config.env python3
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+from models.enums import ContentType, StorageCodec
+from utils import storage_codec
+from utils.db import payload_file_path
+from utils.file_writer import atomic_write
+from utils.settings import settings
+
+# A file that can't be read or decoded is reported and left as it is
+_CONVERT_ERRORS: tuple[type[Exception], ...] = (OSError, *storage_codec.DECODE_ERRORS)
+
+
+def convert_file(file_path: Path, codec: StorageCodec) -> tuple[bool, dict | None]:
+    """Rewrite the file with the codec, returns whether it changed and its data"""
+    raw = file_path.read_bytes()
+    data = storage_codec.loads(raw)
+    encoded = storage_codec.dumps(data, codec)
+    if isinstance(encoded, str):
+        encoded = encoded.encode()
+    if storage_codec.is_compressed(raw):
+        encoded = storage_codec.compress(encoded)
+    if encoded == raw:
+        return False, data
+    atomic_write(file_path, encoded)
+    return True, data
+
+
+def convert_space(space_name: str, codec: StorageCodec, dry_run: bool = False) -> dict[str, int]:
+    space_path = settings.spaces_folder / space_name
+    space_meta_file = space_path / ".dm/meta.space.json"
+    if not space_meta_file.is_file():
+        raise FileNotFoundError(f"{space_meta_file} does not exist!")
+
+    counters = {"meta": 0, "payload": 0, "unchanged": 0, "failed": 0}
+    for root, _, files in os.walk(space_path):
+        for filename in files:
+            if (
+                not filename.startswith("meta.")
+                or not filename.endswith(".json")
+                or filename in ["meta.space.json", "meta.branch.json"]
+            ):
+                continue
+
+            meta_file = Path(root) / filename
+            try:
+                if dry_run:
+                    changed, meta = False, storage_codec.loads(meta_file.read_bytes())
+                    counters["meta"] += 1
+                else:
+                    changed, meta = convert_file(meta_file, codec)
+                    counters["meta" if changed else "unchanged"] += 1
+            except _CONVERT_ERRORS as e:
+                counters["failed"] += 1
+                print(f"Failed to convert {meta_file}: {e}")
+                continue
+
+            payload = (meta or {}).get("payload") or {}
+            if (
+                payload.get("content_type") != ContentType.json
+                or not isinstance(payload.get("body"), str)
+            ):
+                continue
+            payload_file = payload_file_path(meta_file, payload["body"])
+            if not payload_file.is_file():
+                continue
+            try:
+                if dry_run:
+                    counters["payload"] += 1
+                else:
+                    changed, _ = convert_file(payload_file, codec)
+                    counters["payload" if changed else "unchanged"] += 1
+            except _CONVERT_ERRORS as e:
+                counters["failed"] += 1
+                print(f"Failed to convert {payload_file}: {e}")
+
+    if not dry_run:
+        # The space meta stays JSON, it tells the writers which codec to use
+        space_meta = json.loads(space_meta_file.read_bytes())
+        space_meta["storage_codec"] = codec
+        atomic_write(space_meta_file, json.dumps(space_meta))
+
+    return counters
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the meta and JSON payload files of a space to another storage codec",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("-p", "--space", required=True, help="the space to convert")
+    parser.add_argument(
+        "-c",
+        "--codec",
+        choices=[one.value for one in StorageCodec],
+        default=StorageCodec.msgpack.value,
+        help="the target codec",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only count the files to convert"
+    )
+
+    args = parser.parse_args()
+
+    result = convert_space(args.space, StorageCodec(args.codec), args.dry_run)
+    print(
+        f"{args.space}: {result['meta']} meta and {result['payload']} payload files converted, "
+        f"{result['unchanged']} unchanged, {result['failed']} failed"
+    )
@@ -1,12 +1,16 @@
 #!/usr/bin/env -S BACKEND_ENV=config.env python3
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from copy import copy
+from itertools import chain
 import json
+import os
+from pathlib import Path
 import re
 import traceback
+from collections.abc import Iterable
 
-import models.api as api
 import utils.db as db
 import models.core as core
 import sys
@@ -14,41 +18,161 @@ from models.enums import ContentType, ResourceType
 from utils.helpers import branch_path, camel_case, divide_chunks
 from utils.custom_validations import validate_payload_with_schema
 from jsonschema.exceptions import ValidationError as SchemaValidationError
+from redis.commands.json.path import Path as JsonPath
 from utils.redis_services import RedisServices
 from utils.repository import generate_payload_string
 from utils.settings import settings
+from utils import storage_codec
+from utils import reindex_manifest
 import utils.regex as regex
 import asyncio
 from utils.spaces import get_spaces, initialize_spaces
 from utils.access_control import access_control
-# from time import time
-from multiprocessing import Pool
+from time import time
+
+
+# The types of the entries indexed along with the subpaths
+INDEXED_RESOURCE_TYPES = [
+    ResourceType.content,
+    ResourceType.ticket,
+    ResourceType.schema,
+    ResourceType.notification,
+    ResourceType.post,
+    ResourceType.folder
+]
+
+
+class Reindexer:
+    """
+    Load the entries of subpaths to redis through a bounded pipeline:
+    the locators of a subpath are walked lazily and parsed into redis docs in chunks
+    by a process pool kept for the whole run, the parsed chunks are fed through a
+    bounded queue to a writer flushing fixed-size redis pipelines. At most a couple of
+    chunks per worker are held in memory, whatever the size of the subpath
+
+    Along with its docs, the fingerprint of each entry is saved to the reindex manifest.
+    An incremental reindex only regenerates the docs of the entries changed since
+    """
+
+    def __init__(self, incremental: bool = False, in_process: bool = False):
+        self.incremental = incremental
+        # Every chunk parsed in the calling process, as when reindexing from the server
+        self.in_process = in_process
+        self.workers = settings.reindex_workers or os.cpu_count() or 1
+        self.pool: ProcessPoolExecutor | None = None
+        self.documents: int = 0
+        self.unchanged: int = 0
+        self.started_at: float = time()
+
+    async def parse(self, items: list, in_process: bool) -> list:
+        force = not self.incremental
+        if in_process or self.in_process:
+            return await generate_entries(items, force)
+        if not self.pool:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.pool, generate_entries_process, items, force
+        )
+
+    async def write(self, key: str, queue: asyncio.Queue) -> tuple[int, int]:
+        """Flush the parsed chunks of entries until the None sentinel,
+        returns the count of docs saved and of entries left unchanged"""
+        saved = unchanged = 0
+        entries: list | None = []
+        try:
+            async with RedisServices() as redis_man:
+                while (entries := await queue.get()) is not None:
+                    unchanged += sum("docs" not in entry for entry in entries)
+                    saved += await self.save_entries(redis_man, key, entries)
+        finally:
+            # Keep draining on failure so that the parsing never blocks on a full queue
+            while entries is not None:
+                entries = await queue.get()
+        self.documents += saved
+        self.unchanged += unchanged
+        return saved, unchanged
+
+    async def save_entries(self, redis_man: RedisServices, key: str, entries: list) -> int:
+        saved = 0
+        pipe = None
+        queued = 0
+        for entry in entries:
+            if "record" not in entry:
+                continue
+            if not pipe:
+                pipe = redis_man.pipeline(transaction=False)
+            for doc in entry.get("docs", []):
+                pipe.json().set(doc["doc_id"], JsonPath.root_path(), doc["payload"])
+            if entry.get("stale"):
+                pipe.delete(*entry["stale"])
+            pipe.hset(key, entry["field"], json.dumps(entry["record"]))
+            saved += len(entry.get("docs", []))
+            queued += len(entry.get("docs", [])) + 1
+            if queued >= settings.reindex_pipeline_size:
+                await pipe.execute()
+                pipe, queued = None, 0
+        if pipe:
+            await pipe.execute()
+        return saved
+
+    async def load(self, key: str, locators: Iterable[core.Locator]) -> tuple[int, int]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers)
+        writer = asyncio.create_task(self.write(key, queue))
+        parsing: set[asyncio.Future] = set()
+        try:
+            async with RedisServices() as redis_man:
+                for index, locators_chunk in enumerate(
+                    divide_chunks(locators, settings.reindex_chunk_size)
+                ):
+                    records = await reindex_manifest.get_records(
+                        redis_man,
+                        key,
+                        [reindex_manifest.entry_field(one) for one in locators_chunk],
+                    )
+                    # A subpath fitting in a single partial chunk isn't worth a process
+                    in_process = index == 0 and len(locators_chunk) < settings.reindex_chunk_size
+                    parsing.add(
+                        asyncio.ensure_future(
+                            self.parse(list(zip(locators_chunk, records)), in_process)
+                        )
+                    )
+                    if len(parsing) >= self.workers:
+                        done, parsing = await asyncio.wait(
+                            parsing, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        for one in done:
+                            await queue.put(one.result())
+            for one in asyncio.as_completed(parsing):
+                await queue.put(await one)
+        finally:
+            await queue.put(None)
+        return await writer
+
+    def rate(self) -> float:
+        return self.documents / max(time() - self.started_at, 1e-6)
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
 
 
 async def load_data_to_redis(
     space_name, 
     branch_name, 
     subpath, 
-    allowed_resource_types
+    allowed_resource_types,
+    reindexer: Reindexer,
 ) -> dict:
     """
     Load meta files inside subpath then store them to redis as :space_name:meta prefixed doc,
     and if the meta file has a separate payload file follwing a schema 
     we loads the payload content and store it to redis as :space_name:schema_name prefixed doc
     """
-    # start_time: int = int(time())
-
-    #print(f"\n\nSTART EXAMINING SUBPATH: {subpath}  {int(time()) - start_time} ")
-
-    locators_len, locators = db.locators_query(
-        api.Query(
-            space_name=space_name,
-            branch_name=branch_name,
-            subpath=subpath,
-            type=api.QueryType.subpath,
-            limit=10000000,
-            filter_types=allowed_resource_types,
-        )
+    locators: Iterable[core.Locator] = (
+        locator
+        for locator in db.iter_subpath_locators(space_name, branch_name, subpath)
+        if locator.type == ResourceType.folder or locator.type in allowed_resource_types
     )
 
     # Add Folder locator to the loaded locators
@@ -62,48 +186,37 @@ async def load_data_to_redis(
             subpath="/".join(folder_parts[:-1]) or "/",
             shortname=folder_parts[-1]
         )
-        locators.append(folder_locator)
-        locators_len += 1
-
-    # print(f"\nEnded loading {locators_len} files, starting parsing data in each file {int(time()) - start_time}")
-
-    if locators_len <= 5000:
-        redis_docs_chunks = [await generate_redis_docs(locators)]
-    else:
-        with Pool() as pool:
-            multiple_results = [
-                pool.apply_async(generate_redis_docs_process, (locators_chunk, )) 
-                for locators_chunk in divide_chunks(locators, 5000)
-            ]
-            redis_docs_chunks = [process_res.get() for process_res in multiple_results]
-
-    
-    saved_docs = []
-    #print(f"""
-    #    Completed parsing {locators_len} files, 
-    #    generated {len(redis_docs_chunks)} chunks of docs to be stored in Redis, 
-    #    time: {int(time()) - start_time}
-    #""")
-    
-    async with RedisServices() as redis_man:
-        for redis_docs_chunk in redis_docs_chunks:
-            saved_docs += await redis_man.save_bulk(redis_docs_chunk)
+        locators = chain(locators, [folder_locator])
 
+    started_at = time()
+    documents, unchanged = await reindexer.load(
+        reindex_manifest.manifest_key(space_name, branch_name, subpath), locators
+    )
+    return {
+        "subpath": subpath,
+        "documents": documents,
+        "unchanged": unchanged,
+        "rate": documents / max(time() - started_at, 1e-6),
+    }
 
-    return {"subpath": subpath, "documents": len(saved_docs)}
 
+def generate_entries_process(items: list, force: bool):
+    return asyncio.run(generate_entries(items, force))
 
-def generate_redis_docs_process(locators: list):
-    return asyncio.run(generate_redis_docs(locators))
 
-async def generate_redis_docs(locators: list) -> list:
-    redis_docs = []
+async def generate_entries(items: list[tuple[core.Locator, dict | None]], force: bool) -> list:
+    """The docs and fingerprints of the entries, given their recorded fingerprints.
+    Unless forced, an entry whose files didn't change gets no docs"""
+    entries: list[dict] = []
     redis_man : RedisServices = await RedisServices()
-    for one in locators:
+    for one, record in items:
         try:
-            myclass = getattr(sys.modules["models.core"], camel_case(one.type))
-            # print(f"{one=}")
+            field = reindex_manifest.entry_field(one)
+            if not force and record and reindex_manifest.is_unchanged(one, record):
+                entries.append({"field": field})
+                continue
 
+            myclass = getattr(sys.modules["models.core"], camel_case(one.type))
             meta = await db.load(
                 space_name=one.space_name,
                 branch_name=one.branch_name,
@@ -112,68 +225,101 @@ async def generate_redis_docs(locators: list) -> list:
                 class_type=myclass,
                 user_shortname="anonymous",
             )
-            meta_doc_id, meta_data = redis_man.prepate_meta_doc(
-                one.space_name, one.branch_name, one.subpath, meta
-            )
-            payload_data = {}
-            if (
-                meta.payload
-                and isinstance(meta.payload.body, str)
-                and meta.payload.content_type == ContentType.json
-                and meta.payload.schema_shortname
-            ):
-                try:
-                    payload_path = db.payload_path(
-                        one.space_name, one.subpath, myclass, one.branch_name
-                    ) / str(meta.payload.body)
-                    payload_data = json.loads(payload_path.read_text())
-                    await validate_payload_with_schema(
-                        payload_data=payload_data,
-                        space_name=one.space_name,
-                        branch_name=one.branch_name,
-                        schema_shortname=meta.payload.schema_shortname,
-                    )
-                    doc_id, payload = redis_man.prepare_payload_doc(
-                        space_name=one.space_name,
-                        branch_name=one.branch_name,
-                        subpath=one.subpath,
-                        resource_type=one.type,
-                        payload=copy(payload_data),
-                        meta=meta,
-                    )
-                    payload.update(meta_data)
-                    redis_docs.append({"doc_id": doc_id, "payload": payload})
-                except SchemaValidationError as _:
-                    print(
-                        f"Error: @{one.space_name}/{one.subpath}/{meta.shortname} "
-                        f"does not match the schema {meta.payload.schema_shortname}"
-                    )
-                except Exception as ex:
-                    print(f"Error: @{one.space_name}:{one.subpath} {meta.shortname=}, {ex}")
-
-            meta_data["payload_string"] = await generate_payload_string(
-                space_name=one.space_name, 
-                subpath=one.subpath, 
-                shortname=one.shortname, 
-                branch_name=one.branch_name, 
-                payload=payload_data,
-            )
-            
-            redis_docs.append({"doc_id": meta_doc_id, "payload": meta_data})
+            payload_file = redis_payload_file(one, meta, myclass)
+            fingerprint = reindex_manifest.fingerprint(one, payload_file)
+            if not force and record and record["checksum"] == fingerprint["checksum"]:
+                # Touched, same content
+                fingerprint["doc_ids"] = record["doc_ids"]
+                entries.append({"field": field, "record": fingerprint})
+                continue
+
+            docs = await generate_redis_docs(redis_man, one, meta, payload_file)
+            fingerprint["doc_ids"] = [doc["doc_id"] for doc in docs]
+            entries.append({
+                "field": field,
+                "record": fingerprint,
+                "docs": docs,
+                "stale": [
+                    doc_id
+                    for doc_id in (record["doc_ids"] if record else [])
+                    if doc_id not in fingerprint["doc_ids"]
+                ],
+            })
 
         except Exception:
             print(f"path: {one.space_name}/{one.subpath}/{one.shortname} ({one.type})")
             print("stacktrace:")
             print(f"    {traceback.format_exc()}")
             pass
-        
+
     del redis_man
 
+    return entries
+
+
+def redis_payload_file(one: core.Locator, meta: core.Meta, myclass) -> Path | None:
+    """The json payload file indexed along with the meta, if any"""
+    if (
+        meta.payload
+        and isinstance(meta.payload.body, str)
+        and meta.payload.content_type == ContentType.json
+        and meta.payload.schema_shortname
+    ):
+        return db.payload_path(
+            one.space_name, one.subpath, myclass, one.branch_name
+        ) / str(meta.payload.body)
+    return None
+
+
+async def generate_redis_docs(
+    redis_man: RedisServices, one: core.Locator, meta: core.Meta, payload_file: Path | None
+) -> list:
+    redis_docs = []
+    meta_doc_id, meta_data = redis_man.prepate_meta_doc(
+        one.space_name, one.branch_name, one.subpath, meta
+    )
+    payload_data = {}
+    if meta.payload and meta.payload.schema_shortname and payload_file:
+        try:
+            payload_data = storage_codec.loads(payload_file.read_bytes())
+            await validate_payload_with_schema(
+                payload_data=payload_data,
+                space_name=one.space_name,
+                branch_name=one.branch_name,
+                schema_shortname=meta.payload.schema_shortname,
+            )
+            doc_id, payload = redis_man.prepare_payload_doc(
+                space_name=one.space_name,
+                branch_name=one.branch_name,
+                subpath=one.subpath,
+                resource_type=one.type,
+                payload=copy(payload_data),
+                meta=meta,
+            )
+            payload.update(meta_data)
+            redis_docs.append({"doc_id": doc_id, "payload": payload})
+        except SchemaValidationError as _:
+            print(
+                f"Error: @{one.space_name}/{one.subpath}/{meta.shortname} "
+                f"does not match the schema {meta.payload.schema_shortname}"
+            )
+        except Exception as ex:
+            print(f"Error: @{one.space_name}:{one.subpath} {meta.shortname=}, {ex}")
+
+    meta_data["payload_string"] = await generate_payload_string(
+        space_name=one.space_name, 
+        subpath=one.subpath, 
+        shortname=one.shortname, 
+        branch_name=one.branch_name, 
+        payload=payload_data,
+    )
+    
+    redis_docs.append({"doc_id": meta_doc_id, "payload": meta_data})
     return redis_docs
 
 
 
-async def load_custom_indices_data(for_space: str | None = None):
+async def load_custom_indices_data(reindexer: Reindexer, for_space: str | None = None):
     for i, index in enumerate(RedisServices.CUSTOM_INDICES):
         if for_space and index["space"] != for_space:
             continue
@@ -184,6 +330,7 @@ async def load_custom_indices_data(for_space: str | None = None):
                 index["branch"],
                 index["subpath"],
                 [ResourceType(RedisServices.CUSTOM_CLASSES[i].__name__.lower())],
+                reindexer,
             )
             print(
                 f"{res['documents']}\tCustom  {index['space']}:{index['branch']}:meta:{index['subpath']}"
@@ -196,6 +343,7 @@ async def traverse_subpaths_entries(
     branch_name,
     loaded_data,
     space_branches,
+    reindexer: Reindexer,
     for_subpaths: list | None = None,
 ):
     space_parts_count = len(settings.spaces_folder.parts)
@@ -224,6 +372,7 @@ async def traverse_subpaths_entries(
                 branch_name,
                 loaded_data,
                 space_branches,
+                reindexer,
                 for_subpaths,
             )
 
@@ -242,21 +391,32 @@ async def traverse_subpaths_entries(
                     space_name,
                     branch_name,
                     subpath_name,
-                    [
-                        ResourceType.content,
-                        ResourceType.ticket,
-                        ResourceType.schema,
-                        ResourceType.notification,
-                        ResourceType.post,
-                        ResourceType.folder
-                    ],
+                    INDEXED_RESOURCE_TYPES,
+                    reindexer,
                 )
             )
     return loaded_data
 
 
+async def load_folder_to_redis(
+    space_name: str, branch_name: str | None, subpath: str, reindexer: Reindexer
+):
+    """Load the folder at subpath, its entries and everything under it"""
+    path = settings.spaces_folder / space_name / branch_path(branch_name) / subpath.strip("/")
+    if not path.is_dir():
+        return []
+    loaded_data = [
+        await load_data_to_redis(
+            space_name, branch_name, subpath.strip("/"), INDEXED_RESOURCE_TYPES, reindexer
+        )
+    ]
+    return await traverse_subpaths_entries(
+        path, space_name, branch_name, loaded_data, [], reindexer
+    )
+
+
 async def load_all_spaces_data_to_redis(
-    for_space: str | None = None, for_subpaths: list | None = None
+    reindexer: Reindexer, for_space: str | None = None, for_subpaths: list | None = None
 ):
     """
     Loop over spaces and subpaths inside it and load the data to redis of indexing_enabled for the space
@@ -283,10 +443,10 @@ async def load_all_spaces_data_to_redis(
             loaded_data[
                 f"{space_name}:{branch_name}"
             ] = await traverse_subpaths_entries(
-                path, space_name, branch_name, [], space_obj.branches, for_subpaths
+                path, space_name, branch_name, [], space_obj.branches, reindexer, for_subpaths
             )
 
-    await load_custom_indices_data(for_space)
+    await load_custom_indices_data(reindexer, for_space)
 
     return loaded_data
 
@@ -295,7 +455,8 @@ async def main(
     for_space: str | None = None,
     for_schemas: list | None = None,
     for_subpaths: list | None = None,
-    flushall: bool = False
+    flushall: bool = False,
+    incremental: bool = False,
 ):
     
     async with RedisServices() as redis_man:
@@ -311,13 +472,30 @@ async def main(
         await redis_man.create_indices(
             for_space=for_space, 
             for_schemas=for_schemas,
-            del_docs=not bool(for_subpaths)
         )
-    res = await load_all_spaces_data_to_redis(for_space, for_subpaths)
+        previous_doc_ids = await reindex_manifest.recorded_doc_ids(redis_man, for_space)
+    reindexer = Reindexer(incremental)
+    try:
+        res = await load_all_spaces_data_to_redis(reindexer, for_space, for_subpaths)
+    finally:
+        reindexer.close()
+    async with RedisServices() as redis_man:
+        forgotten = await reindex_manifest.forget_missing(redis_man, for_space, for_subpaths)
+        swept = 0
+        # Only a run over whole spaces recorded all the docs they should have
+        if not for_subpaths:
+            swept = await reindex_manifest.sweep_superseded(redis_man, previous_doc_ids, for_space)
     for space_name, loaded_data in res.items():
         if loaded_data:
             for item in loaded_data:
-                print(f"{item['documents']}\tRegular {space_name}/{item['subpath']}")
+                print(
+                    f"{item['documents']}\tRegular {space_name}/{item['subpath']}"
+                    f" ({item['rate']:.0f} docs/sec, {item['unchanged']} unchanged)"
+                )
+    print(
+        f"{reindexer.documents}\tTotal ({reindexer.rate():.0f} docs/sec,"
+        f" {reindexer.unchanged} unchanged, {forgotten} removed, {swept} superseded docs deleted)"
+    )
 
     await RedisServices.POOL.aclose()
     await RedisServices.POOL.disconnect(True)
@@ -338,10 +516,18 @@ if __name__ == "__main__":
     parser.add_argument(
         "--flushall", action='store_true', help="FLUSHALL data on Redis"
     )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action='store_true',
+        help="only reindex the entries changed since the last run",
+    )
 
     args = parser.parse_args()
 
-    asyncio.run(main(args.space, args.schemas, args.subpaths, args.flushall))
+    asyncio.run(
+        main(args.space, args.schemas, args.subpaths, args.flushall, args.incremental)
+    )
 
     # test_search = redis_services.search(
     #     space_name="products",
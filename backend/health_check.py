@@ -16,7 +16,7 @@ from redis.commands.search.result import Result
 
 from api.managed.router import serve_request
 from models.core import Folder
-from utils import repository, db
+from utils import repository, db, sharding, storage_codec
 from utils.custom_validations import get_schema_path
 from utils.helpers import camel_case, branch_path
 from utils.redis_services import RedisServices
@@ -124,15 +124,12 @@ def load_space_schemas(space_name: str, branch_name: str) -> dict[str, dict]:
     schemas_path = Path(settings.spaces_folder / space_name / "schema" / ".dm")
     if not schemas_path.is_dir():
         return {}
-    for entry in os.scandir(schemas_path):
-        if not entry.is_dir():
-            continue
-
-        schema_path_meta = Path(schemas_path / entry.name / "meta.schema.json")
+    for entry in sharding.entry_folders(schemas_path, db.is_sharded(space_name, "schema")):
+        schema_path_meta = Path(entry.path) / "meta.schema.json"
         if not schema_path_meta.is_file():
             continue
         
-        schema_meta = json.loads(schema_path_meta.read_text())
+        schema_meta = storage_codec.loads(schema_path_meta.read_bytes())
         if schema_meta.get("payload", {}).get('body'):
             schema_path_body = get_schema_path(
                 space_name=space_name,
@@ -140,7 +137,7 @@ def load_space_schemas(space_name: str, branch_name: str) -> dict[str, dict]:
                 schema_shortname=schema_meta.get("payload").get('body'),
             )
             if schema_path_body.is_file():
-                schemas[schema_meta['shortname']] = json.loads(schema_path_body.read_text())
+                schemas[schema_meta['shortname']] = storage_codec.loads(schema_path_body.read_bytes())
     return schemas
 
 
@@ -159,10 +156,8 @@ async def soft_health_check(
     offset = 0
     folders_report : dict = {}
     async with RedisServices() as redis:
-        try:
-            ft_index = redis.ft(f"{space_name}:{branch_name}:{schema_name}")
-            await ft_index.info()
-        except Exception:
+        ft_index = redis.ft(f"{space_name}:{branch_name}:{schema_name}")
+        if not await redis.index_exists(f"{space_name}:{branch_name}:{schema_name}"):
             if 'meta_schema' not in schema_name:
                 print(f"can't find index: `{space_name}:{branch_name}:{schema_name}`")
             return None
@@ -288,11 +283,9 @@ async def collect_duplicated_with_key(key, value) -> None:
         for space_name, space_data in spaces.items():
             space_data = json.loads(space_data)
             for branch in space_data["branches"]:
-                try:
-                    ft_index = redis.ft(f"{space_name}:{branch}:meta")
-                    await ft_index.info()
-                except Exception:
+                if not await redis.index_exists(f"{space_name}:{branch}:meta"):
                     continue
+                ft_index = redis.ft(f"{space_name}:{branch}:meta")
                 search_query = Query(query_string=f"@{key}:{value}*")
                 search_query.paging(0, 1000)
                 x = await ft_index.search(query=search_query)
@@ -19,6 +19,8 @@ from utils.middleware import CustomRequestMiddleware
 from utils.jwt import JWTBearer
 from utils.plugin_manager import plugin_manager
 from utils.redis_services import RedisServices
+from utils import io_executor
+from utils import query_stream
 from utils.spaces import initialize_spaces
 from fastapi import Depends, FastAPI, Request, Response, status
 from utils.logger import logging_schema
@@ -62,12 +64,15 @@ async def lifespan(app: FastAPI):
     app.openapi_schema = openapi_schema
 
     await initialize_spaces()
+    async with RedisServices() as redis_services:
+        await redis_services.load_known_indices()
     await access_control.load_permissions_and_roles()
 
     yield
     
     await RedisServices.POOL.aclose()
     await RedisServices.POOL.disconnect(True)
+    io_executor.shutdown()
     
     logger.info("Application shutting down")
     print('{"stage":"shutting down"}')
@@ -168,14 +173,16 @@ async def middle(request: Request, call_next):
     exception_data: dict[str, Any] | None = None
     try:
         response = await call_next(request)
-        raw_response = [section async for section in response.body_iterator]
-        response.body_iterator = iterate_in_threadpool(iter(raw_response))
-        raw_data = b"".join(raw_response)
-        if raw_data:
-            try:
-                response_body = json.loads(raw_data)
-            except Exception:
-                response_body = {}
+        # Streamed responses aren't buffered, their body isn't logged
+        if not response.headers.get("content-type", "").startswith(query_stream.NDJSON_MEDIA_TYPE):
+            raw_response = [section async for section in response.body_iterator]
+            response.body_iterator = iterate_in_threadpool(iter(raw_response))
+            raw_data = b"".join(raw_response)
+            if raw_data:
+                try:
+                    response_body = json.loads(raw_data)
+                except Exception:
+                    response_body = {}
     except api.Exception as e:
         response = JSONResponse(
             status_code=e.status_code,
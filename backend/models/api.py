@@ -104,6 +104,11 @@ class Query(BaseModel):
     jq_filter: str | None = None
     limit: int = 10
     offset: int = 0
+    # next_cursor of the previous page, supersedes offset. Listings, and searches sorted on a
+    # numeric field, resume after the sort value and shortname the previous page ended on.
+    # Searches sorted on another field, or unsorted, resume at the count of rows passed,
+    # as the index has no range on those, so rows added or removed before it shift the page
+    cursor: str | None = None
     aggregation_data: RedisAggregate | None = None
 
     # Replace -1 limit by settings.max_query_limit
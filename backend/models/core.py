@@ -21,6 +21,7 @@ from models.enums import (
     ConditionType,
     PluginType,
     EventListenTime,
+    StorageCodec,
 )
 from utils.helpers import camel_case, remove_none, snake_case
 import utils.regex as regex
@@ -325,6 +326,10 @@ class Space(Meta):
     active_plugins: list[str] = []
     branches: list[str] = []
     ordinal: int | None = None
+    storage_codec: StorageCodec = StorageCodec.json
+    compression_threshold: int = 0
+    dedup_payloads: bool = False
+    sharded_subpaths: list[str] = []
 
 
 class Actor(Meta):
@@ -514,6 +519,12 @@ class PluginBase(ABC):
     async def hook(self, data: Event) -> None:
         pass
 
+    async def hook_many(self, events: list[Event]) -> None:
+        """Handle the events of a batch of entries (e.g. a CSV import), one by one
+        unless the plugin can handle them together"""
+        for event in events:
+            await self.hook(event)
+
 
 class EventFilter(BaseModel):
     subpaths: list
@@ -247,3 +247,8 @@ class ReactionType(StrEnum):
     care = "care"
     laughing = "laughing"
     sad = "sad"
+
+
+class StorageCodec(StrEnum):
+    json = "json"
+    msgpack = "msgpack"
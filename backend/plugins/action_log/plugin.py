@@ -1,9 +1,9 @@
 import sys
-import aiofiles
 from utils.middleware import get_request_data
 from models.core import ActionType, PluginBase, Event
 from models.enums import ContentType, ResourceType
 from utils.db import load, load_resource_payload
+from utils import events_log, history_store, io_executor, query_cache
 from models.core import Action, Locator, Meta
 from utils.helpers import branch_path, camel_case
 from utils.settings import settings
@@ -13,19 +13,46 @@ from fastapi.logger import logger
 
 class Plugin(PluginBase):
     async def hook(self, data: Event):
+        await self.hook_many([data])
 
-        # Type narrowing for PyRight
-        if (
-            not isinstance(data.shortname, str)
-            or not isinstance(data.action_type, ActionType)
-            or not isinstance(data.resource_type, ResourceType)
-            or not isinstance(data.attributes, dict)
-        ):
-            logger.warning("invalid data at action_log")
+    async def hook_many(self, events: list[Event]):
+        """Log the actions of a batch of events, all of the same space, in one write"""
+        actions: list[Action] = []
+        for data in events:
+            # Type narrowing for PyRight
+            if (
+                not isinstance(data.shortname, str)
+                or not isinstance(data.action_type, ActionType)
+                or not isinstance(data.resource_type, ResourceType)
+                or not isinstance(data.attributes, dict)
+            ):
+                logger.warning("invalid data at action_log")
+                continue
+            actions.append(await self.generate_event(data, data.resource_type, data.shortname))
+        if not actions:
             return
 
+        data = events[0]
+        events_path = (
+            settings.spaces_folder
+            / data.space_name
+            / branch_path(data.branch_name)
+            / ".dm"
+        )
+        segment = await io_executor.run(
+            events_log.append,
+            events_path,
+            [action.model_dump_json() for action in actions],
+            actions[-1].timestamp,
+        )
+        await history_store.sync(segment)
+        await query_cache.bump(data.space_name, data.branch_name)
+
+    async def generate_event(
+        self, data: Event, resource_type: ResourceType, shortname: str
+    ) -> Action:
         class_type = getattr(
-            sys.modules["models.core"], camel_case(ResourceType(data.resource_type))
+            sys.modules["models.core"], camel_case(resource_type)
         )
 
         if data.action_type == ActionType.delete:
@@ -35,7 +62,7 @@ class Plugin(PluginBase):
                 space_name=data.space_name,
                 branch_name=data.branch_name,
                 subpath=data.subpath,
-                shortname=data.shortname,
+                shortname=shortname,
                 class_type=class_type,
                 user_shortname=data.user_shortname,
             )
@@ -62,14 +89,14 @@ class Plugin(PluginBase):
 
         action_attributes={**action_attributes, **get_request_data()}
 
-        event_obj = Action(
+        return Action(
             resource=Locator(
                 uuid=entry.uuid,
-                type=data.resource_type,
+                type=resource_type,
                 space_name=data.space_name,
                 branch_name=data.branch_name,
                 subpath=data.subpath,
-                shortname=data.shortname,
+                shortname=shortname,
                 displayname=entry.displayname,
                 description=entry.description,
                 tags=entry.tags,
@@ -80,19 +107,6 @@ class Plugin(PluginBase):
             attributes=action_attributes,
         )
 
-        events_file_path = (
-            settings.spaces_folder
-            / data.space_name
-            / branch_path(data.branch_name)
-            / ".dm/events.jsonl"
-        )
-        file_content = (
-            f"\n{event_obj.model_dump_json()}" if events_file_path.is_file() else event_obj.model_dump_json()
-        )
-
-        async with aiofiles.open(events_file_path, "a") as events_file:
-            await events_file.write(file_content)
-
     def generate_create_event_attributes(self, entry: Meta, attributes: dict):
         generated_attributes = {}
         for key, value in entry.__dict__.items():
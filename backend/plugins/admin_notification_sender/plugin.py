@@ -1,13 +1,13 @@
 import json
 from sys import modules as sys_modules
 from models.core import Notification, NotificationData, PluginBase, Event, Translation
-from utils.helpers import branch_path, camel_case
+from utils.helpers import camel_case
 from utils.notification import NotificationManager
 from utils.redis_services import RedisServices
 from utils.repository import internal_save_model, get_entry_attachments
 from utils.settings import settings
 from fastapi.logger import logger
-from utils.db import load, load_resource_payload, save_payload_from_json
+from utils.db import entry_dm_path, load, load_resource_payload, save_payload_from_json
 
 
 class Plugin(PluginBase):
@@ -105,10 +105,11 @@ class Plugin(PluginBase):
 
     async def prepare_request(self, notification_dict) -> dict:
         # Get Notification Request Images
-        attachments_path = (
-            settings.spaces_folder
-            / f"{settings.management_space}/{branch_path(notification_dict['branch_name'])}/"
-            f"{notification_dict['subpath']}/.dm/{notification_dict['shortname']}"
+        attachments_path = entry_dm_path(
+            settings.management_space,
+            notification_dict["subpath"],
+            notification_dict["shortname"],
+            notification_dict["branch_name"],
         )
         notification_attachments = await get_entry_attachments(
             subpath=f"{notification_dict['subpath']}/{notification_dict['shortname']}",
@@ -1,23 +1,67 @@
 import sys
-from models.core import ActionType, Attachment, PluginBase, Event, Space
+
+from fastapi.logger import logger
+
+from create_index import Reindexer, load_folder_to_redis
+from models import api, core
+from models.core import ActionType, Attachment, Event, PluginBase, Space
+from models.enums import ContentType, ResourceType
+from utils import db, query_cache, reindex_manifest
 from utils.helpers import camel_case
+from utils.redis_services import RedisServices
 from utils.repository import generate_payload_string
 from utils.spaces import get_spaces
-import utils.db as db
-from models import core
-from models.enums import ContentType, ResourceType
-from utils.redis_services import RedisServices
-from fastapi.logger import logger
-from create_index import main as reload_redis
 
 
 class Plugin(PluginBase):
     async def hook(self, data: Event):
+        await self.update_index(data)
+        # The cached query results are stale once the index is updated
+        await query_cache.bump(
+            data.space_name,
+            data.branch_name,
+            data.subpath,
+            data.shortname,
+            tree=data.resource_type == ResourceType.folder
+            and data.action_type in [ActionType.delete, ActionType.move],
+        )
+
+    async def hook_many(self, events: list[Event]):
+        """Index the entries of a batch of create events, as an import issues, in one pipeline"""
+        data = events[0]
+        if not self.is_bulk_create(events):
+            await super().hook_many(events)
+            return
+
+        spaces = await get_spaces()
+        if (
+            data.space_name in spaces
+            and Space.model_validate_json(spaces[data.space_name]).indexing_enabled
+        ):
+            await self.save_bulk_docs(data, [str(event.shortname) for event in events])
+        await query_cache.bump(data.space_name, data.branch_name, data.subpath)
+
+    @staticmethod
+    def is_bulk_create(events: list[Event]) -> bool:
+        """Whether the events create entries of the same subpath and type, other than attachments"""
+        data = events[0]
+        if not isinstance(data.resource_type, ResourceType) or issubclass(
+            getattr(sys.modules["models.core"], camel_case(data.resource_type)), Attachment
+        ):
+            return False
+        return all(
+            event.action_type == ActionType.create
+            and isinstance(event.shortname, str)
+            and event.subpath == data.subpath
+            and event.resource_type == data.resource_type
+            for event in events
+        )
+
+    async def update_index(self, data: Event):
         self.data = data
         # Type narrowing for PyRight
         if (
-            not isinstance(data.shortname, str)
-            or not isinstance(data.resource_type, ResourceType)
+            not isinstance(data.resource_type, ResourceType)
             or not isinstance(data.attributes, dict)
         ):
             logger.error("invalid data at redis_db_update")
@@ -30,6 +74,10 @@ class Plugin(PluginBase):
         ):
             return
 
+        if not isinstance(data.shortname, str):
+            logger.error("invalid data at redis_db_update")
+            return
+
         class_type = getattr(
             sys.modules["models.core"],
             camel_case(core.ResourceType(data.resource_type)),
@@ -43,7 +91,7 @@ class Plugin(PluginBase):
                 ActionType.delete,
                 ActionType.move,
             ]:
-                await reload_redis(for_space=data.space_name)
+                await self.update_folder_index(redis_services, data)
                 return
 
             if data.action_type == ActionType.delete:
@@ -150,6 +198,95 @@ class Plugin(PluginBase):
                         data.subpath,
                     )
 
+    async def update_folder_index(self, redis_services: RedisServices, data: Event):
+        """Delete the docs of a deleted or moved folder and of everything under it, then
+        index a moved folder at its destination, parsing its entries in process"""
+        subpath, shortname = data.subpath, str(data.shortname)
+        if data.action_type == ActionType.move:
+            subpath, shortname = data.attributes["src_subpath"], data.attributes["src_shortname"]
+        folder_subpath = f"{subpath.strip('/')}/{shortname}".strip("/")
+
+        await redis_services.delete_doc(
+            data.space_name, data.branch_name, "meta", shortname, subpath
+        )
+        await redis_services.delete_docs_under(data.space_name, data.branch_name, folder_subpath)
+        await reindex_manifest.forget_subpath(
+            redis_services, data.space_name, data.branch_name, folder_subpath
+        )
+        if data.action_type != ActionType.move:
+            return
+
+        reindexer = Reindexer(in_process=True)
+        await load_folder_to_redis(
+            data.space_name,
+            data.branch_name,
+            f"{data.subpath.strip('/')}/{data.shortname}".strip("/"),
+            reindexer,
+        )
+
+    async def save_bulk_docs(self, data: Event, shortnames: list[str]) -> None:
+        """Index the meta and payload docs of a batch of created entries in one pipeline"""
+        class_type = getattr(
+            sys.modules["models.core"],
+            camel_case(core.ResourceType(data.resource_type)),
+        )
+        docs: list[dict] = []
+        async with RedisServices() as redis_services:
+            for shortname in shortnames:
+                try:
+                    meta = await db.load(
+                        space_name=data.space_name,
+                        subpath=data.subpath,
+                        shortname=shortname,
+                        class_type=class_type,
+                        user_shortname=data.user_shortname,
+                        branch_name=data.branch_name,
+                    )
+                except api.Exception:
+                    continue
+
+                meta_doc_id, meta_json = redis_services.prepate_meta_doc(
+                    data.space_name, data.branch_name, data.subpath, meta
+                )
+                payload = {}
+                if (
+                    meta.payload
+                    and meta.payload.content_type == ContentType.json
+                    and meta.payload.body is not None
+                ):
+                    payload = db.load_resource_payload(
+                        space_name=data.space_name,
+                        subpath=data.subpath,
+                        filename=meta.payload.body,
+                        class_type=class_type,
+                        branch_name=data.branch_name,
+                    )
+
+                meta_json["payload_string"] = await generate_payload_string(
+                    space_name=data.space_name,
+                    subpath=meta_json["subpath"],
+                    shortname=meta_json["shortname"],
+                    branch_name=data.branch_name,
+                    payload=payload,
+                )
+                docs.append({"doc_id": meta_doc_id, "payload": meta_json})
+
+                if meta.payload:
+                    payload.update(meta_json)
+                    payload_doc_id, payload_doc = redis_services.prepare_payload_doc(
+                        data.space_name,
+                        data.branch_name,
+                        data.subpath,
+                        meta,
+                        payload,
+                        data.resource_type or ResourceType.content,
+                    )
+                    if payload_doc_id:
+                        docs.append({"doc_id": payload_doc_id, "payload": payload_doc})
+
+            if docs:
+                await redis_services.save_bulk(docs)
+
     async def update_parent_entry_payload_string(self) -> None:
         async with RedisServices() as redis_services:
             # get the parent meta doc
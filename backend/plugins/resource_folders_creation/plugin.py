@@ -44,7 +44,6 @@ class Plugin(PluginBase):
                     for_space=data.shortname,
                     # for_schemas=sys_schemas,
                     for_custom_indices=False,
-                    del_docs=False,
                 )
 
             # redis_update_plugin = RedisUpdatePlugin()
@@ -12,14 +12,14 @@ from models.core import (
 from utils.notification import NotificationManager
 
 # from plugins.web_notification import WebNotifier, websocket_push
-from utils.helpers import branch_path, camel_case, replace_message_vars
+from utils.helpers import camel_case, replace_message_vars
 
 # from utils.notification import NotificationContext, send_notification
 from utils.redis_services import RedisServices
 from utils.repository import internal_save_model, get_entry_attachments, get_group_users
 from utils.settings import settings
 from fastapi.logger import logger
-from utils.db import load, load_resource_payload
+from utils.db import entry_dm_path, load, load_resource_payload
 
 
 class Plugin(PluginBase):
@@ -158,10 +158,11 @@ class Plugin(PluginBase):
                 notification_dict["description"][locale], entry, locale
             )
         # Get Notification Request Images
-        attachments_path = (
-            settings.spaces_folder
-            / f"{settings.management_space}/{branch_path(notification_dict['branch_name'])}"
-            f"/{notification_dict['subpath']}/.dm/{notification_dict['shortname']}"
+        attachments_path = entry_dm_path(
+            settings.management_space,
+            notification_dict["subpath"],
+            notification_dict["shortname"],
+            notification_dict["branch_name"],
         )
         notification_attachments = await get_entry_attachments(
             subpath=f"{notification_dict['subpath']}/{notification_dict['shortname']}",
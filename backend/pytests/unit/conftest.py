@@ -0,0 +1,261 @@
+import fnmatch
+import inspect
+import json
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import pytest
+from redis.exceptions import ResponseError
+
+from models import core
+from utils import db
+from utils.redis_services import RedisServices
+from utils.settings import settings
+
+
+@pytest.fixture
+def spaces_folder(tmp_path, monkeypatch):
+    """An empty spaces folder, the query cache off as it needs redis"""
+    monkeypatch.setattr(settings, "spaces_folder", tmp_path)
+    monkeypatch.setattr(settings, "query_cache_size", 0)
+    db.invalidate_meta_cache()
+    db._spaces_storage.clear()
+    yield tmp_path
+    db.invalidate_meta_cache()
+    db._spaces_storage.clear()
+
+
+def write_space_meta(space_name: str, **attributes):
+    """Writes the space meta straight into the spaces folder, e.g. with its storage settings"""
+    space_meta_path = settings.spaces_folder / space_name / ".dm" / "meta.space.json"
+    space_meta_path.parent.mkdir(parents=True, exist_ok=True)
+    space_meta_path.write_text(json.dumps({"shortname": space_name, "owner_shortname": "tester", **attributes}))
+
+
+async def save_content(
+    space_name: str, shortname: str, subpath: str = "/content", displayname: str = "", **attributes
+) -> core.Content:
+    meta = core.Content(
+        shortname=shortname,
+        owner_shortname="tester",
+        is_active=True,
+        displayname=core.Translation(en=displayname) if displayname else None,
+        **attributes,
+    )
+    await db.save(space_name, subpath, meta, settings.default_branch)
+    return meta
+
+
+class FakeRedisServices(RedisServices):
+    """Keeps the json docs, the hashes, the plain keys and the indices in dicts, without connecting.
+    The searches are recorded, then answered by `searcher` if set, else by FT.SEARCH serving `rows`"""
+
+    def __new__(cls, *_):
+        # Not the RedisServices singleton
+        return object.__new__(cls)
+
+    def __init__(self):
+        self.docs: dict = {}
+        self.hashes: dict = {}
+        self.keys_values: dict = {}
+        # Whether each index is still being built, the ones created while slow_builds is set never get done
+        self.indices: dict[str, bool] = {}
+        self.aliases: dict[str, str] = {}
+        self.slow_builds = False
+        self.created: list[str] = []
+        self.altered: list[tuple[str, list]] = []
+        self.rows: list[dict] = []
+        self.searcher: Callable[..., Awaitable[dict]] | None = None
+        self.searches: list[dict] = []
+        self.calls: list[tuple[str, str]] = []
+        self.mgets: list[list[str]] = []
+        self.executed: list[int] = []
+
+    async def initialize(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        return None
+
+    async def search(self, *args, **kwargs):
+        bound = inspect.signature(RedisServices.search).bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = {name: value for name, value in bound.arguments.items() if name != "self"}
+        self.searches.append(arguments)
+        if self.searcher:
+            return await self.searcher(**arguments)
+        return await super().search(*args, **kwargs)
+
+    async def search_rows(self, offset: int, limit: int, **_) -> dict:
+        """A `searcher` paging through `rows` as they are, whatever the query"""
+        return {
+            "data": [json.dumps(row) for row in self.rows[offset:offset + limit]],
+            "total": len(self.rows),
+        }
+
+    async def list_indices(self):
+        self.calls.append(("list", ""))
+        return list(self.indices)
+
+    def ft(self, index_name="idx") -> Any:
+        return FakeIndex(self, index_name)
+
+    def json(self, encoder=None, decoder=None) -> Any:
+        return FakeJson(self)
+
+    def pipeline(self, transaction=True, shard_hint=None) -> Any:
+        return FakePipeline(self)
+
+    async def execute_command(self, *args, **options):
+        command, alias, index_name = args
+        assert command in ("FT.ALIASADD", "FT.ALIASUPDATE")
+        self.aliases[alias] = index_name
+
+    async def get(self, name):
+        return self.keys_values.get(name)
+
+    async def set(self, name, value, *args, **kwargs):
+        self.keys_values[name] = value
+
+    async def delete(self, *names):
+        return sum(
+            any(store.pop(name, None) is not None for store in (self.docs, self.hashes, self.keys_values))
+            for name in names
+        )
+
+    async def hmget(self, name, keys, *args):
+        return [self.hashes.get(name, {}).get(key) for key in keys]
+
+    async def scan_iter(self, match=None, count=None, _type=None, **kwargs):
+        for key in [*self.docs, *self.hashes, *self.keys_values]:
+            if match is None or fnmatch.fnmatchcase(key, str(match)):
+                yield key
+
+    async def hscan_iter(self, name, match=None, count=None):
+        for item in self.hashes.get(name, {}).items():
+            yield item
+
+
+class FakeIndex:
+    """An FT index of the fake services, its alias resolved"""
+
+    def __init__(self, services: FakeRedisServices, name: str):
+        self.services = services
+        self.name = name
+
+    def resolved(self) -> str:
+        name = self.services.aliases.get(self.name, self.name)
+        if name not in self.services.indices:
+            raise ResponseError(f"{self.name}: no such index")
+        return name
+
+    async def info(self):
+        self.services.calls.append(("info", self.name))
+        name = self.resolved()
+        return {"index_name": name, "indexing": int(self.services.indices[name])}
+
+    async def search(self, query, query_params=None):
+        self.services.calls.append(("search", self.name))
+        self.resolved()
+        return {
+            "results": [{"extra_attributes": {"$": json.dumps(row)}} for row in self.services.rows],
+            "total_results": len(self.services.rows),
+        }
+
+    async def create_index(self, fields, definition=None):
+        self.services.indices[self.name] = self.services.slow_builds
+        self.services.created.append(self.name)
+
+    async def alter_schema_add(self, fields):
+        self.services.altered.append((self.name, fields))
+
+    async def dropindex(self, delete_documents=False):
+        self.services.indices.pop(self.name, None)
+
+
+class FakeJson:
+    """The RedisJSON commands over the docs of the fake services"""
+
+    def __init__(self, services: FakeRedisServices):
+        self.services = services
+
+    async def set(self, name, path, obj, nx=False, xx=False, decode_keys=False):
+        if nx and name in self.services.docs:
+            return None
+        self.services.docs[name] = obj
+        return True
+
+    async def get(self, name, *args, no_escape=False):
+        return self.services.docs.get(name)
+
+    async def mget(self, keys, path):
+        self.services.mgets.append(list(keys))
+        return [self.services.docs.get(key) for key in keys]
+
+    async def delete(self, key, path="$"):
+        return int(self.services.docs.pop(key, None) is not None)
+
+
+class FakePipeline:
+    """Queues the json sets, the deletes and the hash writes, counting the commands of each execute"""
+
+    def __init__(self, services: FakeRedisServices):
+        self.services = services
+        self.commands: list = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        return None
+
+    def json(self):
+        return self
+
+    def set(self, name, _, doc):
+        self.commands.append(("set", name, doc))
+
+    def delete(self, *names):
+        self.commands.extend(("delete", name, None) for name in names)
+
+    def hset(self, name, key, value):
+        self.commands.append(("hset", (name, key), value))
+
+    def hdel(self, name, key):
+        self.commands.append(("hdel", (name, key), None))
+
+    async def execute(self):
+        self.services.executed.append(len(self.commands))
+        for command, target, value in self.commands:
+            if command == "set":
+                self.services.docs[target] = value
+            elif command == "delete":
+                self.services.docs.pop(target, None)
+            elif command == "hset":
+                self.services.hashes.setdefault(target[0], {})[target[1]] = value
+            else:
+                self.services.hashes.get(target[0], {}).pop(target[1], None)
+        self.commands = []
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Builds fake redis services, the ones handed out by RedisServices() in each of the given modules"""
+    monkeypatch.setattr(RedisServices, "known_indices", None)
+
+    def build(*modules) -> FakeRedisServices:
+        services = FakeRedisServices()
+
+        class HandedOut(FakeRedisServices):
+            # Keeps the class attributes, e.g. RedisServices.SYS_ATTRIBUTES
+            def __new__(cls, *_):
+                return services
+
+        for module in modules:
+            monkeypatch.setattr(module, "RedisServices", HandedOut)
+        return services
+
+    return build
@@ -0,0 +1,151 @@
+import pytest
+
+from models import core
+from models.enums import ActionType, ContentType, ResourceType
+from utils import db, file_writer
+from utils import plugin_manager as plugin_manager_module
+from utils.plugin_manager import PluginManager
+from utils.settings import settings
+
+SPACE = "import_space"
+
+
+def content(shortname: str, payload: bool = False) -> core.Content:
+    return core.Content(
+        shortname=shortname,
+        owner_shortname="tester",
+        is_active=True,
+        payload=core.Payload(content_type=ContentType.json, body=f"{shortname}.json") if payload else None,
+    )
+
+
+@pytest.mark.asyncio
+async def test_create_many_writes_every_entry(spaces_folder):
+    errors = await db.create_many(
+        SPACE,
+        [
+            ("/content", content("one", payload=True), {"title": "one"}),
+            ("/content", content("two"), None),
+            ("/content", content("one"), None),
+        ],
+        settings.default_branch,
+    )
+
+    assert errors[0] is None and errors[1] is None
+    # The same shortname twice within the batch
+    assert errors[2] is not None and errors[2].status_code == 400
+    meta = await db.load(SPACE, "/content", "one", core.Content)
+    assert meta.payload and meta.payload.body == "one.json"
+    payload = db.load_resource_payload(SPACE, "/content", "one.json", core.Content)
+    assert payload == {"title": "one"}
+    assert await db.load(SPACE, "/content", "two", core.Content)
+
+
+@pytest.mark.asyncio
+async def test_create_many_rejects_existing_entries(spaces_folder):
+    await db.save(SPACE, "/content", content("one"), settings.default_branch)
+    errors = await db.create_many(SPACE, [("/content", content("one"), None)], settings.default_branch)
+    assert errors[0] is not None and errors[0].status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_failed_payload_rolls_back_the_meta_file(spaces_folder, monkeypatch):
+    write_files = file_writer.write_files
+
+    async def payloads_failing(files):
+        written = [one for one in files if one[0].name != "one.json"]
+        errors = dict(zip([path for path, _ in written], await write_files(written)))
+        return [errors.get(path, OSError("disk full")) for path, _ in files]
+
+    monkeypatch.setattr(file_writer, "write_files", payloads_failing)
+    errors = await db.create_many(
+        SPACE,
+        [
+            ("/content", content("one", payload=True), {"title": "one"}),
+            ("/content", content("two"), None),
+        ],
+        settings.default_branch,
+    )
+
+    assert errors[0] is not None and errors[0].status_code == 500
+    assert errors[1] is None
+    path, filename = db.metapath(SPACE, "/content", "one", core.Content)
+    assert not (path / filename).exists()
+    assert await db.load(SPACE, "/content", "two", core.Content)
+
+
+class RecordingPlugin(core.PluginBase):
+    def __init__(self) -> None:
+        self.hooked: list[str | None] = []
+
+    async def hook(self, data: core.Event) -> None:
+        self.hooked.append(data.shortname)
+
+
+class BatchPlugin(RecordingPlugin):
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches: list[list[str | None]] = []
+
+    async def hook_many(self, events: list[core.Event]) -> None:
+        self.batches.append([event.shortname for event in events])
+
+
+def plugin_wrapper(shortname: str, plugin: core.PluginBase, subpaths: list[str]) -> core.PluginWrapper:
+    return core.PluginWrapper(
+        shortname=shortname,
+        is_active=True,
+        listen_time=core.EventListenTime.after,
+        filters=core.EventFilter(
+            subpaths=subpaths,
+            resource_types=["content"],
+            schema_shortnames=["__ALL__"],
+            actions=[ActionType.create],
+        ),
+        object=plugin,
+    )
+
+
+def create_event(shortname: str, subpath: str = "/content") -> core.Event:
+    return core.Event(
+        space_name=SPACE,
+        subpath=subpath,
+        shortname=shortname,
+        action_type=ActionType.create,
+        resource_type=ResourceType.content,
+        user_shortname="tester",
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_events_reach_every_plugin(monkeypatch):
+    space = core.Space(shortname=SPACE, owner_shortname="tester", active_plugins=["each", "batch"])
+
+    async def get_spaces():
+        return {SPACE: space.model_dump_json()}
+
+    monkeypatch.setattr(plugin_manager_module, "get_spaces", get_spaces)
+    each, batch = RecordingPlugin(), BatchPlugin()
+    manager = PluginManager()
+    manager.is_pytest = True
+    monkeypatch.setattr(
+        manager,
+        "plugins_wrappers",
+        {
+            ActionType.create: [
+                plugin_wrapper("each", each, ["__ALL__"]),
+                plugin_wrapper("batch", batch, ["/content"]),
+            ]
+        },
+    )
+
+    await manager.after_actions([create_event("one"), create_event("two"), create_event("three", "/other")])
+    # One by one, each event with its shortname, by default
+    assert each.hooked == ["one", "two", "three"]
+    # Together for the plugins handling batches, the events matching their filters only
+    assert batch.batches == [["one", "two"]]
+    assert batch.hooked == []
+
+    await manager.after_action(create_event("four"))
+    assert each.hooked[-1] == "four"
+    assert batch.hooked == ["four"]
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+
+from models import core
+from utils import blob_store, db
+
+SPACE = "blob_space"
+
+
+def stage(folder, content: bytes, name: str = "upload.tmp"):
+    staged_file = folder / name
+    staged_file.write_bytes(content)
+    return staged_file, hashlib.sha1(content).hexdigest()
+
+
+def test_same_content_is_stored_once(spaces_folder):
+    folder = spaces_folder / SPACE / "content"
+    folder.mkdir(parents=True)
+    staged_file, checksum = stage(folder, b"picture")
+    blob_store.store(SPACE, checksum, staged_file, folder / "one.png")
+    staged_file, _ = stage(folder, b"picture")
+    blob_store.store(SPACE, checksum, staged_file, folder / "two.png", fsync=True)
+
+    blob = blob_store.blob_path(SPACE, checksum)
+    assert os.stat(blob).st_nlink == 3
+    assert os.path.samefile(folder / "one.png", folder / "two.png")
+    assert blob_store.is_stored(SPACE, checksum, folder / "two.png")
+    assert not staged_file.exists()
+    assert sorted(os.listdir(folder)) == ["one.png", "two.png"]
+
+
+def test_release_drops_unlinked_blobs_only(spaces_folder):
+    folder = spaces_folder / SPACE / "content"
+    folder.mkdir(parents=True)
+    staged_file, checksum = stage(folder, b"picture")
+    blob_store.store(SPACE, checksum, staged_file, folder / "one.png")
+    blob = blob_store.blob_path(SPACE, checksum)
+
+    blob_store.release(SPACE, [checksum, None])
+    assert blob.exists()
+    os.remove(folder / "one.png")
+    blob_store.release(SPACE, [checksum])
+    assert not blob.exists()
+
+
+def test_adopt_shares_an_existing_file(spaces_folder):
+    folder = spaces_folder / SPACE / "content"
+    folder.mkdir(parents=True)
+    (folder / "one.png").write_bytes(b"picture")
+    checksum = hashlib.sha1(b"picture").hexdigest()
+
+    assert blob_store.adopt(SPACE, checksum, folder / "one.png", folder / "copy.png")
+    assert os.path.samefile(folder / "one.png", folder / "copy.png")
+    assert blob_store.is_stored(SPACE, checksum, folder / "one.png")
+
+
+def test_sweep_and_referenced_checksums(spaces_folder):
+    folder = spaces_folder / SPACE / "content"
+    (folder / ".dm" / "one").mkdir(parents=True)
+    staged_file, kept = stage(folder, b"kept")
+    blob_store.store(SPACE, kept, staged_file, folder / "one.png")
+    staged_file, dropped = stage(folder, b"dropped")
+    blob_store.store(SPACE, dropped, staged_file, folder / "two.png")
+    os.remove(folder / "two.png")
+
+    (folder / ".dm" / "one" / "meta.content.json").write_text(json.dumps(
+        {"shortname": "one", "payload": {"content_type": "image", "body": "one.png", "checksum": kept}}
+    ))
+    (folder / ".dm" / "one" / "meta.broken.json").write_text("{not json")
+    assert blob_store.referenced_checksums(folder) == {kept}
+
+    assert blob_store.sweep(SPACE) == 1
+    assert blob_store.blob_path(SPACE, kept).exists()
+    assert not blob_store.blob_path(SPACE, dropped).exists()
+
+
+def test_store_is_apart_from_the_root_entries(spaces_folder):
+    entry_folder, _ = db.metapath(SPACE, "/", "blobs", core.Content)
+    assert entry_folder not in blob_store.blob_path(SPACE, hashlib.sha1(b"picture").hexdigest()).parents
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from models import api, core
+from models.core import ACL, ActionType
+from models.enums import ResourceType
+from utils.access_control import AccessCandidate, access_control
+from utils.settings import settings
+
+SPACE = "acl_space"
+
+VIEW_CONTENT = {
+    f"{SPACE}:content:{ResourceType.content}": {
+        "allowed_actions": [ActionType.view],
+        "conditions": [],
+        "restricted_fields": [],
+        "allowed_fields_values": {},
+    }
+}
+
+
+@pytest.fixture
+def user(monkeypatch):
+    """A user allowed to view the content of /content only, the entries ACL read from `acls`"""
+    acls: dict[str, list[ACL]] = {}
+
+    async def get_user_permissions(_):
+        return VIEW_CONTENT
+
+    async def load_user_meta(_):
+        return core.User(shortname="tester", owner_shortname="tester", is_active=True)
+
+    async def load_acl(_, __, ___, entry_shortname):
+        await asyncio.sleep(0)
+        if entry_shortname not in acls:
+            raise api.Exception(404, api.Error(type="db", code=12, message="missing"))
+        return acls[entry_shortname]
+
+    monkeypatch.setattr(access_control, "get_user_permissions", get_user_permissions)
+    monkeypatch.setattr(access_control, "load_user_meta", load_user_meta)
+    monkeypatch.setattr(access_control, "load_acl", load_acl)
+    return acls
+
+
+def candidate(subpath: str, shortname: str, **kwargs) -> AccessCandidate:
+    return AccessCandidate(
+        subpath=subpath,
+        resource_type=ResourceType.content,
+        action_type=ActionType.view,
+        entry_shortname=shortname,
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_permissions_then_acl(user):
+    user["shared"] = [ACL(user_shortname="tester", allowed_actions=[ActionType.view])]
+    allowed = await access_control.check_access_many(
+        "tester",
+        SPACE,
+        [
+            candidate("/content", "one"),
+            candidate("/private", "shared"),
+            candidate("/private", "missing"),
+            candidate("/private", "loaded", acl=[ACL(user_shortname="tester", allowed_actions=[ActionType.view])]),
+            candidate("/private", "other", acl=[ACL(user_shortname="other", allowed_actions=[ActionType.view])]),
+        ],
+    )
+    assert allowed == [True, True, False, True, False]
+
+
+@pytest.mark.asyncio
+async def test_record_attributes_default_is_not_shared(user):
+    assert candidate("/content", "one").record_attributes is None
+    assert await access_control.check_access_many(
+        "tester", SPACE, [candidate("/content", "one"), candidate("/content", "two", record_attributes={})]
+    ) == [True, True]
+
+
+@pytest.mark.asyncio
+async def test_acl_loads_are_bounded(user, monkeypatch):
+    monkeypatch.setattr(settings, "io_workers", 2)
+    running = peak = 0
+
+    async def load_acl(_, __, ___, ____):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return []
+
+    monkeypatch.setattr(access_control, "load_acl", load_acl)
+    allowed = await access_control.check_access_many(
+        "tester", SPACE, [candidate("/private", f"n{index}") for index in range(10)]
+    )
+    assert allowed == [False] * 10
+    assert peak == 2
@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+
+from api.public import router as public_router
+from compact_storage import archive_history, compress_payload
+from models import core
+from models.enums import ContentType, ResourceType
+from pytests.unit.conftest import write_space_meta
+from utils import db, exporter, storage_codec
+from utils.settings import settings
+
+SPACE = "compressed_space"
+
+DATA = {"text": "repeated " * 200}
+
+
+async def save_with_payload(shortname: str, payload_data: dict) -> core.Content:
+    meta = core.Content(
+        shortname=shortname,
+        owner_shortname="tester",
+        is_active=True,
+        payload=core.Payload(content_type=ContentType.json, body=f"{shortname}.json"),
+    )
+    await db.save(SPACE, "/content", meta, settings.default_branch)
+    await db.save_payload_from_json(SPACE, "/content", meta, payload_data, settings.default_branch)
+    return meta
+
+
+def payload_file(shortname: str):
+    return db.payload_path(SPACE, "/content", core.Content) / f"{shortname}.json"
+
+
+def test_round_trip():
+    raw = json.dumps(DATA).encode()
+    compressed = storage_codec.compress(raw)
+
+    assert compressed.startswith(storage_codec.COMPRESSED_MAGIC)
+    assert len(compressed) < len(raw)
+    assert storage_codec.decompress(compressed) == raw
+    assert storage_codec.decompress(raw) == raw
+    assert storage_codec.loads(compressed) == DATA
+
+
+def test_corrupted_data_raises_a_decode_error():
+    compressed = storage_codec.compress(json.dumps(DATA))
+    with pytest.raises(storage_codec.DECODE_ERRORS):
+        storage_codec.loads(compressed[:-10])
+
+
+@pytest.mark.asyncio
+async def test_payloads_above_the_threshold_are_compressed(spaces_folder):
+    write_space_meta(SPACE, compression_threshold=100)
+    await save_with_payload("big", DATA)
+    await save_with_payload("small", {"text": "short"})
+
+    assert storage_codec.is_compressed(payload_file("big").read_bytes())
+    assert not storage_codec.is_compressed(payload_file("small").read_bytes())
+    assert db.load_resource_payload(SPACE, "/content", "big.json", core.Content) == DATA
+
+
+def test_compactor_keeps_the_payload_cold(tmp_path):
+    file_path = tmp_path / "cold.json"
+    file_path.write_text(json.dumps(DATA))
+    os.utime(file_path, ns=(1_000_000_000, 1_000_000_000))
+
+    assert compress_payload(file_path, 100)
+    assert os.stat(file_path).st_mtime_ns == 1_000_000_000
+    assert storage_codec.loads(file_path.read_bytes()) == DATA
+    # Already compressed
+    assert not compress_payload(file_path, 100)
+
+
+def test_archived_history_is_restored(tmp_path):
+    history_file = tmp_path / "history.jsonl"
+    lines = "".join(json.dumps({"index": index}) + "\n" for index in range(50))
+    history_file.write_text(lines)
+
+    assert archive_history(history_file)
+    assert not history_file.exists()
+    db.rehydrate_history(history_file)
+    assert history_file.read_text() == lines
+    assert not history_file.with_name("history.jsonl.zst").exists()
+
+
+@pytest.mark.asyncio
+async def test_public_payload_is_decompressed(spaces_folder, monkeypatch):
+    async def allowed(**_):
+        return True
+
+    async def no_plugins(_):
+        return None
+
+    monkeypatch.setattr(public_router.access_control, "check_access", allowed)
+    monkeypatch.setattr(public_router.plugin_manager, "before_action", no_plugins)
+    monkeypatch.setattr(public_router.plugin_manager, "after_action", no_plugins)
+    write_space_meta(SPACE, compression_threshold=100)
+    await save_with_payload("big", DATA)
+
+    response = await public_router.retrieve_entry_or_attachment_payload(
+        ResourceType.content, SPACE, "/content", "big", "json", settings.default_branch
+    )
+    assert json.loads(bytes(response.body)) == DATA
+
+
+@pytest.mark.asyncio
+async def test_exporter_reads_compressed_payloads(tmp_path):
+    space_path = tmp_path / SPACE
+    schema_file = space_path / "schema" / "text.json"
+    schema_file.parent.mkdir(parents=True)
+    schema_file.write_text(json.dumps({"type": "object", "properties": {"text": {"type": "string"}}}))
+    meta_file = space_path / "content" / ".dm" / "big" / "meta.content.json"
+    meta_file.parent.mkdir(parents=True)
+    meta_file.write_bytes(storage_codec.compress(json.dumps({"shortname": "big", "is_active": True})))
+    (space_path / "content" / "big.json").write_bytes(storage_codec.compress(json.dumps(DATA)))
+
+    await exporter.extract(SPACE, "content", "content", "text", {}, {}, str(tmp_path), str(tmp_path / "out"))
+
+    data_file = tmp_path / "out" / exporter.OUTPUT_FOLDER_NAME / SPACE / "content" / "data.ljson"
+    exported = [json.loads(line) for line in data_file.read_text().splitlines()]
+    assert len(exported) == 1
@@ -0,0 +1,86 @@
+import json
+
+import pytest
+
+from models import api, core
+from utils import repository
+from utils.settings import settings
+
+SPACE = "mget_space"
+
+
+@pytest.fixture
+def redis_services(fake_redis):
+    return fake_redis(repository)
+
+
+def content_doc(shortname: str, **attributes) -> dict:
+    return {
+        "shortname": shortname,
+        "subpath": "/content",
+        "resource_type": "content",
+        "branch_name": settings.default_branch,
+        **attributes,
+    }
+
+
+@pytest.mark.asyncio
+async def test_docs_map_leaves_out_missing_and_duplicates(redis_services):
+    redis_services.docs = {"a": [{"one": 1}], "b": [json.dumps({"two": 2})], "c": []}
+    docs = await redis_services.get_docs_map(["a", "b", "a", "c", "missing"])
+    assert docs == {"a": {"one": 1}, "b": {"two": 2}}
+    assert redis_services.mgets == [["a", "b", "c", "missing"]]
+
+    assert await redis_services.get_docs_map([]) == {}
+    assert len(redis_services.mgets) == 1
+
+
+@pytest.mark.asyncio
+async def test_locks_and_payloads_in_one_mget(redis_services):
+    def doc_id(schema: str, shortname: str):
+        return redis_services.generate_doc_id(SPACE, settings.default_branch, schema, shortname, "/content")
+
+    redis_services.docs = {
+        doc_id("lock", "locked"): [{"owner_shortname": "tester"}],
+        "payload:one": [{"body_field": "from the payload doc", "shortname": "one"}],
+    }
+    docs = [
+        content_doc("one", payload_doc_id="payload:one"),
+        content_doc("locked", payload_doc_id="payload:locked"),
+        content_doc("inline", payload_doc_id="payload:inline", inline_field="here"),
+    ]
+
+    extras = await repository.get_redis_docs_extras(
+        redis_services, SPACE, settings.default_branch, docs, retrieve_json_payload=True
+    )
+    assert len(redis_services.mgets) == 1
+    assert extras == [
+        ({}, {"body_field": "from the payload doc"}),
+        ({"owner_shortname": "tester"}, {}),
+        # Inline payloads aren't read again
+        ({}, None),
+    ]
+
+    extras = await repository.get_redis_docs_extras(
+        redis_services, SPACE, settings.default_branch, docs, retrieve_json_payload=False
+    )
+    assert [payload for _, payload in extras] == [None, None, None]
+    assert redis_services.mgets[-1] == [doc_id("lock", shortname) for shortname in ["one", "locked", "inline"]]
+
+
+@pytest.mark.asyncio
+async def test_page_records_read_their_locks_at_once(spaces_folder, redis_services):
+    redis_services.docs = {
+        redis_services.generate_doc_id(SPACE, settings.default_branch, "lock", "one", "/content"): [
+            {"owner_shortname": "tester"}
+        ],
+    }
+    page: list[tuple[str, core.Meta]] = [
+        (shortname, core.Content(shortname=shortname, owner_shortname="tester", is_active=True))
+        for shortname in ["one", "two"]
+    ]
+    query = api.Query(type="subpath", space_name=SPACE, subpath="/content")
+
+    records = await repository.get_subpath_page_records(query, spaces_folder / SPACE / "content", page)
+    assert len(redis_services.mgets) == 1
+    assert [record.attributes.get("locked") for record in records] == [{"owner_shortname": "tester"}, None]
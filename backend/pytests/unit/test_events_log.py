@@ -0,0 +1,78 @@
+import json
+from datetime import datetime, timedelta
+
+from utils import events_log
+from utils.settings import settings
+
+DAY = datetime(2026, 3, 1, 12)
+
+
+def event(timestamp: datetime, shortname: str) -> str:
+    return json.dumps({"timestamp": timestamp.isoformat(), "resource": {"shortname": shortname}})
+
+
+def shortnames(lines: list[bytes]) -> list[str]:
+    return [json.loads(line)["resource"]["shortname"] for line in lines]
+
+
+def fill(dm_path, days: int = 3, per_day: int = 4):
+    for day in range(days):
+        timestamp = DAY + timedelta(days=day)
+        events_log.append(
+            dm_path,
+            [event(timestamp + timedelta(minutes=index), f"d{day}_{index}") for index in range(per_day)],
+            timestamp,
+        )
+
+
+def test_daily_segments_and_roll_over(tmp_path, monkeypatch):
+    fill(tmp_path, days=2)
+    assert [one.name for one in events_log.segments(tmp_path)] == ["20260301.jsonl", "20260302.jsonl"]
+
+    monkeypatch.setattr(settings, "events_segment_size", 1)
+    events_log.append(tmp_path, [event(DAY + timedelta(days=1), "more")], DAY + timedelta(days=1))
+    assert events_log.segments(tmp_path)[-1].name == "20260302.1.jsonl"
+
+
+def test_legacy_log_is_the_oldest_segment(tmp_path):
+    (tmp_path / events_log.LEGACY_EVENTS_FILE).write_text(event(DAY - timedelta(days=30), "legacy") + "\n")
+    fill(tmp_path, days=1)
+
+    total, page = events_log.query(tmp_path, 0, 100)
+    assert total == 5
+    assert shortnames(page)[-1] == "legacy"
+
+
+def test_paging_newest_first(tmp_path):
+    fill(tmp_path)
+    total, page = events_log.query(tmp_path, 0, 3)
+    assert total == 12 and shortnames(page) == ["d2_3", "d2_2", "d2_1"]
+    # Across segments
+    total, page = events_log.query(tmp_path, 3, 3)
+    assert shortnames(page) == ["d2_0", "d1_3", "d1_2"]
+
+
+def test_date_range(tmp_path):
+    fill(tmp_path)
+    total, page = events_log.query(
+        tmp_path, 0, 100, from_date=DAY + timedelta(days=1), to_date=DAY + timedelta(days=1, minutes=1)
+    )
+    assert total == 2 and shortnames(page) == ["d1_1", "d1_0"]
+
+    total, _ = events_log.query(tmp_path, 0, 100, from_date=DAY + timedelta(days=10))
+    assert total == 0
+
+
+def test_search_skips_the_segments_without_the_term(tmp_path):
+    fill(tmp_path)
+    total, page = events_log.query(tmp_path, 0, 100, search="d0_2")
+    assert total == 1 and shortnames(page) == ["d0_2"]
+
+    summary_file = events_log.segments(tmp_path)[1].with_name("20260302.jsonl.summary.json")
+    assert summary_file.is_file()
+    summary = json.loads(summary_file.read_text())
+    assert summary["lines"] == 4
+    assert not events_log._may_contain(summary, "d0_2")
+    assert events_log._may_contain(summary, "d1_2")
+    # The newest segment is still written to, it gets no summary
+    assert not events_log.segments(tmp_path)[-1].with_name("20260303.jsonl.summary.json").exists()
@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import os
+import stat
+
+import pytest
+
+from utils import file_writer
+from utils.settings import settings
+
+
+@pytest.fixture(params=[False, True], ids=["plain", "fsync"])
+def fsync_writes(request, monkeypatch):
+    monkeypatch.setattr(settings, "fsync_writes", request.param)
+    return request.param
+
+
+def temp_files(folder):
+    return [one for one in os.listdir(folder) if one.endswith(".tmp")]
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    target = tmp_path / "meta.content.json"
+    target.write_text("before")
+    file_writer.atomic_write(target, "after", fsync=True)
+
+    assert target.read_text() == "after"
+    assert not temp_files(tmp_path)
+    # The mode open() would have given, not mkstemp's owner only one
+    umask = os.umask(0)
+    os.umask(umask)
+    assert stat.S_IMODE(os.stat(target).st_mode) == 0o666 & ~umask
+
+
+def test_failed_write_leaves_the_target_alone(tmp_path):
+    target = tmp_path / "meta.content.json"
+    target.write_text("before")
+    with pytest.raises(TypeError):
+        file_writer.atomic_write(target, 42)  # type: ignore
+
+    assert target.read_text() == "before"
+    assert not temp_files(tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_write_and_append(tmp_path, fsync_writes):
+    target = tmp_path / "history.jsonl"
+    await file_writer.write_file(target, "one\n")
+    await file_writer.append_file(target, b"two\n")
+    assert target.read_text() == "one\ntwo\n"
+    assert not temp_files(tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_a_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "fsync_writes", True)
+    monkeypatch.setattr(settings, "group_commit_window_ms", 20)
+    flushed: list[int] = []
+    flush = file_writer.GroupCommitWriter._flush
+
+    def counted_flush(batch):
+        flushed.append(len(batch))
+        return flush(batch)
+
+    monkeypatch.setattr(file_writer.GroupCommitWriter, "_flush", staticmethod(counted_flush))
+    await asyncio.gather(
+        *(file_writer.write_file(tmp_path / f"file_{index}", f"content {index}") for index in range(10))
+    )
+
+    assert flushed == [10]
+    for index in range(10):
+        assert (tmp_path / f"file_{index}").read_text() == f"content {index}"
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_releases_every_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "fsync_writes", True)
+    monkeypatch.setattr(settings, "group_commit_window_ms", 20)
+
+    def failed_flush(batch):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+    monkeypatch.setattr(file_writer.GroupCommitWriter, "_flush", staticmethod(failed_flush))
+    results = await asyncio.wait_for(
+        asyncio.gather(
+            *(file_writer.write_file(tmp_path / f"file_{index}", "content") for index in range(3)),
+            return_exceptions=True,
+        ),
+        timeout=5,
+    )
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_write_files_reports_each_error(tmp_path, fsync_writes):
+    files = [
+        (tmp_path / "one", "1"),
+        (tmp_path / "missing_folder" / "two", "2"),
+        (tmp_path / "three", b"3"),
+    ]
+    errors = await file_writer.write_files(files)
+
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], FileNotFoundError)
+    assert (tmp_path / "one").read_text() == "1"
+    assert (tmp_path / "three").read_text() == "3"
+
+
+class ChunkedSource:
+    def __init__(self, content: bytes):
+        self.content = content
+        self.reads: list[int] = []
+
+    async def read(self, size: int) -> bytes:
+        self.reads.append(size)
+        chunk, self.content = self.content[:size], self.content[size:]
+        return chunk
+
+
+@pytest.mark.asyncio
+async def test_stream_to_temp_then_commit(tmp_path, fsync_writes):
+    target = tmp_path / "payload.bin"
+    source = ChunkedSource(b"x" * 2500)
+    tmp_path_written, sha1 = await file_writer.stream_to_temp(target, source, 1000)
+
+    assert source.reads == [1000, 1000, 1000, 1000]
+    assert not target.exists()
+    await file_writer.commit_temp(tmp_path_written, target)
+    assert target.read_bytes() == b"x" * 2500
+    assert sha1 == hashlib.sha1(b"x" * 2500).hexdigest()
+    assert not temp_files(tmp_path)
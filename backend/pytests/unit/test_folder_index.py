@@ -0,0 +1,112 @@
+import pytest
+
+import create_index
+from models import core
+from models.enums import ActionType, ResourceType
+from plugins.redis_db_update import plugin as redis_db_update
+from pytests.unit.conftest import save_content
+from utils import db, reindex_manifest
+from utils.settings import settings
+
+SPACE = "reindexed_space"
+BRANCH = settings.default_branch
+
+
+@pytest.fixture
+def redis_services(spaces_folder, fake_redis, monkeypatch):
+    services = fake_redis(create_index, redis_db_update)
+
+    async def get_spaces():
+        return {SPACE: core.Space(shortname=SPACE, owner_shortname="tester", indexing_enabled=True).model_dump_json()}
+
+    monkeypatch.setattr(redis_db_update, "get_spaces", get_spaces)
+    return services
+
+
+async def save_folder(subpath: str, shortname: str, contents: list[str]):
+    await db.save(SPACE, subpath, core.Folder(shortname=shortname, owner_shortname="tester"), BRANCH)
+    for one in contents:
+        await save_content(SPACE, one, f"{subpath}/{shortname}")
+
+
+async def index_folder(subpath: str):
+    await create_index.load_folder_to_redis(SPACE, BRANCH, subpath, create_index.Reindexer(in_process=True))
+
+
+def folder_event(action_type: ActionType, subpath: str, shortname: str, attributes: dict | None = None):
+    return core.Event(
+        space_name=SPACE,
+        branch_name=BRANCH,
+        subpath=subpath,
+        shortname=shortname,
+        action_type=action_type,
+        resource_type=ResourceType.folder,
+        user_shortname="tester",
+        attributes=attributes or {},
+    )
+
+
+def meta_shortnames(redis_services) -> set[str]:
+    return {doc_id.split(":meta:")[1] for doc_id in redis_services.docs if ":meta:" in doc_id}
+
+
+@pytest.mark.asyncio
+async def test_docs_under_a_subpath_are_deleted(redis_services):
+    docs = redis_services.docs
+    docs.update({
+        f"{SPACE}:{BRANCH}:meta:/a": {},
+        f"{SPACE}:{BRANCH}:meta:a/one": {},
+        f"{SPACE}:{BRANCH}:schema_x:a/b/two": {},
+        f"{SPACE}:{BRANCH}:meta:ab/three": {},
+        f"{SPACE}:other:meta:a/four": {},
+    })
+
+    assert await redis_services.delete_docs_under(SPACE, BRANCH, "/a") == 2
+    assert set(docs) == {f"{SPACE}:{BRANCH}:meta:/a", f"{SPACE}:{BRANCH}:meta:ab/three", f"{SPACE}:other:meta:a/four"}
+
+
+@pytest.mark.asyncio
+async def test_folder_is_loaded_with_its_entries(redis_services):
+    await save_folder("/", "a", ["one", "two"])
+    await save_folder("/a", "b", ["three"])
+
+    await index_folder("a")
+    assert meta_shortnames(redis_services) == {"/a", "a/one", "a/two", "a/b", "a/b/three"}
+
+
+@pytest.mark.asyncio
+async def test_deleted_folder_drops_its_docs_and_fingerprints(redis_services, monkeypatch):
+    await save_folder("/", "a", ["one"])
+    await save_folder("/a", "b", ["two"])
+    await save_folder("/", "c", ["three"])
+    await index_folder("a")
+    await index_folder("c")
+    assert reindex_manifest.manifest_key(SPACE, BRANCH, "a/b") in redis_services.hashes
+
+    def no_pool(*_, **__):
+        raise AssertionError("The folder is reindexed by a process pool")
+
+    monkeypatch.setattr(create_index, "ProcessPoolExecutor", no_pool)
+    await redis_db_update.Plugin().hook(folder_event(ActionType.delete, "/", "a"))
+
+    assert meta_shortnames(redis_services) == {"/c", "c/three"}
+    assert set(redis_services.hashes) == {reindex_manifest.manifest_key(SPACE, BRANCH, "c")}
+
+
+@pytest.mark.asyncio
+async def test_moved_folder_is_indexed_at_its_destination(redis_services, monkeypatch):
+    await save_folder("/", "a", ["one"])
+    await save_folder("/a", "b", ["two"])
+    await index_folder("a")
+
+    def no_pool(*_, **__):
+        raise AssertionError("The folder is reindexed by a process pool")
+
+    monkeypatch.setattr(create_index, "ProcessPoolExecutor", no_pool)
+    await db.move(SPACE, "/", "a", "/", "moved", core.Folder(shortname="a", owner_shortname="tester"), BRANCH)
+    await redis_db_update.Plugin().hook(
+        folder_event(ActionType.move, "/", "moved", {"src_subpath": "/", "src_shortname": "a"})
+    )
+
+    assert meta_shortnames(redis_services) == {"/moved", "moved/one", "moved/b", "moved/b/two"}
+    assert not any("a/" in key for key in redis_services.hashes)
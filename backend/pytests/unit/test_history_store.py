@@ -0,0 +1,66 @@
+import json
+
+from utils import history_store
+
+
+def lines(count: int, first: int = 0) -> str:
+    return "".join(json.dumps({"index": index}) + "\n" for index in range(first, first + count))
+
+
+def indexes(raw_lines: list[bytes]) -> list[int]:
+    return [json.loads(line)["index"] for line in raw_lines]
+
+
+def test_append_and_page_newest_first(tmp_path):
+    history_file = tmp_path / "history.jsonl"
+    history_store.append(history_file, lines(3))
+    history_store.append(history_file, lines(7, first=3).encode())
+
+    assert history_store.line_count(history_file) == 10
+    assert history_store.index_path(history_file).stat().st_size == 10 * history_store.OFFSET_SIZE
+    total, page = history_store.read_page(history_file, 0, 4)
+    assert total == 10 and indexes(page) == [3, 2, 1, 0]
+    # Offsets 0 and 1 both start from the first line, as tail -n +offset does
+    assert history_store.read_page(history_file, 1, 4) == (total, page)
+    assert indexes(history_store.read_page(history_file, 8, 5)[1]) == [9, 8, 7]
+    assert history_store.read_page(history_file, 20, 5) == (10, [])
+    assert indexes(history_store.read_lines(history_file, 2, 5)) == [2, 3, 4]
+
+
+def test_missing_or_stale_index_is_rebuilt(tmp_path):
+    history_file = tmp_path / "history.jsonl"
+    # Written before the index existed
+    history_file.write_text(lines(5))
+    assert history_store.line_count(history_file) == 5
+
+    # Appended to without updating the index
+    with open(history_file, "a") as opened_file:
+        opened_file.write(lines(2, first=5))
+    assert history_store.line_count(history_file) == 7
+    assert indexes(history_store.read_page(history_file, 0, 2)[1]) == [1, 0]
+
+    history_store.index_path(history_file).write_bytes(b"\0" * 3)
+    assert indexes(history_store.read_lines(history_file, 5, 7)) == [5, 6]
+
+
+def test_append_after_a_cut_short_line(tmp_path):
+    history_file = tmp_path / "history.jsonl"
+    history_store.append(history_file, lines(2))
+    # A crash in the middle of a write
+    with open(history_file, "a") as opened_file:
+        opened_file.write('{"index": ')
+
+    history_store.append(history_file, lines(2, first=2))
+    assert history_store.line_count(history_file) == 5
+    page = history_store.read_lines(history_file, 0, 5)
+    assert page[2] == b'{"index": '
+    assert indexes(page[:2] + page[3:]) == [0, 1, 2, 3]
+    assert history_store.index_path(history_file).read_bytes() == history_store._pack(
+        history_store._scan_offsets(history_file)
+    )
+
+
+def test_empty_log(tmp_path):
+    history_file = tmp_path / "history.jsonl"
+    history_file.touch()
+    assert history_store.read_page(history_file, 0, 10) == (0, [])
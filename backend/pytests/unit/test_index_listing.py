@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from models import api, core
+from models.enums import QueryType, ResourceType
+from pytests.unit.conftest import save_content
+from utils import db, repository
+from utils.settings import settings
+
+SPACE = "indexed_space"
+
+
+def redis_doc(meta: core.Meta):
+    doc = json.loads(meta.model_dump_json(exclude_none=True))
+    # Indexed as timestamps
+    doc.update(
+        created_at=meta.created_at.timestamp(),
+        updated_at=meta.updated_at.timestamp(),
+        resource_type=type(meta).__name__.lower(),
+        subpath="/content",
+        branch_name=settings.default_branch,
+    )
+    return doc
+
+
+@pytest.fixture
+def redis_services(fake_redis, monkeypatch):
+    async def no_extras(_, __, ___, docs, ____):
+        return [({}, None)] * len(docs)
+
+    monkeypatch.setattr(repository, "get_redis_docs_extras", no_extras)
+    services = fake_redis(repository)
+    services.indices[f"{SPACE}:{settings.default_branch}:meta"] = False
+    services.searcher = services.search_rows
+    return services
+
+
+def listing(**kwargs) -> api.Query:
+    return api.Query(type=QueryType.subpath, space_name=SPACE, subpath="/content", **kwargs)
+
+
+def test_filters_clause_spares_the_folders():
+    assert repository._listing_filters_clause(listing()) == ""
+    clause = repository._listing_filters_clause(
+        listing(filter_types=[ResourceType.content, ResourceType.ticket], filter_tags=["a-b"])
+    )
+    assert clause == r"(@resource_type:(folder) | (@resource_type:(content|ticket) @tags:{a\-b}))"
+
+
+@pytest.mark.asyncio
+async def test_type_filter_keeps_the_folders(redis_services):
+    query = listing(filter_types=[ResourceType.content])
+    await repository.serve_subpath_query_from_index(query, "tester", ["policy"])
+
+    [search] = redis_services.searches
+    assert "resource_type" not in search["filters"] and "tags" not in search["filters"]
+    assert search["search"].startswith("(@resource_type:(folder) | (@resource_type:(content)))")
+
+
+@pytest.mark.asyncio
+async def test_attachments_only_when_asked(spaces_folder, redis_services):
+    meta = await save_content(SPACE, "one")
+    comment = core.Comment(shortname="note", owner_shortname="tester", is_active=True, body="hello")
+    await db.save(SPACE, "/content/one", comment, settings.default_branch)
+    redis_services.rows = [redis_doc(meta)]
+
+    result = await repository.serve_subpath_query_from_index(listing(), "tester", ["policy"])
+    assert result is not None
+    _, [record], _ = result
+    assert not record.attachments
+
+    result = await repository.serve_subpath_query_from_index(
+        listing(retrieve_attachments=True), "tester", ["policy"]
+    )
+    assert result is not None
+    _, [record], _ = result
+    assert record.attachments and [one.shortname for one in record.attachments[ResourceType.comment]] == ["note"]
+
+
+@pytest.mark.asyncio
+async def test_index_and_files_listings_page_alike(spaces_folder, redis_services, monkeypatch):
+    async def allow_all(_, __, ___, candidates):
+        return [True] * len(candidates)
+
+    monkeypatch.setattr(type(repository.access_control), "check_access_many", allow_all)
+    for shortname in ["a", "b", "c", "d", "e"]:
+        meta = await save_content(SPACE, shortname)
+        redis_services.rows.append(redis_doc(meta))
+
+    for offset in range(6):
+        query = listing(sort_by="shortname", offset=offset, limit=2)
+        result = await repository.serve_subpath_query_from_index(query, "tester", ["policy"])
+        assert result is not None
+        _, from_index, _ = result
+        _, from_files, _ = await repository.serve_subpath_query(query, "tester")
+        assert [one.shortname for one in from_index] == [one.shortname for one in from_files]
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+from redis.commands.search.field import NumericField, TagField, TextField
+
+from pytests.unit.conftest import FakeRedisServices
+from utils import reindex_manifest
+from utils.redis_services import RedisServices
+from utils.settings import settings
+
+NAME = "space:master:meta"
+FIELDS = (TextField("$.shortname", as_name="shortname"), NumericField("$.size", as_name="size"))
+
+
+@pytest.fixture
+def services(fake_redis):
+    return fake_redis()
+
+
+def saved_version(services: FakeRedisServices):
+    return json.loads(services.keys_values[f"index_definition:{NAME}"])["version"]
+
+
+@pytest.mark.asyncio
+async def test_changed_index_is_swapped_in_through_its_alias(services):
+    await services.create_index("space:master", "meta", FIELDS)
+    assert services.aliases == {NAME: f"{NAME}:v1"} and saved_version(services) == f"{NAME}:v1"
+
+    await services.create_index("space:master", "meta", FIELDS[:1])
+    assert services.aliases == {NAME: f"{NAME}:v2"} and saved_version(services) == f"{NAME}:v2"
+    assert set(services.indices) == {f"{NAME}:v2"}
+
+
+@pytest.mark.asyncio
+async def test_slow_rebuild_fails_its_swap(services, monkeypatch):
+    await services.create_index("space:master", "meta", FIELDS)
+
+    monkeypatch.setattr(settings, "index_build_timeout", 0.3)
+    services.slow_builds = True
+    with pytest.raises(TimeoutError):
+        await services.create_index("space:master", "meta", FIELDS[:1])
+
+    # The searches keep being served by the previous version
+    assert services.aliases == {NAME: f"{NAME}:v1"} and saved_version(services) == f"{NAME}:v1"
+    assert set(services.indices) == {f"{NAME}:v1"}
+
+
+@pytest.mark.asyncio
+async def test_unchanged_index_is_kept(services):
+    await services.create_index("space:master", "meta", FIELDS)
+    await services.create_index("space:master", "meta", FIELDS)
+
+    assert services.created == [f"{NAME}:v1"] and not services.altered
+    assert services.aliases == {NAME: f"{NAME}:v1"}
+
+
+@pytest.mark.asyncio
+async def test_added_fields_alter_the_current_version(services):
+    added = TagField("$.tags", as_name="tags")
+    await services.create_index("space:master", "meta", FIELDS)
+    await services.create_index("space:master", "meta", (*FIELDS, added))
+
+    assert services.created == [f"{NAME}:v1"]
+    assert services.altered == [(f"{NAME}:v1", [added])]
+    assert json.loads(services.keys_values[f"index_definition:{NAME}"])["hash"] == (
+        RedisServices.index_definition("space:master", "meta", (*FIELDS, added))["hash"]
+    )
+
+
+@pytest.mark.asyncio
+async def test_index_without_its_saved_definition_is_rebuilt(services):
+    await services.create_index("space:master", "meta", FIELDS)
+    del services.keys_values[f"index_definition:{NAME}"]
+
+    await services.create_index("space:master", "meta", FIELDS)
+    assert services.created == [f"{NAME}:v1", f"{NAME}:v2"]
+    assert services.aliases == {NAME: f"{NAME}:v2"} and saved_version(services) == f"{NAME}:v2"
+
+
+def test_added_index_fields():
+    definition = RedisServices.index_definition("space:master", "meta", FIELDS)
+    added = TagField("$.tags", as_name="tags")
+
+    assert RedisServices.added_index_fields(definition, definition) == []
+    assert RedisServices.added_index_fields(
+        definition, RedisServices.index_definition("space:master", "meta", (FIELDS[0], added, FIELDS[1]))
+    ) == [1]
+    # A removed or changed field, or another prefix, needs a rebuild
+    assert RedisServices.added_index_fields(
+        definition, RedisServices.index_definition("space:master", "meta", FIELDS[:1])
+    ) is None
+    assert RedisServices.added_index_fields(
+        definition,
+        RedisServices.index_definition(
+            "space:master", "meta", (FIELDS[0], NumericField("$.size", as_name="size", sortable=True))
+        ),
+    ) is None
+    assert RedisServices.added_index_fields(
+        definition, RedisServices.index_definition("space:master", "post", FIELDS)
+    ) is None
+
+
+@pytest.mark.asyncio
+async def test_only_the_superseded_docs_are_swept(services):
+    docs = services.docs
+    kept = {
+        "space:master:meta:content/one",
+        "space:master:schema_x:content/one",
+        # Indexed by the server, never recorded
+        "space:master:meta:content/live",
+    }
+    docs.update({doc_id: {} for doc_id in [*kept, "space:master:schema_x:content/two"]})
+    key = reindex_manifest.manifest_key("space", "master", "content")
+    record = {"doc_ids": ["space:master:meta:content/one", "space:master:schema_x:content/one"]}
+    services.hashes[key] = {"one.json": json.dumps(record)}
+
+    previous = {*record["doc_ids"], "space:master:schema_x:content/two"}
+    assert await reindex_manifest.sweep_superseded(services, previous, "space") == 1
+    assert set(docs) == kept
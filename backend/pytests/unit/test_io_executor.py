@@ -0,0 +1,71 @@
+import os
+import threading
+
+import pytest
+
+from utils import io_executor
+
+
+@pytest.mark.asyncio
+async def test_run_uses_the_dedicated_threads():
+    thread_name = await io_executor.run(lambda: threading.current_thread().name)
+    assert thread_name.startswith("dmart-io")
+
+
+@pytest.mark.asyncio
+async def test_run_batch_runs_as_one_task_and_returns_errors_in_place():
+    submitted = io_executor.stats()["submitted"]
+    threads: set[int] = set()
+
+    def parse(item: str) -> int:
+        threads.add(threading.get_ident())
+        return int(item)
+
+    results = await io_executor.run_batch(parse, ["1", "two", "3"])
+
+    assert results[0] == 1 and results[2] == 3
+    assert isinstance(results[1], ValueError)
+    assert len(threads) == 1
+    assert io_executor.stats()["submitted"] == submitted + 1
+
+
+@pytest.mark.asyncio
+async def test_run_batch_of_nothing_submits_nothing():
+    submitted = io_executor.stats()["submitted"]
+    assert await io_executor.run_batch(int, iter([])) == []
+    assert io_executor.stats()["submitted"] == submitted
+
+
+@pytest.mark.asyncio
+async def test_run_raises_and_counts_failures():
+    failed = io_executor.stats()["failed"]
+    with pytest.raises(FileNotFoundError):
+        await io_executor.read_text("/nonexistent/file")
+    assert io_executor.stats()["failed"] == failed + 1
+
+
+@pytest.mark.asyncio
+async def test_reads(tmp_path):
+    (tmp_path / "one").write_text("1")
+    (tmp_path / "two").write_bytes(b"2")
+
+    assert await io_executor.read_text(tmp_path / "one") == "1"
+    assert await io_executor.read_bytes(tmp_path / "two") == b"2"
+    texts = await io_executor.read_texts([tmp_path / "one", tmp_path / "missing"])
+    assert texts[0] == "1" and isinstance(texts[1], FileNotFoundError)
+
+
+def test_forked_child_starts_its_own_executor():
+    io_executor.get_executor().submit(int, "1").result()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # No executor threads survive a fork, the child must not reuse the parent's pool
+        os.close(read_fd)
+        os.write(write_fd, b"1" if io_executor._executor is None else b"0")
+        os._exit(0)
+
+    os.close(write_fd)
+    assert os.read(read_fd, 1) == b"1"
+    os.close(read_fd)
+    os.waitpid(pid, 0)
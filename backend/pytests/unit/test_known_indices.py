@@ -0,0 +1,81 @@
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from utils.redis_services import RedisServices
+
+
+@pytest.fixture
+def redis_services(fake_redis):
+    services = fake_redis()
+    services.indices["space:master:meta"] = False
+    services.rows = [{}]
+    return services
+
+
+async def search(redis_services: RedisServices, space_name: str = "space"):
+    return await redis_services.search(
+        space_name=space_name, branch_name="master", search="", filters={}, limit=10, offset=0
+    )
+
+
+@pytest.mark.asyncio
+async def test_known_index_is_searched_in_one_command(redis_services):
+    assert await search(redis_services) == {"data": ["{}"], "total": 1}
+    assert redis_services.calls == [("list", ""), ("search", "space:master:meta")]
+
+    redis_services.calls.clear()
+    await search(redis_services)
+    assert redis_services.calls == [("search", "space:master:meta")]
+
+
+@pytest.mark.asyncio
+async def test_index_of_another_worker_is_checked_once(redis_services):
+    await search(redis_services)
+    redis_services.indices["other:master:meta"] = False
+    redis_services.calls.clear()
+
+    await search(redis_services, "other")
+    await search(redis_services, "other")
+    assert redis_services.calls == [
+        ("info", "other:master:meta"),
+        ("search", "other:master:meta"),
+        ("search", "other:master:meta"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_missing_index_is_not_searched(redis_services):
+    assert await search(redis_services, "missing") == {"data": [], "total": 0}
+    assert ("search", "missing:master:meta") not in redis_services.calls
+
+
+@pytest.mark.asyncio
+async def test_index_dropped_elsewhere_is_forgotten(redis_services):
+    await search(redis_services)
+    redis_services.indices.clear()
+
+    assert await search(redis_services) == {"data": [], "total": 0}
+    assert "space:master:meta" not in (RedisServices.known_indices or set())
+    redis_services.calls.clear()
+    assert not await redis_services.index_exists("space:master:meta")
+    assert redis_services.calls == [("info", "space:master:meta")]
+
+
+@pytest.mark.asyncio
+async def test_unlisted_indices_fall_back_to_info(redis_services, monkeypatch):
+    async def no_listing():
+        raise RedisConnectionError("No connection available.")
+
+    monkeypatch.setattr(redis_services, "list_indices", no_listing)
+    assert await redis_services.index_exists("space:master:meta")
+    assert not await redis_services.index_exists("missing:master:meta")
+    assert RedisServices.known_indices is None
+
+
+@pytest.mark.asyncio
+async def test_dropped_index_and_its_alias_are_forgotten(redis_services):
+    redis_services.indices["space:master:meta:v2"] = False
+    await redis_services.load_known_indices()
+
+    assert await redis_services.drop_index("space:master:meta:v2")
+    assert RedisServices.known_indices == set()
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import pytest
+
+from models import api
+from models.enums import QueryType
+from utils import repository
+
+SPACE = "merged_space"
+
+INDICES = {
+    "first": [1, 4, 4, 9, 12],
+    "second": [2, 3, 4, 10],
+    "third": [],
+    "fourth": [0, 5, 6, 7, 8, 11, 13],
+}
+
+
+class SortedIndices:
+    """A `searcher` where each schema index holds sorted docs of a `rank` field, searched page by page"""
+
+    def __init__(self):
+        self.searches: list[tuple[str, int, int]] = []
+        self.running = 0
+        self.concurrent = 0
+
+    async def __call__(self, schema_name, offset, limit, sort_type, **_):
+        self.searches.append((schema_name, offset, limit))
+        self.running += 1
+        self.concurrent = max(self.concurrent, self.running)
+        await asyncio.sleep(0)
+        self.running -= 1
+        ranks = INDICES[schema_name]
+        if sort_type == api.SortType.descending:
+            ranks = ranks[::-1]
+        return {
+            "data": [
+                json.dumps({"shortname": f"{schema_name}{rank}", "rank": rank})
+                for rank in ranks[offset:offset + limit]
+            ],
+            "total": len(ranks),
+        }
+
+
+@pytest.fixture
+def sorted_indices(fake_redis):
+    indices = SortedIndices()
+    fake_redis(repository).searcher = indices
+    return indices
+
+
+def search(**kwargs) -> api.Query:
+    return api.Query(
+        type=QueryType.search,
+        space_name=SPACE,
+        subpath="/",
+        filter_schema_names=list(INDICES),
+        sort_by="rank",
+        search="",
+        **kwargs,
+    )
+
+
+def all_ranks(descending: bool = False) -> list[int]:
+    return sorted((rank for ranks in INDICES.values() for rank in ranks), reverse=descending)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort_type", [api.SortType.ascending, api.SortType.descending])
+async def test_offset_pages_merge_the_indices(sorted_indices, sort_type):
+    expected = all_ranks(sort_type == api.SortType.descending)
+    for offset in range(0, len(expected), 4):
+        docs, total, positions = await repository.redis_query_search_merged(
+            search(offset=offset, limit=4, sort_type=sort_type), "tester"
+        )
+        assert total == len(expected)
+        assert [doc["rank"] for doc in docs] == expected[offset:offset + 4]
+        assert sum(positions) == min(offset + 4, len(expected))
+
+
+@pytest.mark.asyncio
+async def test_positions_continue_where_each_index_stopped(sorted_indices):
+    ranks: list[int] = []
+    positions = None
+    while True:
+        sorted_indices.searches.clear()
+        docs, total, positions = await repository.redis_query_search_merged(
+            search(limit=3), "tester", positions=positions
+        )
+        ranks += [doc["rank"] for doc in docs]
+        # A page's worth of rows from each index, wherever the page is
+        assert all(limit == 3 for _, _, limit in sorted_indices.searches)
+        if sum(positions) >= total:
+            break
+    assert ranks == all_ranks()
+
+
+@pytest.mark.asyncio
+async def test_indices_are_searched_concurrently(sorted_indices):
+    await repository.redis_query_search_merged(search(limit=2), "tester")
+    assert {schema_name for schema_name, _, _ in sorted_indices.searches} == set(INDICES)
+    assert sorted_indices.concurrent == len(INDICES)
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+from models import api, core
+from pytests.unit.conftest import save_content
+from utils import db
+from utils.settings import settings
+
+SPACE = "cache_space"
+
+
+@pytest.mark.asyncio
+async def test_load_is_served_from_cache(spaces_folder):
+    await save_content(SPACE, "one")
+    first = await db.load(SPACE, "/content", "one", core.Content)
+    assert len(db._meta_cache) == 1
+
+    first.is_active = False
+    second = await db.load(SPACE, "/content", "one", core.Content)
+    # Handed out as copies, so a caller mutating its meta doesn't alter the cache
+    assert second.is_active is True
+
+
+@pytest.mark.asyncio
+async def test_out_of_band_edit_is_picked_up(spaces_folder):
+    await save_content(SPACE, "one", displayname="before")
+    await db.load(SPACE, "/content", "one", core.Content)
+
+    path, filename = db.metapath(SPACE, "/content", "one", core.Content)
+    edited = core.Content(
+        shortname="one",
+        owner_shortname="tester",
+        is_active=True,
+        displayname=core.Translation(en="after, edited outside"),
+    )
+    (path / filename).write_text(edited.model_dump_json(exclude_none=True))
+    stat = os.stat(path / filename)
+    os.utime(path / filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    meta = await db.load(SPACE, "/content", "one", core.Content)
+    assert meta.displayname and meta.displayname.en == "after, edited outside"
+
+
+@pytest.mark.asyncio
+async def test_save_and_delete_invalidate(spaces_folder):
+    await save_content(SPACE, "one", displayname="before")
+    await db.load(SPACE, "/content", "one", core.Content)
+
+    await save_content(SPACE, "one", displayname="after")
+    meta = await db.load(SPACE, "/content", "one", core.Content)
+    assert meta.displayname and meta.displayname.en == "after"
+
+    path, filename = db.metapath(SPACE, "/content", "one", core.Content)
+    os.remove(path / filename)
+    with pytest.raises(api.Exception):
+        await db.load(SPACE, "/content", "one", core.Content)
+    assert not db._meta_cache
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded(spaces_folder, monkeypatch):
+    monkeypatch.setattr(settings, "meta_cache_size", 2)
+    for shortname in ["one", "two", "three"]:
+        await save_content(SPACE, shortname)
+        await db.load(SPACE, "/content", shortname, core.Content)
+    assert len(db._meta_cache) == 2
+
+    monkeypatch.setattr(settings, "meta_cache_size", 0)
+    db.invalidate_meta_cache()
+    await db.load(SPACE, "/content", "one", core.Content)
+    assert not db._meta_cache
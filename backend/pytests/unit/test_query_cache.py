@@ -0,0 +1,162 @@
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from models import api, core
+from models.enums import QueryType, ResourceType
+from utils import query_cache, repository
+from utils.settings import settings
+
+
+class GenerationsRedisServices:
+    """Keeps the generation counters in a dict"""
+
+    def __init__(self):
+        self.counters: dict[str, int] = {}
+        self.down = False
+
+    def __call__(self):
+        if self.down:
+            raise RedisConnectionError("No connection available.")
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        return None
+
+    async def mget(self, keys):
+        return [self.counters.get(key) for key in keys]
+
+    def pipeline(self, transaction):
+        return self
+
+    def incr(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+    async def execute(self):
+        return None
+
+
+@pytest.fixture
+def redis_services(monkeypatch):
+    services = GenerationsRedisServices()
+    monkeypatch.setattr(query_cache, "RedisServices", services)
+    monkeypatch.setattr(settings, "query_cache_size", 10)
+    query_cache._cache.clear()
+    yield services
+    query_cache._cache.clear()
+
+
+def listing(space_name: str = "space", subpath: str = "/content") -> api.Query:
+    return api.Query(type=QueryType.subpath, space_name=space_name, subpath=subpath)
+
+
+def result(*shortnames: str) -> tuple[int, list, str | None]:
+    records = [
+        core.Record(resource_type=ResourceType.content, shortname=shortname, subpath="/content", attributes={})
+        for shortname in shortnames
+    ]
+    return len(records), records, None
+
+
+async def cache(query: api.Query, user: str = "tester") -> str:
+    key = query_cache.cache_key(query, user, [])
+    _, generations = await query_cache.get(query, key)
+    query_cache.put(key, generations, result("one"))
+    return key
+
+
+async def is_fresh(query: api.Query, key: str) -> bool:
+    cached, _ = await query_cache.get(query, key)
+    return cached is not None
+
+
+def test_key_holds_the_user_and_policies():
+    query = listing()
+    assert query_cache.cache_key(query, "one", ["a", "b"]) == query_cache.cache_key(query, "one", ["b", "a"])
+    assert query_cache.cache_key(query, "one", []) != query_cache.cache_key(query, "two", [])
+    assert query_cache.cache_key(query, "one", []) != query_cache.cache_key(query, "one", ["a"])
+
+
+@pytest.mark.asyncio
+async def test_cached_copies_are_handed_out(redis_services):
+    key = await cache(listing())
+    cached, _ = await query_cache.get(listing(), key)
+    assert cached is not None
+    cached[1][0].shortname = "changed"
+    cached, _ = await query_cache.get(listing(), key)
+    assert cached is not None and cached[1][0].shortname == "one"
+
+
+@pytest.mark.asyncio
+async def test_writes_leave_the_affected_results_stale(redis_services):
+    content = await cache(listing())
+    other = await cache(listing(subpath="/other"))
+    searched = await cache(api.Query(type=QueryType.search, space_name="space", subpath="/", search=""))
+
+    await query_cache.bump("space", None, "/content", "entry")
+    assert not await is_fresh(listing(), content)
+    assert await is_fresh(listing(subpath="/other"), other)
+    assert not await is_fresh(
+        api.Query(type=QueryType.search, space_name="space", subpath="/", search=""), searched
+    )
+
+
+@pytest.mark.asyncio
+async def test_access_changes_leave_every_result_stale(redis_services):
+    key = await cache(listing())
+    await query_cache.bump(settings.management_space, None, "/content", "entry")
+    assert await is_fresh(listing(), key)
+
+    await query_cache.bump(settings.management_space, None, "permissions", "view_all")
+    assert not await is_fresh(listing(), key)
+
+    key = await cache(listing())
+    await query_cache.bump(settings.management_space, None, settings.users_subpath, "tester")
+    assert not await is_fresh(listing(), key)
+
+
+@pytest.mark.asyncio
+async def test_nothing_is_cached_without_the_generations(redis_services):
+    redis_services.down = True
+    key = await cache(listing())
+    assert key not in query_cache._cache
+    # Nor served while they can't be read
+    redis_services.down = False
+    key = await cache(listing())
+    redis_services.down = True
+    assert not await is_fresh(listing(), key)
+
+
+@pytest.mark.asyncio
+async def test_cache_is_bounded(redis_services, monkeypatch):
+    monkeypatch.setattr(settings, "query_cache_size", 2)
+    for subpath in ["/a", "/b", "/c"]:
+        await cache(listing(subpath=subpath))
+    assert len(query_cache._cache) == 2
+
+    monkeypatch.setattr(settings, "query_cache_max_records", 1)
+    key = query_cache.cache_key(listing(), "tester", [])
+    query_cache.put(key, [0, 0, 0], result("one", "two"))
+    assert key not in query_cache._cache
+
+
+@pytest.mark.asyncio
+async def test_repeated_query_is_served_from_the_cache(redis_services, monkeypatch):
+    runs: list[str] = []
+
+    async def run_query_page(query, user_shortname, _):
+        runs.append(user_shortname)
+        return result("one")
+
+    monkeypatch.setattr(repository, "run_query_page", run_query_page)
+    for _ in range(2):
+        total, records, _ = await repository.serve_query_page(listing(), "tester")
+        assert total == 1 and records[0].shortname == "one"
+    assert runs == ["tester"]
+
+    await repository.serve_query_page(listing(), "another")
+    await query_cache.bump("space", None, "/content")
+    await repository.serve_query_page(listing(), "tester")
+    assert runs == ["tester", "another", "tester"]
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from api.public import router as public_router
+from models import api, core
+from models.enums import QueryType, ResourceType
+from utils import query_stream, repository
+from utils.internal_error_code import InternalErrorCode
+from utils.settings import settings
+
+
+def record(shortname: str) -> core.Record:
+    return core.Record(resource_type=ResourceType.content, shortname=shortname, subpath="/content", attributes={})
+
+
+async def chunks(*served):
+    """Yield the served chunks, raising the exceptions among them"""
+    for one in served:
+        if isinstance(one, Exception):
+            raise one
+        yield one
+
+
+async def body_lines(response) -> list[dict]:
+    body = "".join([section async for section in response.body_iterator])
+    assert body.endswith("\n")
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_requested_by_the_accept_header():
+    assert query_stream.is_requested("application/x-ndjson")
+    assert query_stream.is_requested("application/json, application/x-ndjson;q=0.9")
+    assert not query_stream.is_requested("application/json")
+    assert not query_stream.is_requested(None)
+
+
+@pytest.mark.asyncio
+async def test_records_then_summary():
+    response = await query_stream.response(
+        chunks((3, [record("one"), record("two")], None), (3, [record("three")], "next"))
+    )
+    assert response.media_type == query_stream.NDJSON_MEDIA_TYPE
+    *records, summary = await body_lines(response)
+    assert [line["shortname"] for line in records] == ["one", "two", "three"]
+    assert summary["status"] == "success"
+    assert summary["attributes"] == {"total": 3, "returned": 3, "next_cursor": "next"}
+
+
+@pytest.mark.asyncio
+async def test_failure_past_the_first_chunk_fails_the_summary():
+    response = await query_stream.response(
+        chunks((3, [record("one")], None), RedisConnectionError("gone"))
+    )
+    *records, summary = await body_lines(response)
+    assert [line["shortname"] for line in records] == ["one"]
+    assert summary["status"] == "failed"
+    assert summary["error"]["code"] == InternalErrorCode.SOMETHING_WRONG
+
+    error = api.Error(type="query", code=InternalErrorCode.INVALID_DATA, message="bad")
+    response = await query_stream.response(
+        chunks((3, [record("one")], None), api.Exception(400, error))
+    )
+    *_, summary = await body_lines(response)
+    assert summary["status"] == "failed" and summary["error"]["message"] == "bad"
+
+
+@pytest.mark.asyncio
+async def test_first_chunk_failure_is_raised():
+    error = api.Error(type="query", code=InternalErrorCode.INVALID_DATA, message="bad")
+    with pytest.raises(api.Exception):
+        await query_stream.response(chunks(api.Exception(400, error)))
+
+
+@pytest.mark.asyncio
+async def test_chunks_follow_the_cursor(monkeypatch):
+    monkeypatch.setattr(settings, "query_stream_chunk_size", 2)
+    served: list[tuple[int, str | None]] = []
+
+    async def serve_query_page(query, _, __):
+        served.append((query.limit, query.cursor))
+        start = int(query.cursor or 0)
+        shortnames = [f"n{index}" for index in range(start, min(start + query.limit, 9))]
+        next_cursor = str(start + len(shortnames)) if start + len(shortnames) < 9 else None
+        return 9, [record(shortname) for shortname in shortnames], next_cursor
+
+    monkeypatch.setattr(repository, "serve_query_page", serve_query_page)
+    query = api.Query(type=QueryType.subpath, space_name="space", subpath="/content", limit=5)
+    result = [one async for one in repository.serve_query_chunks(query, "tester")]
+
+    assert served == [(2, None), (2, "2"), (1, "4")]
+    assert [[one.shortname for one in records] for _, records, _ in result] == [
+        ["n0", "n1"], ["n2", "n3"], ["n4"]
+    ]
+    # Only the last chunk hands back the cursor of the query's next page
+    assert [next_cursor for _, _, next_cursor in result] == [None, None, "5"]
+
+
+@pytest.mark.asyncio
+async def test_public_query_streams_on_request(monkeypatch):
+    async def no_plugins(_):
+        return None
+
+    async def no_policies(*_):
+        return []
+
+    async def serve_query_chunks(query, user_shortname, _):
+        yield 1, [record("one")], None
+
+    monkeypatch.setattr(public_router.plugin_manager, "before_action", no_plugins)
+    monkeypatch.setattr(public_router.plugin_manager, "after_action", no_plugins)
+    monkeypatch.setattr(public_router.access_control, "get_user_query_policies", no_policies)
+    monkeypatch.setattr(public_router.repository, "serve_query_chunks", serve_query_chunks)
+
+    query = api.Query(type=QueryType.subpath, space_name="space", subpath="/content")
+    response = await public_router.query_entries(query, accept=query_stream.NDJSON_MEDIA_TYPE)
+    lines = await body_lines(response)
+    assert lines[0]["shortname"] == "one" and lines[-1]["attributes"]["returned"] == 1
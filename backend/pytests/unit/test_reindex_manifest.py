@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+import create_index
+from models import core
+from models.enums import ResourceType
+from pytests.unit.conftest import save_content
+from utils import db, reindex_manifest
+from utils.settings import settings
+
+SPACE = "reindexed_space"
+BRANCH = settings.default_branch
+KEY = reindex_manifest.manifest_key(SPACE, BRANCH, "content")
+
+
+@pytest.fixture
+def redis_services(spaces_folder, fake_redis):
+    return fake_redis(create_index)
+
+
+async def reindex(incremental: bool) -> dict:
+    reindexer = create_index.Reindexer(incremental, in_process=True)
+    return await create_index.load_data_to_redis(
+        SPACE, BRANCH, "content", [ResourceType.content], reindexer
+    )
+
+
+def meta_path(shortname: str):
+    path, filename = db.metapath(SPACE, "/content", shortname, core.Content, BRANCH)
+    return path / filename
+
+
+def record(redis_services, shortname: str):
+    field = str(meta_path(shortname).relative_to(settings.spaces_folder))
+    return json.loads(redis_services.hashes[KEY][field])
+
+
+@pytest.mark.asyncio
+async def test_unchanged_entries_are_skipped(redis_services):
+    for shortname in ["one", "two", "three"]:
+        await save_content(SPACE, shortname)
+    assert (await reindex(incremental=False))["documents"] == 3
+
+    result = await reindex(incremental=True)
+    assert result["documents"] == 0 and result["unchanged"] == 3
+
+
+@pytest.mark.asyncio
+async def test_changed_entry_is_regenerated(redis_services):
+    await save_content(SPACE, "one")
+    await save_content(SPACE, "two")
+    await reindex(incremental=False)
+
+    await save_content(SPACE, "two", displayname="renamed")
+    result = await reindex(incremental=True)
+    assert result["documents"] == 1 and result["unchanged"] == 1
+    doc = redis_services.docs[f"{SPACE}:{BRANCH}:meta:content/two"]
+    assert doc["displayname"]["en"] == "renamed"
+
+
+@pytest.mark.asyncio
+async def test_touched_entry_only_gets_its_fingerprint_updated(redis_services):
+    await save_content(SPACE, "one")
+    await reindex(incremental=False)
+    doc_ids = record(redis_services, "one")["doc_ids"]
+
+    stat = meta_path("one").stat()
+    os.utime(meta_path("one"), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    result = await reindex(incremental=True)
+    assert result["documents"] == 0 and result["unchanged"] == 1
+
+    updated = record(redis_services, "one")
+    assert updated["doc_ids"] == doc_ids
+    assert updated["files"][str(meta_path("one").relative_to(settings.spaces_folder))][0] == (
+        stat.st_mtime_ns + 10**9
+    )
+    # Left alone by the cheap stats check from now on
+    assert reindex_manifest.is_unchanged(
+        core.Locator(
+            space_name=SPACE, branch_name=BRANCH, subpath="/content", shortname="one", type=ResourceType.content
+        ),
+        updated,
+    )
+
+
+@pytest.mark.asyncio
+async def test_removed_entry_is_forgotten(redis_services):
+    await save_content(SPACE, "one")
+    await save_content(SPACE, "two")
+    await reindex(incremental=False)
+
+    meta_path("two").unlink()
+    assert await reindex_manifest.forget_missing(redis_services, SPACE) == 1
+    assert set(redis_services.docs) == {f"{SPACE}:{BRANCH}:meta:content/one"}
+    assert len(redis_services.hashes[KEY]) == 1
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+import create_index
+from models.enums import ResourceType
+from pytests.unit.conftest import FakeRedisServices, save_content
+from utils import reindex_manifest
+from utils.settings import settings
+
+SPACE = "reindexed_space"
+
+
+@pytest.fixture
+def redis_services(spaces_folder, fake_redis):
+    return fake_redis(create_index)
+
+
+async def save_contents(count: int, subpath: str = "/content"):
+    for index in range(count):
+        await save_content(SPACE, f"n{index}", subpath)
+
+
+async def reindex(incremental: bool = False, subpath: str = "content") -> dict:
+    reindexer = create_index.Reindexer(incremental)
+    try:
+        return await create_index.load_data_to_redis(
+            SPACE, settings.default_branch, subpath, [ResourceType.content], reindexer
+        )
+    finally:
+        reindexer.close()
+
+
+def meta_docs(redis_services: FakeRedisServices) -> dict[str, dict]:
+    return {doc_id: doc for doc_id, doc in redis_services.docs.items() if ":meta:" in doc_id}
+
+
+@pytest.mark.asyncio
+async def test_subpath_is_loaded_in_bounded_pipelines(redis_services, monkeypatch):
+    monkeypatch.setattr(settings, "reindex_chunk_size", 100)
+    monkeypatch.setattr(settings, "reindex_pipeline_size", 4)
+    await save_contents(7)
+
+    result = await reindex()
+    assert result["documents"] == 7 and result["unchanged"] == 0
+    assert {doc["shortname"] for doc in meta_docs(redis_services).values()} == {f"n{index}" for index in range(7)}
+    # A doc and its fingerprint per entry, flushed in pipelines of at most 4 (+1) commands
+    assert sum(redis_services.executed) == 14 and max(redis_services.executed) <= 5
+
+    key = reindex_manifest.manifest_key(SPACE, settings.default_branch, "content")
+    records = [json.loads(value) for value in redis_services.hashes[key].values()]
+    assert len(records) == 7 and all(len(record["doc_ids"]) == 1 for record in records)
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_parsed_by_the_process_pool(redis_services, monkeypatch):
+    monkeypatch.setattr(settings, "reindex_chunk_size", 3)
+    monkeypatch.setattr(settings, "reindex_workers", 2)
+    await save_contents(8)
+
+    result = await reindex()
+    assert result["documents"] == 8
+    assert {doc["shortname"] for doc in meta_docs(redis_services).values()} == {f"n{index}" for index in range(8)}
+
+
+@pytest.mark.asyncio
+async def test_failed_write_is_raised_without_blocking_the_parsing(redis_services, monkeypatch):
+    monkeypatch.setattr(settings, "reindex_chunk_size", 1)
+    monkeypatch.setattr(settings, "reindex_workers", 1)
+    await save_contents(5)
+
+    async def fail(*_):
+        raise ConnectionError("redis is gone")
+
+    async def parse(self, items, in_process):
+        return await create_index.generate_entries(items, True)
+
+    monkeypatch.setattr(create_index.Reindexer, "save_entries", fail)
+    monkeypatch.setattr(create_index.Reindexer, "parse", parse)
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(reindex(), timeout=10)
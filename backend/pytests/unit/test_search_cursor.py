@@ -0,0 +1,139 @@
+import json
+import random
+import re
+
+import pytest
+
+from models import api, core
+from models.enums import QueryType, ResourceType
+from pytests.unit.conftest import FakeRedisServices
+from utils import query_cursor, repository
+
+SPACE = "cursor_space"
+
+RANGE = re.compile(r"@rank:\[(\(?)(\S+) (\(?)(\S+)\]")
+
+
+def bound(exclusive: str, value: str, lower: bool):
+    number = float(value)
+    if lower:
+        return (lambda rank: rank > number) if exclusive else (lambda rank: rank >= number)
+    return (lambda rank: rank < number) if exclusive else (lambda rank: rank <= number)
+
+
+def ranked_searcher(services: FakeRedisServices):
+    """A single index of the services `rows`, its ties returned in any order unless sorted by shortname"""
+    shuffle = random.Random(7)
+
+    async def search(search, offset, limit, sort_by, sort_type, **_):
+        rows = list(services.rows)
+        if match := RANGE.search(search):
+            lower = bound(match[1], match[2], lower=True) if match[2] != "-inf" else None
+            upper = bound(match[3], match[4], lower=False) if match[4] != "+inf" else None
+            rows = [
+                row for row in rows
+                if (not lower or lower(row["rank"])) and (not upper or upper(row["rank"]))
+            ]
+        shuffle.shuffle(rows)
+        if sort_by:
+            rows.sort(key=lambda row: row[sort_by], reverse=sort_type == api.SortType.descending)
+        return {
+            "data": [json.dumps(row) for row in rows[offset:offset + limit]],
+            "total": len(rows),
+        }
+
+    return search
+
+
+@pytest.fixture
+def redis_services(fake_redis):
+    services = fake_redis(repository)
+    services.rows = [
+        {"shortname": f"e{index:02}", "rank": rank}
+        for index, rank in enumerate([3, 1, 2, 2, 2, 2, 2, 5, 4, 4, 2, 1, 6, 6, 6])
+    ]
+    services.searcher = ranked_searcher(services)
+    return services
+
+
+def search(**kwargs) -> api.Query:
+    return api.Query(type=QueryType.search, space_name=SPACE, subpath="/", search="", **kwargs)
+
+
+async def all_pages(query: api.Query) -> list[str]:
+    shortnames: list[str] = []
+    while True:
+        docs, total, cursor = await repository.redis_query_search_page(query, "tester")
+        assert total == 15
+        shortnames += [doc["shortname"] for doc in docs]
+        if not cursor:
+            return shortnames
+        query = query.model_copy(update={"cursor": cursor, "offset": 0})
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort_type", [api.SortType.ascending, api.SortType.descending])
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 7])
+async def test_cursor_pages_break_ties_on_the_shortname(redis_services, sort_type, limit):
+    descending = sort_type == api.SortType.descending
+    expected = [
+        row["shortname"]
+        for row in sorted(
+            redis_services.rows, key=lambda row: (row["rank"], row["shortname"]), reverse=descending
+        )
+    ]
+    shortnames = await all_pages(search(sort_by="rank", sort_type=sort_type, limit=limit))
+    assert sorted(shortnames) == sorted(expected)
+    assert len(shortnames) == len(set(shortnames))
+    # Within the rows of a same rank, pages follow on the shortname
+    ranks = {row["shortname"]: row["rank"] for row in redis_services.rows}
+    assert [ranks[shortname] for shortname in shortnames] == [ranks[shortname] for shortname in expected]
+
+
+@pytest.mark.asyncio
+async def test_cursor_keeps_its_place_when_ties_are_added(redis_services):
+    query = search(sort_by="rank", limit=3)
+    docs, _, cursor = await repository.redis_query_search_page(query, "tester")
+    assert {docs[0]["shortname"], docs[1]["shortname"]} == {"e01", "e11"} and docs[2]["shortname"] == "e02"
+
+    # Added before the cursor's shortname, among the rows of its rank
+    redis_services.rows.append({"shortname": "e00a", "rank": 2})
+    docs, _, _ = await repository.redis_query_search_page(
+        query.model_copy(update={"cursor": cursor}), "tester"
+    )
+    assert [doc["shortname"] for doc in docs][:2] == ["e03", "e04"]
+
+
+@pytest.mark.asyncio
+async def test_keyset_cursor_searches_from_its_value(redis_services):
+    query = search(sort_by="rank", limit=4)
+    _, _, cursor = await repository.redis_query_search_page(query, "tester")
+    position = query_cursor.decode(query.model_copy(update={"cursor": cursor}))
+    assert position == {"after": [2, "e03"], "ties": 2, "before": 2}
+
+    redis_services.searches.clear()
+    await repository.redis_query_search_page(query.model_copy(update={"cursor": cursor}), "tester")
+    assert all(one["offset"] <= 2 for one in redis_services.searches)
+
+
+@pytest.mark.asyncio
+async def test_unsorted_search_is_paged_by_the_index(spaces_folder, redis_services, monkeypatch):
+    async def no_spaces():
+        return {}
+
+    async def no_extras(_, __, ___, docs, ____):
+        return [({}, None)] * len(docs)
+
+    async def record(doc, **_):
+        return core.Record(resource_type=ResourceType.content, shortname=doc["shortname"], subpath="/", attributes={})
+
+    monkeypatch.setattr(repository, "get_spaces", no_spaces)
+    monkeypatch.setattr(repository, "get_redis_docs_extras", no_extras)
+    monkeypatch.setattr(repository, "get_record_from_redis_doc", record)
+
+    # Searched in the meta index, already at the query offset
+    total, records, _ = await repository.serve_query_page(
+        search(filter_schema_names=[], offset=4, limit=3), "tester"
+    )
+    assert total == 15 and len(records) == 3
+    assert redis_services.searches[-1]["offset"] == 4
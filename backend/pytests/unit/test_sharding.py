@@ -0,0 +1,62 @@
+import pytest
+
+from models import core
+from pytests.unit.conftest import save_content, write_space_meta
+from shard_subpath import migrate_subpath
+from utils import db, exporter, sharding
+from utils.settings import settings
+
+SPACE = "sharded_space"
+
+
+def dm_path():
+    return settings.spaces_folder / SPACE / "content" / ".dm"
+
+
+def test_shard_layout():
+    assert sharding.shard_of("one") == "fe/05"
+    assert sharding.subpath_key("/./content//sub/") == "content/sub"
+    assert sharding.entry_folder(dm_path(), "one", True) == dm_path() / "fe" / "05" / "one"
+    assert sharding.entry_folder(dm_path(), "one", False) == dm_path() / "one"
+
+
+@pytest.mark.asyncio
+async def test_sharded_subpath_entries(spaces_folder):
+    write_space_meta(SPACE, sharded_subpaths=["/content"])
+    for shortname in ["one", "two", "three"]:
+        await save_content(SPACE, shortname)
+
+    assert (dm_path() / sharding.shard_of("one") / "one" / "meta.content.json").is_file()
+    assert (await db.load(SPACE, "/content", "one", core.Content)).shortname == "one"
+    folders = sorted(one.name for one in sharding.entry_folders(dm_path(), True))
+    assert folders == ["one", "three", "two"]
+    locators = db.iter_subpath_locators(SPACE, settings.default_branch, "content")
+    assert sorted(locator.shortname for locator in locators) == ["one", "three", "two"]
+
+
+@pytest.mark.asyncio
+async def test_migration_there_and_back(spaces_folder):
+    write_space_meta(SPACE)
+    # An entry named like a fan-out folder
+    for shortname in ["one", "ab", "fe"]:
+        await save_content(SPACE, shortname)
+
+    assert migrate_subpath(SPACE, "/content", settings.default_branch, dry_run=True) == 3
+    assert migrate_subpath(SPACE, "/content", settings.default_branch) == 3
+    assert db.is_sharded(SPACE, "content")
+    for shortname in ["one", "ab", "fe"]:
+        assert (sharding.entry_folder(dm_path(), shortname, True) / "meta.content.json").is_file()
+        assert (await db.load(SPACE, "/content", shortname, core.Content)).shortname == shortname
+
+    assert migrate_subpath(SPACE, "/content", settings.default_branch, to_sharded=False) == 3
+    assert not db.is_sharded(SPACE, "content")
+    assert sorted(one.name for one in dm_path().iterdir()) == ["ab", "fe", "one"]
+
+
+@pytest.mark.asyncio
+async def test_exporter_reads_the_sharded_entries(spaces_folder):
+    write_space_meta(SPACE, sharded_subpaths=["/content"])
+    await save_content(SPACE, "one")
+
+    path = exporter.meta_path(spaces_folder / SPACE, "content", "one", "content")
+    assert path == sharding.entry_folder(dm_path(), "one", True) / "meta.content.json"
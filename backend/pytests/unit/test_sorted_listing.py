@@ -0,0 +1,91 @@
+import pytest
+import pytest_asyncio
+
+from models import api, core
+from models.enums import QueryType
+from pytests.unit.conftest import save_content
+from utils import repository
+
+SPACE = "sorted_space"
+
+SLUGS = {"one": "b", "two": None, "three": "a", "four": "c", "five": "a", "six": None}
+
+
+@pytest_asyncio.fixture
+async def listed_space(spaces_folder, fake_redis, monkeypatch):
+    async def allow_all(_, __, ___, candidates):
+        return [True] * len(candidates)
+
+    monkeypatch.setattr(type(repository.access_control), "check_access_many", allow_all)
+    fake_redis(repository)
+    for shortname, slug in SLUGS.items():
+        await save_content(SPACE, shortname, slug=slug)
+    return spaces_folder
+
+
+def listing(**kwargs) -> api.Query:
+    return api.Query(type=QueryType.subpath, space_name=SPACE, subpath="/content", **kwargs)
+
+
+def expected_order(descending: bool) -> list[str]:
+    """The slugs order, the missing ones last, the shortnames breaking the ties"""
+    return sorted(
+        SLUGS,
+        key=lambda shortname: (SLUGS[shortname] is None, SLUGS[shortname], shortname),
+        reverse=descending,
+    )
+
+
+def test_heap_keeps_the_best_candidates():
+    def candidate(order: int, value: int):
+        return repository._ListingCandidate((value,), order, False, str(value), core.Content(
+            shortname=str(value), owner_shortname="tester", is_active=True
+        ))
+
+    candidates: list[repository._ListingCandidate] = []
+    for order, value in enumerate([5, 1, 4, 2, 3]):
+        repository._keep_top(candidates, candidate(order, value), 3)
+    assert len(candidates) == 3
+    assert [one.key for one in sorted(candidates, reverse=True)] == [(1,), (2,), (3,)]
+
+    repository._keep_top(candidates := [], candidate(0, 1), 0)
+    assert not candidates
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort_type", [api.SortType.ascending, api.SortType.descending])
+async def test_sorted_pages_cover_the_whole_listing(listed_space, sort_type):
+    order = expected_order(sort_type == api.SortType.descending)
+    for offset in range(0, len(order), 2):
+        total, records, _ = await repository.serve_subpath_query(
+            listing(sort_by="slug", sort_type=sort_type, offset=offset + 1, limit=2), "tester"
+        )
+        assert total == len(SLUGS)
+        assert [record.shortname for record in records] == order[offset:offset + 2]
+
+
+@pytest.mark.asyncio
+async def test_only_the_page_records_are_built(listed_space, monkeypatch):
+    built: list[str] = []
+    build = repository.get_subpath_entry_record
+
+    async def spy(query, path, resource_obj, shortname, lock_doc):
+        built.append(shortname)
+        return await build(query, path, resource_obj, shortname, lock_doc)
+
+    monkeypatch.setattr(repository, "get_subpath_entry_record", spy)
+    _, records, _ = await repository.serve_subpath_query(
+        listing(sort_by="slug", offset=3, limit=2), "tester"
+    )
+    assert built == [record.shortname for record in records] == expected_order(False)[2:4]
+
+
+@pytest.mark.asyncio
+async def test_unsorted_cursor_resumes_after_its_shortname(listed_space):
+    _, records, cursor = await repository.serve_subpath_query(listing(limit=2), "tester")
+    assert [record.shortname for record in records] == ["five", "four"]
+
+    # Listed before the cursor meanwhile
+    await save_content(SPACE, "a_first")
+    _, records, _ = await repository.serve_subpath_query(listing(limit=2, cursor=cursor), "tester")
+    assert [record.shortname for record in records] == ["one", "six"]
@@ -0,0 +1,98 @@
+import json
+
+import msgpack  # type: ignore
+import pytest
+
+from api.public import router as public_router
+from models import core
+from models.enums import ContentType, ResourceType, StorageCodec
+from pytests.unit.conftest import write_space_meta
+from utils import db, exporter, storage_codec
+from utils.settings import settings
+
+SPACE = "codec_space"
+
+DATA = {"title": "ترجمة", "count": 3, "ratio": 0.5, "tags": ["a", "b"], "nested": {"none": None}}
+
+
+@pytest.mark.parametrize("codec", list(StorageCodec))
+def test_round_trip(codec):
+    encoded = storage_codec.dumps(DATA, codec)
+    assert storage_codec.loads(encoded) == DATA
+    assert storage_codec.is_encoded(encoded) == (codec != StorageCodec.json)
+
+
+def test_plain_json_stays_readable():
+    assert storage_codec.loads(json.dumps(DATA)) == DATA
+    assert storage_codec.loads(json.dumps(DATA).encode()) == DATA
+
+
+def test_model_round_trip():
+    meta = core.Content(shortname="one", owner_shortname="tester", tags=["x"])
+    for codec in StorageCodec:
+        loaded = storage_codec.load_model(core.Content, storage_codec.dump_model(meta, codec))
+        assert loaded.shortname == "one" and loaded.tags == ["x"] and loaded.uuid == meta.uuid
+
+
+def test_invalid_data_raises_a_decode_error():
+    for raw in [b"{not json", storage_codec.MAGIC + b"?" + b"body", storage_codec.MAGIC + b"m" + b"\xc1"]:
+        with pytest.raises(storage_codec.DECODE_ERRORS):
+            storage_codec.loads(raw)
+
+
+@pytest.mark.asyncio
+async def test_space_codec_is_used_for_new_files(spaces_folder):
+    write_space_meta(SPACE, storage_codec="msgpack")
+    meta = core.Content(shortname="one", owner_shortname="tester", is_active=True)
+    await db.save(SPACE, "/content", meta, settings.default_branch)
+
+    path, filename = db.metapath(SPACE, "/content", "one", core.Content)
+    raw = (path / filename).read_bytes()
+    assert raw.startswith(storage_codec.MAGIC)
+    assert msgpack.unpackb(raw[len(storage_codec.MAGIC) + 1:])["shortname"] == "one"
+    loaded = await db.load(SPACE, "/content", "one", core.Content)
+    assert loaded.uuid == meta.uuid
+
+
+def test_invalid_space_settings_fall_back_to_the_defaults(spaces_folder):
+    write_space_meta(SPACE, storage_codec="unknown")
+    assert db.space_storage(SPACE) == db.SpaceStorage()
+
+
+@pytest.mark.asyncio
+async def test_exporter_reads_encoded_files(tmp_path):
+    meta_file = tmp_path / "content" / ".dm" / "one" / "meta.content.json"
+    meta_file.parent.mkdir(parents=True)
+    meta_file.write_bytes(storage_codec.dumps({"shortname": "one"}, StorageCodec.msgpack))  # type: ignore
+
+    meta = await exporter.get_meta(
+        space_path=tmp_path, subpath="content", file_path="one", resource_type="content"
+    )
+    assert meta == {"shortname": "one"}
+
+
+@pytest.mark.asyncio
+async def test_public_payload_is_decoded(spaces_folder, monkeypatch):
+    async def allowed(**_):
+        return True
+
+    async def no_plugins(_):
+        return None
+
+    monkeypatch.setattr(public_router.access_control, "check_access", allowed)
+    monkeypatch.setattr(public_router.plugin_manager, "before_action", no_plugins)
+    monkeypatch.setattr(public_router.plugin_manager, "after_action", no_plugins)
+    write_space_meta(SPACE, storage_codec="msgpack")
+    meta = core.Content(
+        shortname="one",
+        owner_shortname="tester",
+        is_active=True,
+        payload=core.Payload(content_type=ContentType.json, body="one.json"),
+    )
+    await db.save(SPACE, "/content", meta, settings.default_branch)
+    await db.save_payload_from_json(SPACE, "/content", meta, DATA, settings.default_branch)
+
+    response = await public_router.retrieve_entry_or_attachment_payload(
+        ResourceType.content, SPACE, "/content", "one", "json", settings.default_branch
+    )
+    assert json.loads(bytes(response.body)) == DATA
@@ -0,0 +1,87 @@
+import hashlib
+import io
+
+import pytest
+from fastapi import UploadFile
+
+from models import api, core
+from models.enums import ContentType
+from utils import db
+from utils.settings import settings
+
+SPACE = "upload_space"
+
+CONTENT = bytes(range(256)) * 64
+
+
+class CountingFile(io.BytesIO):
+    """Records the size of each read of the upload"""
+
+    def __init__(self, content: bytes):
+        super().__init__(content)
+        self.reads: list[int] = []
+
+    def read(self, size: int | None = -1) -> bytes:
+        self.reads.append(-1 if size is None else size)
+        return super().read(size)
+
+
+def upload(content: bytes = CONTENT) -> UploadFile:
+    return UploadFile(file=CountingFile(content), filename="picture.png")
+
+
+async def save_media(shortname: str) -> core.Content:
+    meta = core.Content(
+        shortname=shortname,
+        owner_shortname="tester",
+        is_active=True,
+        payload=core.Payload(content_type=ContentType.image, body=f"{shortname}.png"),
+    )
+    await db.save(SPACE, "/content", meta, settings.default_branch)
+    return meta
+
+
+def payload_files():
+    return sorted(one.name for one in db.payload_path(SPACE, "/content", core.Content).iterdir() if one.is_file())
+
+
+@pytest.mark.asyncio
+async def test_upload_is_streamed_in_chunks(spaces_folder, monkeypatch):
+    monkeypatch.setattr(settings, "upload_chunk_size", 4096)
+    meta = await save_media("one")
+    attachment = upload()
+
+    checksum = await db.save_payload(SPACE, "/content", meta, attachment, settings.default_branch)
+
+    assert checksum == hashlib.sha1(CONTENT).hexdigest()
+    assert max(attachment.file.reads) == 4096  # type: ignore
+    payload_file = db.payload_path(SPACE, "/content", core.Content) / "one.png"
+    assert payload_file.read_bytes() == CONTENT
+    assert payload_files() == ["one.png"]
+
+
+@pytest.mark.asyncio
+async def test_staged_upload_is_committed_or_discarded(spaces_folder):
+    meta = await save_media("one")
+    staged_file, checksum = await db.stage_payload(SPACE, "/content", meta, upload(), settings.default_branch)
+    assert checksum == hashlib.sha1(CONTENT).hexdigest()
+    assert staged_file.is_file() and staged_file.name.endswith(".tmp")
+
+    await db.save_payload(SPACE, "/content", meta, upload(), settings.default_branch, staged_file)
+    assert not staged_file.exists()
+    assert payload_files() == ["one.png"]
+
+    staged_file, _ = await db.stage_payload(SPACE, "/content", meta, upload(b"other"), settings.default_branch)
+    await db.discard_staged_payload(staged_file)
+    assert payload_files() == ["one.png"]
+
+
+@pytest.mark.asyncio
+async def test_upload_without_meta_is_rejected_and_discarded(spaces_folder):
+    meta = await save_media("one")
+    missing = core.Content(shortname="missing", owner_shortname="tester")
+    staged_file, _ = await db.stage_payload(SPACE, "/content", meta, upload(), settings.default_branch)
+
+    with pytest.raises(api.Exception):
+        await db.save_payload(SPACE, "/content", missing, upload(), settings.default_branch, staged_file)
+    assert not staged_file.exists()
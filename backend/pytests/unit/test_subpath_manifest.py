@@ -0,0 +1,138 @@
+import os
+import shutil
+import threading
+
+import pytest
+
+from models import core
+from utils import db, subpath_manifest
+from utils.settings import settings
+
+SPACE = "manifest_space"
+
+
+@pytest.fixture
+def manifest_enabled(spaces_folder, monkeypatch):
+    monkeypatch.setattr(settings, "subpath_manifest_enabled", True)
+    subpath_manifest._manifests.clear()
+    yield spaces_folder
+    subpath_manifest._manifests.clear()
+
+
+def content(shortname: str, tags: list[str] | None = None) -> core.Content:
+    return core.Content(shortname=shortname, owner_shortname="tester", is_active=True, tags=tags or [])
+
+
+def subpath_path():
+    return settings.spaces_folder / SPACE / "content"
+
+
+def touch_later(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.mark.asyncio
+async def test_entries_follow_saves_and_deletes(manifest_enabled):
+    await db.save(SPACE, "/content", content("one"), settings.default_branch)
+    entries = await subpath_manifest.subpath_entries(subpath_path())
+    assert entries is not None and set(entries) == {"content/one"}
+    assert (subpath_path() / ".dm" / subpath_manifest.MANIFEST_FILENAME).is_file()
+
+    await db.save(SPACE, "/content", content("two", ["tagged"]), settings.default_branch)
+    entries = await subpath_manifest.subpath_entries(subpath_path())
+    assert entries is not None and entries["content/two"]["tags"] == ["tagged"]
+
+    # As db.delete does, short of the entry locks kept in redis
+    path, _ = db.metapath(SPACE, "/content", "one", core.Content)
+    await db.remove_from_manifest(path, core.Content, "one")
+    shutil.rmtree(path)
+    entries = await subpath_manifest.subpath_entries(subpath_path())
+    assert entries is not None and set(entries) == {"content/two"}
+
+
+@pytest.mark.asyncio
+async def test_disabled_manifest_is_discarded(manifest_enabled, monkeypatch):
+    await db.save(SPACE, "/content", content("one"), settings.default_branch)
+    assert await subpath_manifest.subpath_entries(subpath_path())
+
+    monkeypatch.setattr(settings, "subpath_manifest_enabled", False)
+    assert await subpath_manifest.subpath_entries(subpath_path()) is None
+    await db.save(SPACE, "/content", content("two"), settings.default_branch)
+    assert not (subpath_path() / ".dm" / subpath_manifest.MANIFEST_FILENAME).exists()
+
+
+@pytest.mark.asyncio
+async def test_out_of_band_changes_are_picked_up(manifest_enabled):
+    await db.save(SPACE, "/content", content("one"), settings.default_branch)
+    await db.save(SPACE, "/content", content("two"), settings.default_branch)
+    assert await subpath_manifest.subpath_entries(subpath_path())
+
+    # Removed behind the server's back, the .dm folder's mtime changes
+    os.remove(subpath_path() / ".dm" / "two" / "meta.content.json")
+    os.rmdir(subpath_path() / ".dm" / "two")
+    entries = await subpath_manifest.subpath_entries(subpath_path())
+    assert entries is not None and set(entries) == {"content/one"}
+
+
+@pytest.mark.asyncio
+async def test_in_place_edit_is_picked_up_on_verification(manifest_enabled, monkeypatch):
+    await db.save(SPACE, "/content", content("one"), settings.default_branch)
+    assert await subpath_manifest.subpath_entries(subpath_path())
+
+    meta_file = subpath_path() / ".dm" / "one" / "meta.content.json"
+    meta_file.write_text(content("one", ["edited"]).model_dump_json(exclude_none=True))
+    touch_later(meta_file)
+    entries = await subpath_manifest.subpath_entries(subpath_path())
+    # Within the verify interval, an in place edit doesn't change the folders
+    assert entries is not None and entries["content/one"]["tags"] == []
+
+    monkeypatch.setattr(settings, "subpath_manifest_verify_interval", 0)
+    entries = await subpath_manifest.subpath_entries(subpath_path())
+    assert entries is not None and entries["content/one"]["tags"] == ["edited"]
+
+
+@pytest.mark.asyncio
+async def test_invalid_meta_file_is_left_out(manifest_enabled):
+    await db.save(SPACE, "/content", content("one"), settings.default_branch)
+    os.makedirs(subpath_path() / ".dm" / "broken")
+    (subpath_path() / ".dm" / "broken" / "meta.content.json").write_text("{not json")
+
+    entries = await subpath_manifest.subpath_entries(subpath_path())
+    assert entries is not None and set(entries) == {"content/one"}
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_the_entries(manifest_enabled):
+    await db.save(SPACE, "/content", content("kept"), settings.default_branch)
+    assert await subpath_manifest.subpath_entries(subpath_path())
+    for index in range(120):
+        await db.save(SPACE, "/content", content("updated", [str(index)]), settings.default_branch)
+
+    manifest = subpath_manifest.read(subpath_path() / ".dm")
+    assert manifest is not None and manifest.lines_count <= 2 * 2 + 100
+    subpath_manifest._manifests.clear()
+    entries = await subpath_manifest.subpath_entries(subpath_path())
+    assert entries is not None and set(entries) == {"content/kept", "content/updated"}
+    assert entries["content/updated"]["tags"] == ["119"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_appends_are_not_lost(manifest_enabled):
+    await db.save(SPACE, "/content", content("first"), settings.default_branch)
+    assert await subpath_manifest.subpath_entries(subpath_path())
+    dm_path = subpath_path() / ".dm"
+
+    def append(offset: int):
+        for index in range(offset, 200, 4):
+            subpath_manifest._append(dm_path, subpath_manifest.manifest_entry(content(f"n{index}")))
+
+    threads = [threading.Thread(target=append, args=(offset,)) for offset in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    subpath_manifest._manifests.clear()
+    manifest = subpath_manifest.read(dm_path)
+    assert manifest is not None and len(manifest.entries) == 201
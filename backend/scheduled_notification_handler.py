@@ -2,8 +2,7 @@
 from datetime import datetime, timedelta
 import json
 from models.core import Content, Notification, NotificationData, Translation
-from utils.db import load as load_meta
-from utils.helpers import branch_path
+from utils.db import entry_dm_path, load as load_meta
 from utils.notification import NotificationManager
 from utils.redis_services import RedisServices
 from utils.repository import (
@@ -103,10 +102,11 @@ async def trigger_admin_notifications() -> None:
 
 async def prepare_request(notification_dict) -> dict:
     # Get Notification Request Images
-    attachments_path = (
-        settings.spaces_folder
-        / f"{settings.management_space}/{branch_path(notification_dict['branch_name'])}"
-        f"/{notification_dict['subpath']}/.dm/{notification_dict['shortname']}"
+    attachments_path = entry_dm_path(
+        settings.management_space,
+        notification_dict["subpath"],
+        notification_dict["shortname"],
+        notification_dict["branch_name"],
     )
     notification_attachments = await get_entry_attachments(
         subpath=f"{notification_dict['subpath']}/{notification_dict['shortname']}",
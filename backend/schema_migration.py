@@ -1,6 +1,7 @@
 import argparse
 import asyncio
 from enum import Enum
+from itertools import chain
 import re
 import sys
 from models.enums import ContentType
@@ -48,9 +49,12 @@ async def change_field_type(
     
     # 4-loop over space by glob "*/.dm/*/meta.*.json"
     path = settings.spaces_folder / space
-    entries_glob = "*/.dm/*/meta.*.json"
-    FILE_PATTERN = re.compile("(\\w*)\\/\\.dm\\/(\\w*)\\/meta\\.([a-zA-Z]*)\\.json$")
-    for one in path.glob(entries_glob):
+    # Entries of sharded subpaths sit under two levels of fan-out folders
+    entries_globs = ["*/.dm/*/meta.*.json", "*/.dm/*/*/*/meta.*.json"]
+    FILE_PATTERN = re.compile(
+        "(\\w*)\\/\\.dm\\/(?:[0-9a-f]{2}\\/[0-9a-f]{2}\\/)?(\\w*)\\/meta\\.([a-zA-Z]*)\\.json$"
+    )
+    for one in chain.from_iterable(path.glob(entries_glob) for entries_glob in entries_globs):
         match = FILE_PATTERN.search(str(one))
         if not match or not one.is_file():
             continue
@@ -0,0 +1,119 @@
+#!/usr/bin/env -S BACKEND_ENV=config.env python3
+
+import argparse
+import json
+import os
+import re
+from pathlib import Path
+
+from utils import sharding
+from utils.file_writer import atomic_write
+from utils.helpers import branch_path
+from utils.settings import settings
+
+# Entries are parked here while being moved, so that a fan-out folder
+# never gets created inside an entry folder sharing its name (e.g. "ab")
+STAGING_FOLDER = ".resharding"
+SHARD_NAME = re.compile("[0-9a-f]{2}")
+
+
+def _entry_folders(dm_path: Path, sharded: bool) -> list[Path]:
+    folders: list[Path] = []
+    for one in sharding.entry_folders(dm_path, sharded):
+        parts = Path(one.path).relative_to(dm_path).parts
+        if one.name.startswith(".") or not all(SHARD_NAME.fullmatch(part) for part in parts[:-1]):
+            continue
+        # Fan-out folders have no meta file
+        if any(Path(one.path).glob("meta.*.json")):
+            folders.append(Path(one.path))
+    return folders
+
+
+def migrate_entries(dm_path: Path, to_sharded: bool, dry_run: bool = False) -> int:
+    """Move the entry folders under dm_path to the requested layout, returns their count"""
+    staging = dm_path / STAGING_FOLDER
+    folders = _entry_folders(dm_path, not to_sharded)
+    if dry_run:
+        return len(folders) + (len(os.listdir(staging)) if staging.is_dir() else 0)
+
+    # A previous interrupted run may have left entries in the staging folder
+    os.makedirs(staging, exist_ok=True)
+    for folder in folders:
+        os.rename(folder, staging / folder.name)
+
+    # Drop the fan-out folders emptied above
+    for level in range(sharding.SHARD_LEVELS, 0, -1):
+        for folder in dm_path.glob("/".join(["[0-9a-f][0-9a-f]"] * level)):
+            if folder.is_dir() and not any(folder.iterdir()):
+                folder.rmdir()
+
+    moved = 0
+    with os.scandir(staging) as iterator:
+        for one in iterator:
+            target = sharding.entry_folder(dm_path, one.name, to_sharded)
+            os.makedirs(target.parent, exist_ok=True)
+            os.rename(one.path, target)
+            moved += 1
+    os.rmdir(staging)
+    return moved
+
+
+def migrate_subpath(
+    space_name: str,
+    subpath: str,
+    branch_name: str | None,
+    to_sharded: bool = True,
+    dry_run: bool = False,
+) -> int:
+    space_meta_file = settings.spaces_folder / space_name / ".dm/meta.space.json"
+    if not space_meta_file.is_file():
+        raise FileNotFoundError(f"{space_meta_file} does not exist!")
+
+    dm_path = (
+        settings.spaces_folder / space_name / branch_path(branch_name)
+        / sharding.subpath_key(subpath) / ".dm"
+    )
+    if not dm_path.is_dir():
+        raise FileNotFoundError(f"{dm_path} does not exist!")
+
+    moved = migrate_entries(dm_path, to_sharded, dry_run)
+
+    if not dry_run:
+        space_meta = json.loads(space_meta_file.read_bytes())
+        sharded_subpaths = {
+            sharding.subpath_key(one) for one in space_meta.get("sharded_subpaths") or []
+        }
+        if to_sharded:
+            sharded_subpaths.add(sharding.subpath_key(subpath))
+        else:
+            sharded_subpaths.discard(sharding.subpath_key(subpath))
+        space_meta["sharded_subpaths"] = sorted(sharded_subpaths)
+        atomic_write(space_meta_file, json.dumps(space_meta))
+
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move the entries of a subpath to (or back from) the sharded fan-out layout. "
+        "Writes to the subpath should be paused while it runs",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("-p", "--space", required=True, help="the space of the subpath")
+    parser.add_argument("-s", "--subpath", required=True, help="the subpath to migrate")
+    parser.add_argument(
+        "-b", "--branch", default=settings.default_branch, help="the branch of the subpath"
+    )
+    parser.add_argument(
+        "--unshard", action="store_true", help="go back to the flat layout"
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="only count the entries to move"
+    )
+
+    args = parser.parse_args()
+
+    count = migrate_subpath(
+        args.space, args.subpath, args.branch, not args.unshard, args.dry_run
+    )
+    print(f"{args.space}/{args.subpath}: {count} entries moved")
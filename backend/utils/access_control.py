@@ -1,6 +1,8 @@
+import asyncio
 import json
 import re
 import sys
+from typing import NamedTuple
 from redis.commands.search.field import TextField
 from redis.commands.search.indexDefinition import IndexDefinition, IndexType
 from redis.commands.search.query import Query
@@ -10,9 +12,25 @@ from utils.helpers import camel_case, flatten_dict
 from utils.settings import settings
 import utils.db as db
 import models.core as core
+from models import api
 from utils.regex import FILE_PATTERN
 from utils.redis_services import RedisServices
 
+
+class AccessCandidate(NamedTuple):
+    """A resource to check by check_access_many, with the arguments check_access takes for it"""
+    subpath: str
+    resource_type: ResourceType
+    action_type: ActionType
+    resource_is_active: bool = False
+    resource_owner_shortname: str | None = None
+    resource_owner_group: str | None = None
+    record_attributes: dict | None = None
+    entry_shortname: str | None = None
+    # The entry ACL when its meta is already loaded, otherwise it's loaded if needed
+    acl: list[ACL] | None = None
+
+
 class AccessControl:
     permissions: dict[str, Permission] = {}
     groups: dict[str, Group] = {}
@@ -33,7 +51,11 @@ class AccessControl:
             self_module = getattr(self, module_name)
             self_module = {}
             path = management_path / module_name
-            entries_glob = ".dm/*/meta.*.json"
+            entries_glob = (
+                ".dm/*/*/*/meta.*.json"
+                if db.is_sharded(settings.management_space, module_name)
+                else ".dm/*/meta.*.json"
+            )
             for one in path.glob(entries_glob):
                 match = FILE_PATTERN.search(str(one))
                 if not match or not one.is_file():
@@ -61,10 +83,8 @@ class AccessControl:
 
     async def create_user_premission_index(self) -> None:
         async with RedisServices() as redis_services:
-            try:
-                # Check if index already exist
-                await redis_services.ft("user_permission").info()
-            except Exception:
+            # Check if index already exist
+            if not await redis_services.index_exists("user_permission"):
                 await redis_services.ft("user_permission").create_index(
                     fields=(TextField("name")),
                     definition=IndexDefinition(
@@ -72,6 +92,7 @@ class AccessControl:
                         index_type=IndexType.JSON,
                     )
                 )
+                redis_services.add_known_index("user_permission")
 
 
     async def store_modules_to_redis(self) -> None:
@@ -147,6 +168,149 @@ class AccessControl:
 
         user_groups = (await self.load_user_meta(user_shortname)).groups or []
 
+        if self.has_permission(
+            user_permissions,
+            user_groups,
+            user_shortname,
+            space_name,
+            subpath,
+            resource_type,
+            action_type,
+            resource_is_active,
+            resource_owner_shortname,
+            resource_owner_group,
+            record_attributes,
+            entry_shortname,
+        ):
+            return True
+
+        if entry_shortname:
+            return await self.check_access_control_list(
+                space_name,
+                subpath,
+                resource_type,
+                entry_shortname,
+                action_type,
+                user_shortname,
+            )
+            
+        return False
+
+    async def check_access_many(
+        self,
+        user_shortname: str,
+        space_name: str,
+        candidates: list[AccessCandidate],
+    ) -> list[bool]:
+        """check_access of each candidate, resolving the user permissions and groups once
+        and loading the ACL of the entries only when their permissions don't allow them"""
+        if not candidates:
+            return []
+
+        user_permissions = await self.get_user_permissions(user_shortname)
+        user_groups = (await self.load_user_meta(user_shortname)).groups or []
+
+        allowed: list[bool] = []
+        # The candidates of a listing mostly share their subpath, type and conditions
+        decisions: dict[tuple, bool] = {}
+        for candidate in candidates:
+            record_attributes = candidate.record_attributes or {}
+            if candidate.resource_type == ResourceType.space and candidate.entry_shortname:
+                allowed.append(
+                    self.has_space_access(user_permissions, candidate.entry_shortname)
+                )
+                continue
+            decision_key = (
+                candidate.subpath,
+                candidate.resource_type,
+                candidate.action_type,
+                bool(candidate.resource_is_active),
+                candidate.resource_owner_shortname == user_shortname
+                or candidate.resource_owner_group in user_groups,
+                candidate.entry_shortname if candidate.resource_type == ResourceType.folder else None,
+            )
+            if not record_attributes and decision_key in decisions:
+                allowed.append(decisions[decision_key])
+                continue
+            decision = self.has_permission(
+                user_permissions,
+                user_groups,
+                user_shortname,
+                space_name,
+                candidate.subpath,
+                candidate.resource_type,
+                candidate.action_type,
+                candidate.resource_is_active,
+                candidate.resource_owner_shortname,
+                candidate.resource_owner_group,
+                record_attributes,
+                candidate.entry_shortname,
+            )
+            if not record_attributes:
+                decisions[decision_key] = decision
+            allowed.append(decision)
+
+        acl_checks = [
+            index for index, candidate in enumerate(candidates)
+            if not allowed[index]
+            and candidate.entry_shortname
+            and candidate.resource_type != ResourceType.space
+        ]
+        # As many meta reads at once as the I/O executor runs
+        acl_loads = asyncio.Semaphore(settings.io_workers)
+
+        async def load_acl(*args) -> list[ACL]:
+            async with acl_loads:
+                return await self.load_acl(*args)
+
+        loaded_acls = await asyncio.gather(
+            *(
+                load_acl(
+                    space_name,
+                    candidates[index].subpath,
+                    candidates[index].resource_type,
+                    str(candidates[index].entry_shortname),
+                )
+                for index in acl_checks
+                if candidates[index].acl is None
+            ),
+            return_exceptions=True,
+        )
+        loaded_acls_iterator = iter(loaded_acls)
+        for index in acl_checks:
+            acl = candidates[index].acl
+            if acl is None:
+                loaded_acl = next(loaded_acls_iterator)
+                if isinstance(loaded_acl, api.Exception):
+                    # No meta to read its ACL from, nothing grants access to it
+                    loaded_acl = []
+                elif isinstance(loaded_acl, BaseException):
+                    raise loaded_acl
+                acl = loaded_acl
+            allowed[index] = self.acl_allows(
+                acl, user_shortname, candidates[index].action_type
+            )
+
+        return allowed
+
+    def has_permission(
+        self,
+        user_permissions: dict,
+        user_groups: list[str],
+        user_shortname: str,
+        space_name: str,
+        subpath: str,
+        resource_type: ResourceType,
+        action_type: ActionType,
+        resource_is_active: bool = False,
+        resource_owner_shortname: str | None = None,
+        resource_owner_group: str | None = None,
+        record_attributes: dict | None = None,
+        entry_shortname: str | None = None
+    ) -> bool:
+        """Whether the resolved user permissions allow the action, not considering the entry ACL"""
+        if record_attributes is None:
+            record_attributes = {}
         # Generate set of achevied conditions on the resource
         # ex: {"is_active", "own"}
         resource_achieved_conditions: set[ConditionType] = set()
@@ -201,16 +365,6 @@ class AccessControl:
             else:
                 search_subpath += "/"
 
-        if entry_shortname:
-            return await self.check_access_control_list(
-                space_name,
-                subpath,
-                resource_type,
-                entry_shortname,
-                action_type,
-                user_shortname,
-            )
-            
         return False
 
     async def check_access_control_list(
@@ -222,6 +376,16 @@ class AccessControl:
         action_type: ActionType,
         user_shortname: str,
     ) -> bool:
+        acl = await self.load_acl(space_name, subpath, resource_type, entry_shortname)
+        return self.acl_allows(acl, user_shortname, action_type)
+
+    async def load_acl(
+        self,
+        space_name: str,
+        subpath: str,
+        resource_type: ResourceType,
+        entry_shortname: str,
+    ) -> list[ACL]:
         resource_cls = getattr(
             sys.modules["models.core"], camel_case(resource_type)
         )
@@ -231,11 +395,13 @@ class AccessControl:
             shortname=entry_shortname,
             class_type=resource_cls
         )
-        if not entry.acl:
-            return False
-        
+        return entry.acl or []
+
+    def acl_allows(
+        self, acl: list[ACL], user_shortname: str, action_type: ActionType
+    ) -> bool:
         user_acl: ACL | None = None
-        for access in entry.acl:
+        for access in acl:
             if access.user_shortname == user_shortname:
                 user_acl = access
                 break
@@ -362,6 +528,9 @@ class AccessControl:
     
     async def check_space_access(self, user_shortname: str, space_name: str) -> bool:
         user_permissions = await access_control.get_user_permissions(user_shortname)
+        return self.has_space_access(user_permissions, space_name)
+
+    def has_space_access(self, user_permissions: dict, space_name: str) -> bool:
         prog = re.compile(f"{space_name}:*|{settings.all_spaces_mw}:*")
         return bool(list(filter(prog.match, user_permissions.keys())))
     
@@ -0,0 +1,146 @@
+""" Content-addressed store of uploaded payloads
+
+Spaces with Space.dedup_payloads keep a single copy of every uploaded payload
+under .dm/.blobs/, named after its sha1 (Payload.checksum), and hardlink it from
+each entry or attachment using it. The link count is the reference count: once
+the last entry is deleted only the store links the blob, and release drops it.
+The leading dot keeps the store apart from the entry folders of the root subpath,
+.dm/{shortname}/, as no shortname starts with one.
+
+Payload files are only ever replaced by rename, never rewritten in place, so
+sharing an inode between entries is safe.
+"""
+
+import os
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+
+from fastapi.logger import logger
+
+from models.enums import ContentType
+from utils import storage_codec
+from utils.settings import settings
+
+BLOBS_FOLDER = ".dm/.blobs"
+
+_META_FILE_ERRORS: tuple[type[Exception], ...] = (OSError, *storage_codec.DECODE_ERRORS)
+
+
+def blob_path(space_name: str, checksum: str) -> Path:
+    return settings.spaces_folder / space_name / BLOBS_FOLDER / checksum[:2] / checksum
+
+
+def _fsync(file_path: Path):
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _link(src_path: Path, file_path: Path) -> bool:
+    """Atomically make file_path a hardlink of src_path"""
+    tmp_path = file_path.with_name(
+        f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.link"
+    )
+    try:
+        os.link(src_path, tmp_path)
+    except FileNotFoundError:
+        # Released meanwhile
+        return False
+    try:
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return True
+
+
+def store(space_name: str, checksum: str, staged_file: Path, file_path: Path, fsync: bool = False):
+    """Move a staged upload to file_path, sharing the stored copy of the same content if any"""
+    blob = blob_path(space_name, checksum)
+    os.makedirs(blob.parent, exist_ok=True)
+    if fsync:
+        _fsync(staged_file)
+    try:
+        os.link(staged_file, blob)
+    except FileExistsError:
+        if _link(blob, file_path):
+            os.remove(staged_file)
+            return
+    except OSError:
+        # No hardlinks on this file system, store it without dedup
+        pass
+    os.replace(staged_file, file_path)
+    if fsync:
+        _fsync(file_path.parent)
+
+
+def is_stored(space_name: str, checksum: str, file_path: Path) -> bool:
+    """Whether file_path is a link of the space's stored copy of checksum"""
+    try:
+        return os.path.samefile(blob_path(space_name, checksum), file_path)
+    except OSError:
+        return False
+
+
+def adopt(space_name: str, checksum: str, src_file: Path, file_path: Path) -> bool:
+    """Link file_path to src_file through the space store, returns False if it can't be shared"""
+    blob = blob_path(space_name, checksum)
+    try:
+        os.makedirs(blob.parent, exist_ok=True)
+        try:
+            os.link(src_file, blob)
+        except FileExistsError:
+            pass
+        return _link(blob, file_path)
+    except OSError:
+        return False
+
+
+def release(space_name: str, checksums: Iterable[str | None]):
+    """Drop the blobs no entry links anymore"""
+    for checksum in set(checksums):
+        if not checksum:
+            continue
+        blob = blob_path(space_name, checksum)
+        try:
+            if os.stat(blob).st_nlink <= 1:
+                os.remove(blob)
+        except FileNotFoundError:
+            pass
+
+
+def referenced_checksums(path: Path) -> set[str]:
+    """The checksums of the stored payloads of the metas under path"""
+    checksums: set[str] = set()
+    for root, _, files in os.walk(path):
+        for filename in files:
+            if not filename.startswith("meta.") or not filename.endswith(".json"):
+                continue
+            try:
+                payload = (
+                    storage_codec.loads(Path(root, filename).read_bytes()) or {}
+                ).get("payload") or {}
+            except _META_FILE_ERRORS as e:
+                logger.warning(f"Skipped the unreadable meta file {root}/{filename}: {e}")
+                continue
+            if payload.get("checksum") and payload.get("content_type") not in ContentType.inline_types():
+                checksums.add(payload["checksum"])
+    return checksums
+
+
+def sweep(space_name: str) -> int:
+    """Drop every blob no entry links anymore (e.g. left over by a payload replaced by another)"""
+    removed = 0
+    for root, _, files in os.walk(settings.spaces_folder / space_name / BLOBS_FOLDER):
+        for filename in files:
+            blob = Path(root) / filename
+            try:
+                if os.stat(blob).st_nlink <= 1:
+                    os.remove(blob)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
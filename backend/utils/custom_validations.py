@@ -1,6 +1,7 @@
 import json
 from typing import Any
-import aiofiles
+from utils import io_executor
+from utils import storage_codec
 from fastapi import status
 from models.core import Record
 from models.enums import RequestType
@@ -37,7 +38,7 @@ async def validate_payload_with_schema(
         schema_shortname=f"{schema_shortname}.json",
     )
 
-    schema = json.loads(FSPath(schema_path).read_text())
+    schema = storage_codec.loads(FSPath(schema_path).read_bytes())
 
     if not isinstance(payload_data, dict):
         data = json.load(payload_data.file)
@@ -93,9 +94,8 @@ async def validate_uniqueness(
     if not folder_meta_path.is_file():
         return True
 
-    async with aiofiles.open(folder_meta_path, "r") as file:
-        content = await file.read()
-    folder_meta = json.loads(content)
+    content = await io_executor.read_bytes(folder_meta_path)
+    folder_meta = storage_codec.loads(content)
 
     if not isinstance(folder_meta.get("unique_fields", None), list):
         return True
@@ -239,12 +239,11 @@ async def validate_jsonl_with_schema(
         schema_shortname=f"{schema_shortname}.json",
     )
 
-    schema = json.loads(FSPath(schema_path).read_text())
+    schema = storage_codec.loads(FSPath(schema_path).read_bytes())
 
-    async with aiofiles.open(file_path, "r") as file:
-        lines = await file.readlines()
-        for line in lines:
-            Draft7Validator(schema).validate(line)
+    lines = (await io_executor.read_text(file_path)).splitlines(keepends=True)
+    for line in lines:
+        Draft7Validator(schema).validate(line)
             
             
 async def validate_csv_with_schema(
@@ -260,7 +259,7 @@ async def validate_csv_with_schema(
         schema_shortname=f"{schema_shortname}.json",
     )
 
-    schema = json.loads(FSPath(schema_path).read_text())
+    schema = storage_codec.loads(FSPath(schema_path).read_bytes())
 
     jsonl: list[dict[str, Any]] = await csv_file_to_json(file_path)
     for json_item in jsonl:
@@ -1,3 +1,4 @@
+from collections import OrderedDict
 from copy import copy
 import shutil
 from models.enums import LockAction
@@ -9,18 +10,253 @@ from utils.middleware import get_request_data
 from utils.redis_services import RedisServices
 from utils.settings import settings
 import models.core as core
-from typing import TypeVar, Type, Any
+from collections.abc import Iterator
+from typing import NamedTuple, TypeVar, Type, Any
 import models.api as api
 import os
 import json
+import threading
 from pathlib import Path
 from fastapi import status
-import aiofiles
+from fastapi.logger import logger
 from utils.regex import FILE_PATTERN, FOLDER_PATTERN
 from shutil import copy2 as copy_file
+from utils import subpath_manifest
+from utils import blob_store
+from utils import sharding
+from utils import history_store
+from utils import file_writer
+from utils import io_executor
+from utils import storage_codec
+from utils import query_cache
+from models.enums import StorageCodec
 
 MetaChild = TypeVar("MetaChild", bound=core.Meta)
 
+# Parsed meta files keyed by their path, validated against the file's
+# (st_mtime_ns, st_ino, st_size) so that out-of-band edits are picked up
+_meta_cache: OrderedDict[str, tuple[tuple[int, int, int], core.Meta]] = OrderedDict()
+
+
+def _stat_signature(stat: os.stat_result) -> tuple[int, int, int]:
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+def _meta_cache_key(path: Path | str) -> str:
+    return os.path.normpath(path)
+
+
+def _meta_cache_get(
+    path: Path, stat: os.stat_result, class_type: type[MetaChild]
+) -> MetaChild | None:
+    key = _meta_cache_key(path)
+    cached = _meta_cache.get(key)
+    if not cached:
+        return None
+
+    signature, meta = cached
+    if signature != _stat_signature(stat) or type(meta) is not class_type:
+        _meta_cache.pop(key, None)
+        return None
+
+    _meta_cache.move_to_end(key)
+    return meta.model_copy(deep=True)  # type: ignore
+
+
+def _meta_cache_put(path: Path, stat: os.stat_result, meta: core.Meta):
+    if settings.meta_cache_size <= 0:
+        return
+
+    key = _meta_cache_key(path)
+    _meta_cache[key] = (_stat_signature(stat), meta.model_copy(deep=True))
+    _meta_cache.move_to_end(key)
+    while len(_meta_cache) > settings.meta_cache_size:
+        _meta_cache.popitem(last=False)
+
+
+def invalidate_meta_cache(path: Path | str | None = None):
+    """Drop the cached meta of the given file, or of every file under the given folder.
+    Clears the whole cache if no path is given"""
+    if path is None:
+        _meta_cache.clear()
+        return
+
+    key = _meta_cache_key(path)
+    if _meta_cache.pop(key, None):
+        return
+
+    prefix = key.rstrip("/") + "/"
+    for key in [key for key in _meta_cache if key.startswith(prefix)]:
+        _meta_cache.pop(key, None)
+
+
+class SpaceStorage(NamedTuple):
+    codec: StorageCodec = StorageCodec.json
+    compression_threshold: int = 0
+    dedup_payloads: bool = False
+    sharded_subpaths: frozenset[str] = frozenset()
+
+
+# Storage settings of each space: (meta.space.json st_mtime_ns, settings)
+_spaces_storage: dict[str, tuple[int, SpaceStorage]] = {}
+
+
+def space_storage(space_name: str) -> SpaceStorage:
+    """How new files of the space are written, read from its meta file"""
+    space_meta_path = settings.spaces_folder / space_name / ".dm" / "meta.space.json"
+    try:
+        mtime_ns = os.stat(space_meta_path).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError):
+        return SpaceStorage()
+
+    cached = _spaces_storage.get(space_name)
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+
+    try:
+        space_meta = json.loads(space_meta_path.read_bytes())
+        storage = SpaceStorage(
+            codec=StorageCodec(space_meta.get("storage_codec", StorageCodec.json)),
+            compression_threshold=int(space_meta.get("compression_threshold") or 0),
+            dedup_payloads=bool(space_meta.get("dedup_payloads")),
+            sharded_subpaths=frozenset(
+                sharding.subpath_key(one) for one in space_meta.get("sharded_subpaths") or []
+            ),
+        )
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"Invalid storage settings in {space_meta_path}, using the defaults: {e}")
+        storage = SpaceStorage()
+    _spaces_storage[space_name] = (mtime_ns, storage)
+    return storage
+
+
+def space_storage_codec(space_name: str) -> StorageCodec:
+    return space_storage(space_name).codec
+
+
+def space_compression_threshold(space_name: str) -> int:
+    """Payloads encoded bigger than this are zstd compressed, 0 disables compression"""
+    return space_storage(space_name).compression_threshold
+
+
+def is_sharded(space_name: str, subpath: str) -> bool:
+    """Whether the entries of the subpath use the fan-out layout, see utils.sharding"""
+    return sharding.subpath_key(subpath) in space_storage(space_name).sharded_subpaths
+
+
+def entry_dm_path(
+    space_name: str,
+    subpath: str,
+    shortname: str,
+    branch_name: str | None = settings.default_branch,
+) -> Path:
+    """The folder holding the meta, history and attachments of an entry"""
+    if subpath[0] == "/":
+        subpath = f".{subpath}"
+    return sharding.entry_folder(
+        settings.spaces_folder / space_name / branch_path(branch_name) / subpath / ".dm",
+        shortname,
+        is_sharded(space_name, subpath),
+    )
+
+
+def encode_meta(space_name: str, meta: core.Meta) -> str | bytes:
+    # Space and branch metas are read before their codec is known, they stay JSON
+    if isinstance(meta, (core.Space, core.Branch)):
+        return storage_codec.dump_model(meta)
+    return storage_codec.dump_model(meta, space_storage_codec(space_name))
+
+
+def encode_payload(space_name: str, payload_data: Any) -> str | bytes:
+    storage = space_storage(space_name)
+    encoded = storage_codec.dumps(payload_data, storage.codec)
+    if storage.compression_threshold and len(encoded) > storage.compression_threshold:
+        return storage_codec.compress(encoded)
+    return encoded
+
+
+def payload_file_path(meta_file: Path, body: str) -> Path:
+    """The JSON payload of a meta file sits next to the entry (or attachment) it belongs to"""
+    if meta_file.parent.name.startswith("attachments"):
+        # {subpath}/.dm/{parent}/attachments.{type}/meta.{shortname}.json
+        return meta_file.parent / body
+    # {subpath}/.dm/{shortname}/meta.{type}.json or {subpath}/{shortname}/.dm/meta.folder.json
+    return meta_file.parent.parent.parent / body
+
+
+_rehydrate_lock = threading.Lock()
+
+
+def rehydrate_history(history_file: Path):
+    """Decompress a history log the compactor archived, so it can be appended to and tailed again"""
+    compressed_file = history_file.with_name(f"{history_file.name}.zst")
+    if history_file.is_file() or not compressed_file.is_file():
+        return
+    with _rehydrate_lock:
+        if history_file.is_file() or not compressed_file.is_file():
+            return
+        storage_codec.decompress_file(compressed_file, history_file)
+        compressed_file.unlink(missing_ok=True)
+
+
+def iter_subpath_locators(
+    space_name: str, branch_name: str | None, subpath: str
+) -> Iterator[core.Locator]:
+    """The locators of all the entries and sub folders of the subpath, read as they're walked"""
+    path = settings.spaces_folder / space_name / branch_path(branch_name) / subpath
+    meta_path = path / ".dm"
+    if not meta_path.is_dir():
+        return
+
+    sharded = is_sharded(space_name, subpath)
+    manifest_entries = subpath_manifest.read_subpath_entries(path, sharded)
+    if manifest_entries is not None:
+        for item in manifest_entries.values():
+            yield core.Locator(
+                space_name=space_name,
+                branch_name=branch_name,
+                subpath=subpath,
+                shortname=item["shortname"],
+                type=ResourceType(item["resource_type"]),
+            )
+        return
+
+    for entry in sharding.entry_folders(meta_path, sharded):
+        with os.scandir(entry) as subpath_iterator:
+            for one in subpath_iterator:
+                match = FILE_PATTERN.search(str(one.path))
+                if not match or not one.is_file():
+                    continue
+
+                yield core.Locator(
+                    space_name=space_name,
+                    branch_name=branch_name,
+                    subpath=subpath,
+                    shortname=match.group(1),
+                    type=ResourceType(match.group(2).lower()),
+                )
+
+    # Get all matching sub folders
+    with os.scandir(path) as subfolders_iterator:
+        for one in subfolders_iterator:
+            if not one.is_dir():
+                continue
+
+            subfolder_meta = Path(one.path + "/.dm/meta.folder.json")
+
+            match = FOLDER_PATTERN.search(str(subfolder_meta))
+
+            if not match or not subfolder_meta.is_file():
+                continue
+
+            yield core.Locator(
+                space_name=space_name,
+                branch_name=branch_name,
+                subpath=subpath,
+                shortname=match.group(1),
+                type=core.ResourceType.folder,
+            )
+
 
 def locators_query(query: api.Query) -> tuple[int, list[core.Locator]]:
     """Given a query return the total and the locators
@@ -39,91 +275,30 @@ def locators_query(query: api.Query) -> tuple[int, list[core.Locator]]:
     total: int = 0
     match query.type:
         case api.QueryType.subpath:
-            path = (
-                settings.spaces_folder
-                / query.space_name
-                / branch_path(query.branch_name)
-                / query.subpath
-            )
-
             if query.include_fields is None:
                 query.include_fields = []
 
-            # Gel all matching entries
-            meta_path = path / ".dm"
-            if not meta_path.is_dir():
-                return total, locators
-
-            path_iterator = os.scandir(meta_path)
-            for entry in path_iterator:
-                if not entry.is_dir():
-                    continue
-
-                subpath_iterator = os.scandir(entry)
-                for one in subpath_iterator:
-                    # for one in path.glob(entries_glob):
-                    match = FILE_PATTERN.search(str(one.path))
-                    if not match or not one.is_file():
-                        continue
-
-                    total += 1
-                    if len(locators) >= query.limit or total < query.offset:
-                        continue
-
-                    shortname = match.group(1)
-                    resource_name = match.group(2).lower()
-                    if (
-                        query.filter_types
-                        and ResourceType(resource_name) not in query.filter_types
-                    ):
-                        continue
-
-                    if (
-                        query.filter_shortnames
-                        and shortname not in query.filter_shortnames
-                    ):
-                        continue
-
-                    locators.append(
-                        core.Locator(
-                            space_name=query.space_name,
-                            branch_name=query.branch_name,
-                            subpath=query.subpath,
-                            shortname=shortname,
-                            type=ResourceType(resource_name),
-                        )
-                    )
-
-            # Get all matching sub folders
-            subfolders_iterator = os.scandir(path)
-            for one in subfolders_iterator:
-                if not one.is_dir():
-                    continue
-
-                subfolder_meta = Path(one.path + "/.dm/meta.folder.json")
-
-                match = FOLDER_PATTERN.search(str(subfolder_meta))
-
-                if not match or not subfolder_meta.is_file():
-                    continue
-
+            for locator in iter_subpath_locators(
+                query.space_name, query.branch_name, query.subpath
+            ):
                 total += 1
                 if len(locators) >= query.limit or total < query.offset:
                     continue
 
-                shortname = match.group(1)
-                if query.filter_shortnames and shortname not in query.filter_shortnames:
+                if (
+                    query.filter_types
+                    and locator.type != ResourceType.folder
+                    and locator.type not in query.filter_types
+                ):
                     continue
 
-                locators.append(
-                    core.Locator(
-                        space_name=query.space_name,
-                        branch_name=query.branch_name,
-                        subpath=query.subpath,
-                        shortname=shortname,
-                        type=core.ResourceType.folder,
-                    )
-                )
+                if (
+                    query.filter_shortnames
+                    and locator.shortname not in query.filter_shortnames
+                ):
+                    continue
+
+                locators.append(locator)
 
     return total, locators
 
@@ -165,24 +340,60 @@ def metapath(
     elif issubclass(class_type, core.Attachment):
         [parent_subpath, parent_name] = subpath.rsplit("/", 1)
         # schema_shortname = "." + schema_shortname if schema_shortname else ""
-        attachment_folder = (
-            f"{parent_name}/attachments.{class_type.__name__.lower()}"
-        )
-        path = path / parent_subpath / ".dm" / attachment_folder
+        path = entry_dm_path(
+            space_name, parent_subpath, parent_name, branch_name
+        ) / f"attachments.{class_type.__name__.lower()}"
         filename = f"meta.{shortname}.json"
     elif issubclass(class_type, core.History):
         [parent_subpath, parent_name] = subpath.rsplit("/", 1)
-        path = path / parent_subpath / ".dm" / f"{parent_name}/history"
+        path = entry_dm_path(space_name, parent_subpath, parent_name, branch_name) / "history"
         filename = f"{shortname}.json"
     elif issubclass(class_type, core.Branch):
         path = settings.spaces_folder / space_name / shortname / ".dm"
         filename = "meta.branch.json"
     else:
-        path = path / subpath / ".dm" / shortname
+        path = entry_dm_path(space_name, subpath, shortname, branch_name)
         filename = f"meta.{snake_case(class_type.__name__)}.json"
     return path, filename
 
 
+def manifest_dir(path: Path, class_type: type[MetaChild]) -> Path | None:
+    """The folder of the manifest listing the meta file stored under the given metapath folder"""
+    if issubclass(class_type, (core.Space, core.History, core.Branch)):
+        return None
+    if issubclass(class_type, core.Folder):
+        # {subpath}/{shortname}/.dm => {subpath}/.dm
+        return path.parent.parent / ".dm"
+    if issubclass(class_type, core.Attachment):
+        # .dm/{parent}/attachments.{type}
+        return path.parent
+    # {subpath}/.dm/{shortname}, possibly under fan-out folders
+    return next(one for one in path.parents if one.name == ".dm")
+
+
+def meta_filename(class_type: type[MetaChild], shortname: str) -> str:
+    """The name of the meta file within its metapath folder, see metapath"""
+    if issubclass(class_type, core.Folder):
+        return f"meta.{class_type.__name__.lower()}.json"
+    if issubclass(class_type, core.Attachment):
+        return f"meta.{shortname}.json"
+    return f"meta.{snake_case(class_type.__name__)}.json"
+
+
+async def update_manifest(path: Path, meta: core.Meta):
+    dm_path = manifest_dir(path, meta.__class__)
+    if dm_path:
+        await subpath_manifest.upsert(
+            dm_path, meta, path / meta_filename(meta.__class__, meta.shortname)
+        )
+
+
+async def remove_from_manifest(path: Path, class_type: type[MetaChild], shortname: str):
+    dm_path = manifest_dir(path, class_type)
+    if dm_path:
+        await subpath_manifest.remove(dm_path, snake_case(class_type.__name__), shortname)
+
+
 def payload_path(
     space_name: str,
     subpath: str,
@@ -198,10 +409,9 @@ def payload_path(
     if issubclass(class_type, core.Attachment):
         [parent_subpath, parent_name] = subpath.rsplit("/", 1)
         schema_shortname = "." + schema_shortname if schema_shortname else ""
-        attachment_folder = (
-            f"{parent_name}/attachments{schema_shortname}.{class_type.__name__.lower()}"
-        )
-        path = path / parent_subpath / ".dm" / attachment_folder
+        path = entry_dm_path(
+            space_name, parent_subpath, parent_name, branch_name
+        ) / f"attachments{schema_shortname}.{class_type.__name__.lower()}"
     else:
         path = path / subpath
     return path
@@ -221,7 +431,12 @@ async def load(
     path, filename = metapath(
         space_name, subpath, shortname, class_type, branch_name, schema_shortname
     )
-    if not (path / filename).is_file():
+    try:
+        stat = os.stat(path / filename)
+    except (FileNotFoundError, NotADirectoryError):
+        stat = None
+    if not stat or not os.path.isfile(path / filename):
+        invalidate_meta_cache(path / filename)
         # Remove the folder
         if path.is_dir() and len(os.listdir(path)) == 0:
             shutil.rmtree(path)
@@ -236,9 +451,15 @@ async def load(
         )
 
     path /= filename
-    async with aiofiles.open(path, "r") as file:
-        content = await file.read()
-        return class_type.model_validate_json(content)
+    cached_meta = _meta_cache_get(path, stat, class_type)
+    if cached_meta:
+        return cached_meta
+
+    content = await io_executor.read_bytes(path)
+    meta = storage_codec.load_model(class_type, content)
+
+    _meta_cache_put(path, stat, meta)
+    return meta
 
 
 def load_resource_payload(
@@ -260,7 +481,7 @@ def load_resource_payload(
         #     status_code=status.HTTP_404_NOT_FOUND,
         #     error=api.Error(type="db", code=12, message="Request object is not available"),
         # )
-    return json.loads(path.read_bytes())
+    return storage_codec.loads(path.read_bytes())
 
 
 async def save(
@@ -279,8 +500,12 @@ async def save(
     if not path.is_dir():
         os.makedirs(path)
 
-    async with aiofiles.open(path / filename, "w") as file:
-        await file.write(meta.model_dump_json(exclude_none=True))
+    await file_writer.write_file(
+        path / filename, encode_meta(space_name, meta)
+    )
+    invalidate_meta_cache(path / filename)
+    await update_manifest(path, meta)
+    await query_cache.bump(space_name, branch_name, subpath, meta.shortname)
 
 
 async def create(
@@ -300,13 +525,50 @@ async def create(
     if not path.is_dir():
         os.makedirs(path)
 
-    async with aiofiles.open(path / filename, "w") as file:
-        await file.write(meta.model_dump_json(exclude_none=True))
+    await file_writer.write_file(
+        path / filename, encode_meta(space_name, meta)
+    )
+    invalidate_meta_cache(path / filename)
+    await update_manifest(path, meta)
+    await query_cache.bump(space_name, branch_name, subpath, meta.shortname)
 
 
-async def save_payload(
+async def stage_payload(
     space_name: str, subpath: str, meta: core.Meta, attachment, branch_name: str | None
-):
+) -> tuple[Path, str]:
+    """Stream an uploaded payload to a temp file beside its destination
+
+    Returns the staged file, to be passed to save_payload (or discard_staged_payload),
+    and the sha1 of its content.
+    """
+    payload_file_path = payload_path(
+        space_name, subpath, meta.__class__, branch_name)
+    await io_executor.run(_make_dirs, payload_file_path)
+    tmp_path, checksum = await file_writer.stream_to_temp(
+        payload_file_path / (meta.shortname + Path(attachment.filename).suffix),
+        attachment,
+        settings.upload_chunk_size,
+    )
+    return Path(tmp_path), checksum
+
+
+async def discard_staged_payload(staged_file: Path):
+    await io_executor.run(file_writer.discard_temp, staged_file)
+
+
+async def save_payload(
+    space_name: str,
+    subpath: str,
+    meta: core.Meta,
+    attachment,
+    branch_name: str | None,
+    staged_file: Path | None = None,
+) -> str | None:
+    """Store the uploaded attachment as the payload of meta
+
+    The upload is streamed in chunks unless already staged by stage_payload,
+    returns the sha1 of the content.
+    """
     path, filename = metapath(
         space_name, subpath, meta.shortname, meta.__class__, branch_name
     )
@@ -315,15 +577,38 @@ async def save_payload(
     payload_filename = meta.shortname + Path(attachment.filename).suffix
 
     if not (path / filename).is_file():
+        if staged_file:
+            await discard_staged_payload(staged_file)
         raise api.Exception(
             status_code=status.HTTP_400_BAD_REQUEST,
             error=api.Error(
                 type="create", code=InternalErrorCode.MISSING_METADATA, message="metadata is missing"),
         )
 
-    async with aiofiles.open(payload_file_path / payload_filename, "wb") as file:
-        content = await attachment.read()
-        await file.write(content)
+    checksum = None
+    if not staged_file:
+        staged_file, checksum = await stage_payload(
+            space_name, subpath, meta, attachment, branch_name
+        )
+    if not checksum and meta.payload:
+        checksum = meta.payload.checksum
+    try:
+        if checksum and space_storage(space_name).dedup_payloads:
+            await io_executor.run(
+                blob_store.store,
+                space_name,
+                checksum,
+                staged_file,
+                payload_file_path / payload_filename,
+                settings.fsync_writes,
+            )
+        else:
+            await file_writer.commit_temp(staged_file, payload_file_path / payload_filename)
+    except BaseException:
+        await discard_staged_payload(staged_file)
+        raise
+    await query_cache.bump(space_name, branch_name, subpath, meta.shortname)
+    return checksum
 
 
 async def save_payload_from_json(
@@ -358,8 +643,10 @@ async def save_payload_from_json(
                 type="create", code=InternalErrorCode.MISSING_METADATA, message="metadata is missing"),
         )
 
-    async with aiofiles.open(payload_file_path / payload_filename, "w") as file:
-        await file.write(json.dumps(payload_data))
+    await file_writer.write_file(
+        payload_file_path / payload_filename, encode_payload(space_name, payload_data)
+    )
+    await query_cache.bump(space_name, branch_name, subpath, meta.shortname)
 
 
 async def update(
@@ -417,8 +704,12 @@ async def update(
             )
 
     meta.updated_at = datetime.now()
-    async with aiofiles.open(path / filename, "w") as file:
-        await file.write(meta.model_dump_json(exclude_none=True))
+    await file_writer.write_file(
+        path / filename, encode_meta(space_name, meta)
+    )
+    invalidate_meta_cache(path / filename)
+    await update_manifest(path, meta)
+    await query_cache.bump(space_name, branch_name, subpath, meta.shortname)
 
     history_diff = await store_entry_diff(
         space_name,
@@ -435,6 +726,184 @@ async def update(
     return history_diff
 
 
+def _make_dirs(path: Path):
+    os.makedirs(path, exist_ok=True)
+
+
+async def create_many(
+    space_name: str,
+    entries: list[tuple[str, core.Meta, dict[str, Any] | None]],
+    branch_name: str | None,
+) -> list[api.Exception | None]:
+    """Create many entries at once, writing their meta and payload files in parallel
+
+    entries are (subpath, meta, payload_data) tuples, the error of each entry
+    (None on success) is returned in its place
+    """
+    errors: list[api.Exception | None] = [None] * len(entries)
+    files: list[tuple[Path, str | bytes]] = []
+    entries_files: list[tuple[int, Path, int]] = []
+    directories: set[Path] = set()
+    meta_files: set[Path] = set()
+    for index, (subpath, meta, payload_data) in enumerate(entries):
+        path, filename = metapath(
+            space_name, subpath, meta.shortname, meta.__class__, branch_name
+        )
+        if (path / filename) in meta_files or (path / filename).is_file():
+            errors[index] = api.Exception(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                error=api.Error(
+                    type="create", code=InternalErrorCode.SHORTNAME_ALREADY_EXIST, message="already exists"),
+            )
+            continue
+        meta_files.add(path / filename)
+        directories.add(path)
+        entries_files.append((index, path, len(files)))
+        files.append((path / filename, encode_meta(space_name, meta)))
+
+        if payload_data is not None:
+            payload_file_path = payload_path(
+                space_name,
+                subpath,
+                meta.__class__,
+                branch_name,
+                meta.payload.schema_shortname if meta.payload else None,
+            )
+            directories.add(payload_file_path)
+            files.append(
+                (payload_file_path / f"{meta.shortname}.json", encode_payload(space_name, payload_data))
+            )
+
+    await io_executor.run_batch(_make_dirs, directories)
+    write_errors = await file_writer.write_files(files)
+
+    rolled_back: list[Path] = []
+    for position, (index, path, first_file) in enumerate(entries_files):
+        last_file = (
+            entries_files[position + 1][2]
+            if position + 1 < len(entries_files)
+            else len(files)
+        )
+        invalidate_meta_cache(files[first_file][0])
+        if any(write_errors[first_file:last_file]):
+            errors[index] = api.Exception(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                error=api.Error(
+                    type="create", code=InternalErrorCode.SOMETHING_WRONG, message="Failed to write the entry files"),
+            )
+            # Not to leave the entry half created, e.g. its meta file without its payload
+            rolled_back.extend(
+                files[file_index][0]
+                for file_index in range(first_file, last_file)
+                if write_errors[file_index] is None
+            )
+            continue
+        await update_manifest(path, entries[index][1])
+    await io_executor.run_batch(file_writer.discard_temp, rolled_back)
+
+    for subpath in {entries[index][0] for index, _, _ in entries_files}:
+        await query_cache.bump(space_name, branch_name, subpath)
+    return errors
+
+
+async def update_many(
+    space_name: str,
+    entries: list[tuple[str, core.Meta, dict, dict, list]],
+    branch_name: str | None,
+    user_shortname: str,
+) -> list[dict | api.Exception]:
+    """Update many entries at once, writing their meta files in parallel
+
+    entries are (subpath, meta, old_version_flattend, new_version_flattend,
+    updated_attributes_flattend) tuples, the history diff of each entry (or its
+    error) is returned in its place
+    """
+    results: list[dict | api.Exception] = [{}] * len(entries)
+    files: list[tuple[Path, str | bytes]] = []
+    updated: list[tuple[int, Path]] = []
+    async with RedisServices() as redis_services:
+        for index, (subpath, meta, _, _, _) in enumerate(entries):
+            path, filename = metapath(
+                space_name,
+                subpath,
+                meta.shortname,
+                meta.__class__,
+                branch_name,
+                meta.payload.schema_shortname if meta.payload else None,
+            )
+            if not (path / filename).is_file():
+                results[index] = api.Exception(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    error=api.Error(type="update", code=InternalErrorCode.OBJECT_NOT_FOUND,
+                                    message="Request object is not available"),
+                )
+                continue
+            if await redis_services.is_entry_locked(
+                space_name, branch_name, subpath, meta.shortname, user_shortname
+            ):
+                results[index] = api.Exception(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    error=api.Error(
+                        type="update", code=InternalErrorCode.LOCKED_ENTRY, message="This entry is locked"),
+                )
+                continue
+            elif await redis_services.get_lock_doc(
+                space_name, branch_name, subpath, meta.shortname
+            ):
+                await redis_services.delete_lock_doc(
+                    space_name, branch_name, subpath, meta.shortname
+                )
+                await store_entry_diff(
+                    space_name,
+                    branch_name,
+                    "/" + subpath,
+                    meta.shortname,
+                    user_shortname,
+                    {},
+                    {"lock_type": LockAction.unlock},
+                    ["lock_type"],
+                    core.Content,
+                )
+
+            meta.updated_at = datetime.now()
+            updated.append((index, path))
+            files.append((path / filename, encode_meta(space_name, meta)))
+
+    write_errors = await file_writer.write_files(files)
+
+    stored: list[int] = []
+    for (index, path), (file_path, _), write_error in zip(updated, files, write_errors):
+        invalidate_meta_cache(file_path)
+        if write_error:
+            results[index] = api.Exception(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                error=api.Error(
+                    type="update", code=InternalErrorCode.SOMETHING_WRONG, message="Failed to write the entry"),
+            )
+            continue
+        await update_manifest(path, entries[index][1])
+        stored.append(index)
+
+    for subpath in {entries[index][0] for index, _ in updated}:
+        await query_cache.bump(space_name, branch_name, subpath)
+
+    for index in stored:
+        subpath, meta, old_version_flattend, new_version_flattend, updated_attributes_flattend = entries[index]
+        results[index] = await store_entry_diff(
+            space_name,
+            branch_name,
+            subpath,
+            meta.shortname,
+            user_shortname,
+            old_version_flattend,
+            new_version_flattend,
+            updated_attributes_flattend,
+            meta.__class__,
+        )
+
+    return results
+
+
 async def store_entry_diff(
     space_name: str,
     branch_name: str | None,
@@ -490,20 +959,18 @@ async def store_entry_diff(
         if issubclass(resource_type, core.Attachment):
             history_path = Path(f"{history_path}/.dm/{subpath}")
         else:
-            if subpath == "/":
-                history_path = Path(f"{history_path}/.dm/{shortname}")
-            else:
-                history_path = Path(
-                    f"{history_path}/{subpath}/.dm/{shortname}")
+            history_path = entry_dm_path(space_name, subpath, shortname, branch_name)
 
     if not os.path.exists(history_path):
         os.makedirs(history_path)
 
-    async with aiofiles.open(
-        f"{history_path}/history.jsonl",
-        "a",
-    ) as events_file:
-        await events_file.write(f"{history_obj.model_dump_json()}\n")
+    history_file = history_path / "history.jsonl"
+    await io_executor.run(rehydrate_history, history_file)
+    await io_executor.run(
+        history_store.append, history_file, f"{history_obj.model_dump_json()}\n"
+    )
+    await history_store.sync(history_file)
+    await query_cache.bump(space_name, branch_name, subpath, shortname)
 
     return history_diff
 
@@ -546,6 +1013,8 @@ async def move(
 
     
 
+    src_manifest_path = src_path
+
     meta_updated = False
     dest_path_without_dm = dest_path
     if dest_shortname:
@@ -578,8 +1047,12 @@ async def move(
         and not os.path.isdir(dest_path_without_dm)
     ):
         os.makedirs(dest_path_without_dm)
+    # The fan-out folders of a sharded destination
+    os.makedirs(dest_path_without_dm.parent, exist_ok=True)
         
     os.rename(src=src_path , dst=dest_path_without_dm )
+    invalidate_meta_cache(src_path)
+    invalidate_meta_cache(dest_path_without_dm)
 
     # Move payload file with the meta file
     if (
@@ -603,8 +1076,18 @@ async def move(
             os.rename(src=src_payload_file_path, dst=dist_payload_file_path)
 
     if meta_updated:
-        async with aiofiles.open(dest_path / dest_filename, "w") as opened_file:
-            await opened_file.write(meta.model_dump_json(exclude_none=True))
+        await file_writer.write_file(
+            dest_path / dest_filename, encode_meta(space_name, meta)
+        )
+        invalidate_meta_cache(dest_path / dest_filename)
+
+    await remove_from_manifest(src_manifest_path, meta.__class__, src_shortname)
+    await update_manifest(dest_path, meta)
+    is_folder = isinstance(meta, core.Folder)
+    await query_cache.bump(space_name, branch_name, src_subpath, src_shortname, tree=is_folder)
+    await query_cache.bump(
+        space_name, branch_name, dest_subpath or src_subpath, meta.shortname, tree=is_folder
+    )
 
     # Delete Src path if empty
     if src_path.parent.is_dir():
@@ -653,6 +1136,9 @@ async def clone(
         os.makedirs(dest_path)
 
     copy_file(src=src_path / src_filename, dst=dest_path / dest_filename)
+    invalidate_meta_cache(dest_path / dest_filename)
+    meta_obj.shortname = dest_shortname
+    await update_manifest(dest_path, meta_obj)
 
     payload_path(src_space, src_subpath, class_type, branch_name)
     # Move payload file with the meta file
@@ -671,7 +1157,16 @@ async def clone(
             )
             / meta_obj.payload.body
         )
-        copy_file(src=src_payload_file_path, dst=dist_payload_file_path)
+        checksum = meta_obj.payload.checksum
+        if not (
+            checksum
+            and space_storage(dest_space).dedup_payloads
+            and blob_store.is_stored(src_space, checksum, src_payload_file_path)
+            and blob_store.adopt(dest_space, checksum, src_payload_file_path, dist_payload_file_path)
+        ):
+            copy_file(src=src_payload_file_path, dst=dist_payload_file_path)
+
+    await query_cache.bump(dest_space, branch_name, dest_subpath, dest_shortname)
 
 
 async def delete(
@@ -727,6 +1222,9 @@ async def delete(
             )
 
     pathname = path / filename
+    invalidate_meta_cache(pathname)
+    await remove_from_manifest(path, meta.__class__, meta.shortname)
+    released_checksums: set[str] = set()
     if pathname.is_file():
         os.remove(pathname)
 
@@ -737,9 +1235,10 @@ async def delete(
             ) / str(meta.payload.body)
             if payload_file_path.exists() and payload_file_path.is_file():
                 os.remove(payload_file_path)
+                if meta.payload.checksum:
+                    released_checksums.add(meta.payload.checksum)
 
-    history_path = f"{settings.spaces_folder}/{space_name}/{branch_path(branch_name)}" +\
-        f"{subpath}/.dm/{meta.shortname}"
+    history_path = entry_dm_path(space_name, subpath, meta.shortname, branch_name)
 
     if (
         path.is_dir()
@@ -748,9 +1247,23 @@ async def delete(
             or len(os.listdir(path)) == 0
         )
     ):
+        if space_storage(space_name).dedup_payloads:
+            # The attachments (and for folders, the entries) removed along
+            released_checksums.update(blob_store.referenced_checksums(
+                path.parent if isinstance(meta, core.Folder) else path
+            ))
         shutil.rmtree(path)
+        invalidate_meta_cache(path)
         # in case of folder the path = {folder_name}/.dm
         if isinstance(meta, core.Folder) and path.parent.is_dir():
             shutil.rmtree(path.parent)
+            invalidate_meta_cache(path.parent)
         if isinstance(meta, core.Folder) and Path(history_path).is_dir():
             shutil.rmtree(history_path)
+
+    if released_checksums and space_storage(space_name).dedup_payloads:
+        blob_store.release(space_name, released_checksums)
+
+    await query_cache.bump(
+        space_name, branch_name, subpath, meta.shortname, tree=isinstance(meta, core.Folder)
+    )
@@ -0,0 +1,234 @@
+""" Segmented events log of a space
+
+The action_log plugin appends the events of a space (branch) to daily segments,
+.dm/events/{YYYYMMDD}.jsonl, rolling over to {YYYYMMDD}.{n}.jsonl once a segment
+reaches settings.events_segment_size. Each segment is line offset indexed by
+utils.history_store, and once sealed (i.e. no longer the newest one) gets a
+{segment}.summary.json with its time range and a bloom filter of its string
+literals, built on first use.
+
+Events queries walk the segments from the newest one, skip the segments outside
+of the requested dates or not containing the searched term, and count and page
+without reading the lines they don't return whenever no per-line filter applies.
+The single .dm/events.jsonl written before segmentation is read as the oldest segment.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import os
+import re
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from utils import history_store
+from utils.file_writer import atomic_write
+from utils.settings import settings
+
+EVENTS_FOLDER = "events"
+LEGACY_EVENTS_FILE = "events.jsonl"
+SEGMENT_PATTERN = re.compile(r"^(\d{8})(?:\.(\d+))?\.jsonl$")
+STRING_LITERAL = re.compile(rb'"((?:[^"\\]|\\.)*)"')
+BLOOM_HASHES = 7
+BLOOM_BITS_PER_TERM = 10
+# Lines read at once while filtering a segment line by line
+SCAN_BATCH = 1000
+
+
+def _segment_key(segment: Path) -> tuple[str, int]:
+    match = SEGMENT_PATTERN.match(segment.name)
+    if not match:
+        # The legacy file predates all the segments
+        return "", 0
+    return match.group(1), int(match.group(2) or 0)
+
+
+def segments(dm_path: Path) -> list[Path]:
+    """The segments of the events log under dm_path, oldest first"""
+    found: list[Path] = []
+    if (dm_path / LEGACY_EVENTS_FILE).is_file():
+        found.append(dm_path / LEGACY_EVENTS_FILE)
+    events_folder = dm_path / EVENTS_FOLDER
+    if events_folder.is_dir():
+        with os.scandir(events_folder) as iterator:
+            found.extend(
+                Path(one.path) for one in iterator
+                if SEGMENT_PATTERN.match(one.name) and one.is_file()
+            )
+    return sorted(found, key=_segment_key)
+
+
+def append(dm_path: Path, lines: list[str], timestamp: datetime) -> Path:
+    """Append the events lines to the segment of their day, returns the segment written"""
+    events_folder = dm_path / EVENTS_FOLDER
+    os.makedirs(events_folder, exist_ok=True)
+    day = timestamp.strftime("%Y%m%d")
+    part = 0
+    with os.scandir(events_folder) as iterator:
+        for one in iterator:
+            match = SEGMENT_PATTERN.match(one.name)
+            if match and match.group(1) == day:
+                part = max(part, int(match.group(2) or 0))
+
+    segment = events_folder / (f"{day}.{part}.jsonl" if part else f"{day}.jsonl")
+    if segment.is_file() and segment.stat().st_size >= settings.events_segment_size:
+        segment = events_folder / f"{day}.{part + 1}.jsonl"
+
+    history_store.append(segment, "".join(f"{line}\n" for line in lines))
+    return segment
+
+
+def _day_range(segment: Path) -> tuple[datetime, datetime] | None:
+    day = _segment_key(segment)[0]
+    if not day:
+        return None
+    start = datetime.strptime(day, "%Y%m%d")
+    return start, start + timedelta(days=1)
+
+
+def _bloom_positions(term: bytes, bits: int) -> list[int]:
+    digest = hashlib.blake2b(term, digest_size=16).digest()
+    first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+    return [(first + one * second) % bits for one in range(BLOOM_HASHES)]
+
+
+def _event_timestamp(line: bytes) -> datetime | None:
+    try:
+        return datetime.fromisoformat(json.loads(line)["timestamp"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def _build_summary(segment: Path, size: int) -> dict[str, Any]:
+    terms: set[bytes] = set()
+    first: datetime | None = None
+    last: datetime | None = None
+    total = history_store.line_count(segment)
+    for start in range(0, total, SCAN_BATCH):
+        for line in history_store.read_lines(segment, start, start + SCAN_BATCH):
+            terms.update(STRING_LITERAL.findall(line))
+            timestamp = _event_timestamp(line)
+            if timestamp:
+                first = min(first, timestamp) if first else timestamp
+                last = max(last, timestamp) if last else timestamp
+
+    bits = max(64, len(terms) * BLOOM_BITS_PER_TERM)
+    bloom = bytearray(math.ceil(bits / 8))
+    for term in terms:
+        for position in _bloom_positions(term, bits):
+            bloom[position // 8] |= 1 << (position % 8)
+
+    return {
+        "size": size,
+        "lines": total,
+        "first": first.isoformat() if first else None,
+        "last": last.isoformat() if last else None,
+        "bloom_bits": bits,
+        "bloom": base64.b64encode(bloom).decode(),
+    }
+
+
+def summary(segment: Path) -> dict[str, Any]:
+    """The time range and terms bloom filter of a sealed segment, built on first use"""
+    summary_file = segment.with_name(f"{segment.name}.summary.json")
+    size = segment.stat().st_size
+    try:
+        content: dict[str, Any] = json.loads(summary_file.read_bytes())
+        if content.get("size") == size:
+            return content
+    except (FileNotFoundError, ValueError):
+        pass
+    content = _build_summary(segment, size)
+    atomic_write(summary_file, json.dumps(content))
+    return content
+
+
+def _may_contain(segment_summary: dict[str, Any], term: str) -> bool:
+    bloom = base64.b64decode(segment_summary["bloom"])
+    return all(
+        bloom[position // 8] & (1 << (position % 8))
+        for position in _bloom_positions(term.encode(), segment_summary["bloom_bits"])
+    )
+
+
+def _local(value: datetime | None) -> datetime | None:
+    """Events timestamps are naive local times"""
+    if value and value.tzinfo:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def query(
+    dm_path: Path,
+    offset: int,
+    limit: int,
+    from_date: datetime | None = None,
+    to_date: datetime | None = None,
+    search: str | None = None,
+) -> tuple[int, list[bytes]]:
+    """The count of the matching events and their [offset, offset + limit) page, newest first
+
+    search matches the events having it as a whole JSON string (key or value).
+    """
+    from_date, to_date = _local(from_date), _local(to_date)
+    needle = f'"{search}"'.encode() if search else None
+    all_segments = segments(dm_path)
+    total = 0
+    page: list[bytes] = []
+
+    for index, segment in reversed(list(enumerate(all_segments))):
+        time_range = _day_range(segment)
+        sealed = index < len(all_segments) - 1
+        segment_summary = summary(segment) if sealed and (needle or not time_range) else None
+        if segment_summary and segment_summary["first"]:
+            time_range = (
+                datetime.fromisoformat(segment_summary["first"]),
+                datetime.fromisoformat(segment_summary["last"]),
+            )
+
+        if time_range and (
+            (from_date and time_range[1] < from_date)
+            or (to_date and time_range[0] > to_date)
+        ):
+            continue
+        if search and segment_summary and not _may_contain(segment_summary, search):
+            continue
+
+        lines_count = history_store.line_count(segment)
+        fully_in_range = not (from_date or to_date) or bool(
+            time_range
+            and (not from_date or time_range[0] >= from_date)
+            and (not to_date or time_range[1] <= to_date)
+        )
+        if not needle and fully_in_range:
+            # Every line matches, only the ones within the page are read
+            page_start = max(offset - total, 0)
+            page_end = min(offset + limit - total, lines_count)
+            if page_start < page_end:
+                lines = history_store.read_lines(
+                    segment, lines_count - page_end, lines_count - page_start
+                )
+                lines.reverse()
+                page.extend(lines)
+            total += lines_count
+            continue
+
+        for batch_end in range(lines_count, 0, -SCAN_BATCH):
+            lines = history_store.read_lines(segment, max(batch_end - SCAN_BATCH, 0), batch_end)
+            for line in reversed(lines):
+                if needle and needle not in line:
+                    continue
+                if from_date or to_date:
+                    timestamp = _event_timestamp(line)
+                    if not timestamp or (
+                        (from_date and timestamp < from_date)
+                        or (to_date and timestamp > to_date)
+                    ):
+                        continue
+                if offset <= total < offset + limit:
+                    page.append(line)
+                total += 1
+
+    return total, [line for line in page if line]
@@ -11,6 +11,10 @@ import jsonschema
 from aiofiles import open as aopen
 from pathlib import Path
 
+# Run as a module (python -m utils.exporter) to decode the files of spaces stored
+# with a codec or compressed
+from utils import sharding, storage_codec
+
 # from pydantic import config
 
 
@@ -52,7 +56,14 @@ def meta_path(
     file_path: str, 
     resource_type: str
 ) -> Path:
-    return space_path / f"{subpath}/.dm/{file_path}/meta.{resource_type}.json"    
+    dm_path = space_path / f"{subpath}/.dm"
+    path = sharding.entry_folder(dm_path, file_path, False) / f"meta.{resource_type}.json"
+    if not path.is_file():
+        # Entries of sharded subpaths sit under fan-out folders
+        sharded_path = sharding.entry_folder(dm_path, file_path, True) / f"meta.{resource_type}.json"
+        if sharded_path.is_file():
+            return sharded_path
+    return path
 
 async def get_meta(
     *, 
@@ -62,8 +73,8 @@ async def get_meta(
     resource_type: str
 ):
     meta_content = meta_path(space_path, subpath, file_path, resource_type)
-    async with aopen(meta_content, "r") as f:
-        return json.loads(await f.read())
+    async with aopen(meta_content, "rb") as f:
+        return storage_codec.loads(await f.read())
 
 
 def validate_config(config_obj: dict):
@@ -157,8 +168,8 @@ async def extract(
 
     space_path = Path(f"{spaces_path}/{space}")
     subpath_schema_obj = None
-    with open(space_path / f"schema/{schema_shortname}.json", "r") as f:
-        subpath_schema_obj = json.load(f)
+    with open(space_path / f"schema/{schema_shortname}.json", "rb") as f:
+        subpath_schema_obj = storage_codec.loads(f.read())
     input_subpath_schema_obj = copy.deepcopy(subpath_schema_obj)
 
     output_subpath = Path(f"{output_path}/{OUTPUT_FOLDER_NAME}/{space}/{subpath}")
@@ -213,10 +224,10 @@ async def extract(
             if payload_ts <= entries_since and meta_ts <= entries_since:
                 continue
             
-        async with aopen(os.path.join(path, file_name), "r") as f:
+        async with aopen(os.path.join(path, file_name), "rb") as f:
             content = await f.read()
         try:
-            payload = json.loads(content)
+            payload = storage_codec.loads(content)
             jsonschema.validate(
                 instance=payload, schema=input_subpath_schema_obj
             )
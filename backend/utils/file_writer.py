@@ -0,0 +1,276 @@
+""" Atomic and group-committed file writes
+
+Every write lands in a temp file next to its target and is renamed over it, so
+readers never see a partially written meta or payload file. When
+settings.fsync_writes is on, the fsyncs of all the writes issued within
+settings.group_commit_window_ms are batched into a single flush: the temp files
+(and appended files) are synced, renamed into place, then their folders are synced
+once, and only then the writers are released.
+"""
+
+import asyncio
+import hashlib
+import os
+import tempfile
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from fastapi.logger import logger
+
+from utils import io_executor
+from utils.settings import settings
+
+# mkstemp creates files readable by the owner only, keep the mode open() would give
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def _write_temp(file_path: Path | str, content: str | bytes, fsync: bool = False) -> str:
+    """Write content to a temp file in the target's folder and return its path"""
+    directory, filename = os.path.split(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{filename}.", suffix=".tmp")
+    try:
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(content.encode() if isinstance(content, str) else content)
+            if fsync:
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def _append(file_path: Path | str, content: str | bytes, fsync: bool = False):
+    with open(file_path, "ab") as opened_file:
+        opened_file.write(content.encode() if isinstance(content, str) else content)
+        if fsync:
+            opened_file.flush()
+            os.fsync(opened_file.fileno())
+
+
+def _fsync_path(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(file_path: Path | str, content: str | bytes, fsync: bool = False):
+    """Replace file_path with content in one step, optionally durable"""
+    tmp_path = _write_temp(file_path, content, fsync)
+    try:
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    if fsync:
+        _fsync_path(os.path.dirname(file_path) or ".")
+
+
+def append(file_path: Path | str, content: str | bytes, fsync: bool = False):
+    _append(file_path, content, fsync)
+
+
+class GroupCommitWriter:
+    """Batches the fsyncs of concurrent writes into one flush per window"""
+
+    def __init__(self) -> None:
+        # (synced path, rename target or None for appends, waiter)
+        self._pending: list[tuple[str, str | None, asyncio.Future]] = []
+        self._flush_task: asyncio.Task | None = None
+        self._flush_lock: asyncio.Lock | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pending = []
+            self._flush_task = None
+            self._flush_lock = asyncio.Lock()
+        return loop
+
+    async def write(self, file_path: Path | str, content: str | bytes):
+        tmp_path = await io_executor.run(_write_temp, file_path, content)
+        await self._commit(tmp_path, str(file_path))
+
+    async def append(self, file_path: Path | str, content: str | bytes):
+        await io_executor.run(_append, file_path, content)
+        await self._commit(str(file_path), None)
+
+    async def sync(self, file_path: Path | str):
+        """Durably flush a file already written in place"""
+        await self._commit(str(file_path), None)
+
+    async def rename(self, tmp_path: Path | str, file_path: Path | str):
+        """Durably move an already written temp file over file_path"""
+        await self._commit(str(tmp_path), str(file_path))
+
+    async def _commit(self, synced_path: str, target_path: str | None):
+        loop = self._bind_loop()
+        waiter = loop.create_future()
+        self._pending.append((synced_path, target_path, waiter))
+        if self._flush_task is None:
+            self._flush_task = loop.create_task(self._flush_after_window())
+        await waiter
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(settings.group_commit_window_ms / 1000)
+        batch, self._pending = self._pending, []
+        # Writes arriving from now on go to the next window
+        self._flush_task = None
+        assert self._flush_lock
+        errors: list[Exception | None] | None = None
+        try:
+            async with self._flush_lock:
+                errors = await io_executor.run(
+                    self._flush, [(synced, target) for synced, target, _ in batch]
+                )
+        except Exception as e:  # noqa: BLE001 - handed to every writer of the window
+            errors = [e for _ in batch]
+        finally:
+            # Never leave a writer waiting, even if this task is cancelled
+            for (_, _, waiter), error in zip(batch, errors or [None] * len(batch)):
+                if waiter.done():
+                    continue
+                if errors is None:
+                    waiter.cancel()
+                elif error:
+                    waiter.set_exception(error)
+                else:
+                    waiter.set_result(None)
+
+    @staticmethod
+    def _flush(batch: list[tuple[str, str | None]]) -> list[Exception | None]:
+        errors: list[Exception | None] = [None] * len(batch)
+        synced: set[str] = set()
+        for index, (synced_path, target_path) in enumerate(batch):
+            if synced_path in synced:
+                continue
+            try:
+                _fsync_path(synced_path)
+                synced.add(synced_path)
+            except OSError as e:
+                errors[index] = e
+                if target_path and os.path.exists(synced_path):
+                    os.remove(synced_path)
+
+        directories: set[str] = set()
+        for index, (synced_path, target_path) in enumerate(batch):
+            if errors[index]:
+                continue
+            try:
+                if target_path:
+                    os.replace(synced_path, target_path)
+                directories.add(os.path.dirname(target_path or synced_path) or ".")
+            except OSError as e:
+                errors[index] = e
+
+        for directory in directories:
+            try:
+                _fsync_path(directory)
+            except OSError as e:
+                # The data itself is synced, a missing folder entry sync
+                # only matters for newly created files
+                logger.warning(f"Failed to sync the folder {directory}: {e}")
+        return errors
+
+
+group_commit = GroupCommitWriter()
+
+
+async def write_file(file_path: Path | str, content: str | bytes):
+    """Atomically replace file_path, durable once returned if settings.fsync_writes is on"""
+    if settings.fsync_writes:
+        await group_commit.write(file_path, content)
+    else:
+        await io_executor.run(atomic_write, file_path, content)
+
+
+async def append_file(file_path: Path | str, content: str | bytes):
+    """Append to file_path, durable once returned if settings.fsync_writes is on"""
+    if settings.fsync_writes:
+        await group_commit.append(file_path, content)
+    else:
+        await io_executor.run(append, file_path, content)
+
+
+def _open_temp(file_path: Path | str) -> tuple[BinaryIO, str]:
+    directory, filename = os.path.split(file_path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{filename}.", suffix=".tmp")
+    os.fchmod(fd, 0o666 & ~_UMASK)
+    return os.fdopen(fd, "wb"), tmp_path
+
+
+def _write_chunk(tmp_file: BinaryIO, sha1: Any, chunk: bytes):
+    sha1.update(chunk)
+    tmp_file.write(chunk)
+
+
+async def stream_to_temp(file_path: Path | str, source, chunk_size: int) -> tuple[str, str]:
+    """Copy the async readable source (e.g. an UploadFile) to a temp file next to file_path
+
+    Only chunk_size bytes are held in memory at a time. Returns the temp file path
+    and the sha1 of the content, to be moved into place with commit_temp or
+    dropped with discard_temp.
+    """
+    tmp_file, tmp_path = await io_executor.run(_open_temp, file_path)
+    sha1 = hashlib.sha1()
+    try:
+        with tmp_file:
+            while chunk := await source.read(chunk_size):
+                await io_executor.run(_write_chunk, tmp_file, sha1, chunk)
+    except BaseException:
+        await io_executor.run(discard_temp, tmp_path)
+        raise
+    return tmp_path, sha1.hexdigest()
+
+
+async def commit_temp(tmp_path: Path | str, file_path: Path | str):
+    """Atomically move a stream_to_temp file over file_path"""
+    if settings.fsync_writes:
+        await group_commit.rename(tmp_path, file_path)
+    else:
+        await io_executor.run(os.replace, tmp_path, file_path)
+
+
+def discard_temp(tmp_path: Path | str):
+    try:
+        os.remove(tmp_path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_item(item: tuple[Path | str, str | bytes]):
+    atomic_write(item[0], item[1])
+
+
+async def write_files(files: Sequence[tuple[Path | str, str | bytes]]) -> list[BaseException | None]:
+    """Atomically write many files in parallel, returns the error of each file (None on success)"""
+    if not files:
+        return []
+
+    if settings.fsync_writes:
+        results = await asyncio.gather(
+            *(group_commit.write(file_path, content) for file_path, content in files),
+            return_exceptions=True,
+        )
+        return [result if isinstance(result, BaseException) else None for result in results]
+
+    # One batch per I/O worker
+    chunk_size = -(-len(files) // max(settings.io_workers, 1))
+    chunks_results = await asyncio.gather(
+        *(
+            io_executor.run_batch(_write_item, files[start:start + chunk_size])
+            for start in range(0, len(files), chunk_size)
+        )
+    )
+    return [
+        result if isinstance(result, BaseException) else None
+        for chunk_results in chunks_results
+        for result in chunk_results
+    ]
@@ -1,9 +1,10 @@
 from copy import deepcopy
 import csv
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
 from re import sub as re_sub
-import aiofiles
+from utils import io_executor
 from jsonschema.validators import _RefResolver as RefResolver  # type: ignore
 
 # TBD from referencing import Registry, Resource
@@ -163,12 +164,11 @@ def snake_case(camel_str):
 
 def divide_chunks(lll, n):
     """
-    Yield successive n-sized chunks from lll.
+    Yield successive n-sized chunks (lists) from lll, any iterable read lazily.
     """
-
-    # looping till length l
-    for i in range(0, len(lll), n):
-        yield lll[i : i + n]
+    iterator = iter(lll)
+    while chunk := list(islice(iterator, n)):
+        yield chunk
 
 
 def remove_none(target: dict | list):
@@ -307,17 +307,19 @@ def pp(*args, **kwargs):
     print(print_str)
 
 
+def _read_csv_lines(csv_file_path: Path) -> list[str]:
+    with open(csv_file_path, mode="r", encoding="utf-8", newline="") as csvf:
+        return csvf.readlines()
+
+
 async def csv_file_to_json(csv_file_path: Path) -> list[dict[str, Any]]:
     data: list[dict[str, Any]] = []
 
-    async with aiofiles.open(
-        csv_file_path, mode="r", encoding="utf-8", newline=""
-    ) as csvf:
-        contents = await csvf.readlines()
-        csvReader = csv.DictReader(contents)
+    contents = await io_executor.run(_read_csv_lines, csv_file_path)
+    csvReader = csv.DictReader(contents)
 
-        for row in csvReader:
-            data.append(row)
+    for row in csvReader:
+        data.append(row)
 
     return data
 
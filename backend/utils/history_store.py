@@ -0,0 +1,175 @@
+""" Append-only history logs with a line offset index
+
+Each history.jsonl gets a sidecar history.jsonl.idx holding the byte offset at
+which each of its lines starts, as little endian uint64. store_entry_diff keeps
+it up to date while appending, so the line count is the index size and any
+page of lines is read with a couple of seeks. The events log segments are
+indexed the same way.
+
+A missing or stale index (e.g. a log written before the index existed, or
+restored from a compressed archive) is rebuilt from the log on first use.
+"""
+
+import asyncio
+import fcntl
+import os
+import struct
+from itertools import pairwise
+from pathlib import Path
+
+from utils.file_writer import atomic_write, group_commit
+from utils.settings import settings
+
+OFFSET_SIZE = 8
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def index_path(history_file: Path) -> Path:
+    return history_file.with_name(f"{history_file.name}.idx")
+
+
+def _pack(offsets: list[int]) -> bytes:
+    return struct.pack(f"<{len(offsets)}Q", *offsets)
+
+
+def _unpack(raw: bytes) -> list[int]:
+    return list(struct.unpack(f"<{len(raw) // OFFSET_SIZE}Q", raw))
+
+
+def _scan_offsets(history_file: Path) -> list[int]:
+    offsets: list[int] = []
+    position = 0
+    line_start = True
+    with open(history_file, "rb") as opened_file:
+        while chunk := opened_file.read(READ_CHUNK_SIZE):
+            start = 0
+            while True:
+                if line_start and start < len(chunk):
+                    offsets.append(position + start)
+                    line_start = False
+                newline = chunk.find(b"\n", start)
+                if newline == -1:
+                    break
+                start = newline + 1
+                line_start = True
+            position += len(chunk)
+    return offsets
+
+
+def _index_is_valid(history_file: Path, index_file: Path, size: int) -> bool:
+    """Whether the index covers every line of the log, checking its last entry only"""
+    try:
+        index_size = os.path.getsize(index_file)
+    except FileNotFoundError:
+        return False
+    if index_size % OFFSET_SIZE:
+        return False
+    if not index_size:
+        return size == 0
+
+    with open(index_file, "rb") as opened_index:
+        opened_index.seek(index_size - OFFSET_SIZE)
+        last_offset = _unpack(opened_index.read(OFFSET_SIZE))[0]
+    if last_offset >= size:
+        return False
+    with open(history_file, "rb") as opened_file:
+        opened_file.seek(max(last_offset - 1, 0))
+        tail = opened_file.read(size - max(last_offset - 1, 0))
+    if last_offset:
+        if tail[:1] != b"\n":
+            return False
+        tail = tail[1:]
+    # The last indexed line must be the last line of the log
+    return tail.find(b"\n") in (-1, len(tail) - 1)
+
+
+def _ensure_index(history_file: Path, size: int) -> Path:
+    index_file = index_path(history_file)
+    if not _index_is_valid(history_file, index_file, size):
+        atomic_write(index_file, _pack(_scan_offsets(history_file)))
+    return index_file
+
+
+def append(history_file: Path, lines: str | bytes):
+    """Append lines (each ending with a new line) to the log and index them"""
+    content = lines.encode() if isinstance(lines, str) else lines
+    line_starts = [0]
+    while (newline := content.find(b"\n", line_starts[-1])) not in (-1, len(content) - 1):
+        line_starts.append(newline + 1)
+
+    with open(history_file, "ab+") as opened_file:
+        # Serializes the appends of concurrent workers, the index must follow the log order
+        fcntl.flock(opened_file.fileno(), fcntl.LOCK_EX)
+        try:
+            size = os.fstat(opened_file.fileno()).st_size
+            index_file = _ensure_index(history_file, size)
+            if size and os.pread(opened_file.fileno(), 1, size - 1) != b"\n":
+                # The last line was cut short (e.g. by a crash), end it so the first
+                # appended line doesn't get joined to it
+                opened_file.write(b"\n")
+                size += 1
+            opened_file.write(content)
+            opened_file.flush()
+            with open(index_file, "ab") as opened_index:
+                opened_index.write(_pack([size + start for start in line_starts]))
+        finally:
+            fcntl.flock(opened_file.fileno(), fcntl.LOCK_UN)
+
+
+async def sync(history_file: Path):
+    """Make the appends to the log and its index durable, if settings.fsync_writes is on"""
+    if settings.fsync_writes:
+        await asyncio.gather(
+            group_commit.sync(history_file), group_commit.sync(index_path(history_file))
+        )
+
+
+def line_count(history_file: Path) -> int:
+    with open(history_file, "rb") as opened_file:
+        fcntl.flock(opened_file.fileno(), fcntl.LOCK_SH)
+        try:
+            index_file = _ensure_index(history_file, os.fstat(opened_file.fileno()).st_size)
+            return os.path.getsize(index_file) // OFFSET_SIZE
+        finally:
+            fcntl.flock(opened_file.fileno(), fcntl.LOCK_UN)
+
+
+def read_lines(history_file: Path, start: int, end: int) -> list[bytes]:
+    """The lines [start, end) of the log, oldest first"""
+    if start >= end:
+        return []
+    with open(history_file, "rb") as opened_file:
+        fcntl.flock(opened_file.fileno(), fcntl.LOCK_SH)
+        try:
+            size = os.fstat(opened_file.fileno()).st_size
+            index_file = _ensure_index(history_file, size)
+            end = min(end, os.path.getsize(index_file) // OFFSET_SIZE)
+            if start >= end:
+                return []
+            with open(index_file, "rb") as opened_index:
+                opened_index.seek(start * OFFSET_SIZE)
+                offsets = _unpack(opened_index.read((end - start + 1) * OFFSET_SIZE))
+            if len(offsets) == end - start:
+                offsets.append(size)
+
+            opened_file.seek(offsets[0])
+            content = opened_file.read(offsets[-1] - offsets[0])
+        finally:
+            fcntl.flock(opened_file.fileno(), fcntl.LOCK_UN)
+
+    return [
+        content[line_start - offsets[0]: line_end - offsets[0]].rstrip(b"\n")
+        for line_start, line_end in pairwise(offsets)
+    ]
+
+
+def read_page(history_file: Path, offset: int, limit: int) -> tuple[int, list[bytes]]:
+    """The lines count of the log and its lines [offset, offset + limit), newest first
+
+    Like `tail -n +offset`, offsets 0 and 1 both start from the first line.
+    """
+    total = line_count(history_file)
+    start = max(offset, 1) - 1
+    lines = read_lines(history_file, start, min(start + max(limit, 0), total))
+    lines.reverse()
+    return total, [line for line in lines if line]
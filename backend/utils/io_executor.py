@@ -0,0 +1,166 @@
+""" Dedicated executor for blocking file I/O
+
+File reads and writes run on their own thread pool (settings.io_workers threads)
+instead of the loop's default executor, which the middleware and starlette use to
+stream request and response bodies. run_batch runs many small operations (e.g.
+reading every meta file of a listing) as a single task so a query costs one thread
+hop instead of one per file.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, TypeVar
+
+from utils.settings import settings
+
+T = TypeVar("T")
+
+_executor: ThreadPoolExecutor | None = None
+
+
+class _Stats:
+    def __init__(self) -> None:
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self.batched_items = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+        self.max_wait_ms = 0.0
+        self.max_run_ms = 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        completed = self.completed or 1
+        return {
+            "workers": settings.io_workers,
+            "queue_depth": self.submitted - self.completed - self.running,
+            "running": self.running,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "batched_items": self.batched_items,
+            "avg_wait_ms": round(self.total_wait_ms / completed, 3),
+            "max_wait_ms": round(self.max_wait_ms, 3),
+            "avg_run_ms": round(self.total_run_ms / completed, 3),
+            "max_run_ms": round(self.max_run_ms, 3),
+        }
+
+
+_stats = _Stats()
+_stats_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.io_workers, thread_name_prefix="dmart-io"
+        )
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+def _forget_after_fork():
+    """A forked child (e.g. a reindexing process) has none of the executor threads,
+    it starts its own executor on first use"""
+    global _executor, _stats_lock
+    _executor = None
+    _stats_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget_after_fork)
+
+
+def _timed(func: Callable[[], T], submitted_at: float) -> T:
+    started_at = time.perf_counter()
+    wait_ms = (started_at - submitted_at) * 1000
+    with _stats_lock:
+        _stats.running += 1
+    failed = False
+    try:
+        return func()
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        run_ms = (time.perf_counter() - started_at) * 1000
+        with _stats_lock:
+            _stats.running -= 1
+            _stats.completed += 1
+            _stats.failed += failed
+            _stats.total_wait_ms += wait_ms
+            _stats.total_run_ms += run_ms
+            _stats.max_wait_ms = max(_stats.max_wait_ms, wait_ms)
+            _stats.max_run_ms = max(_stats.max_run_ms, run_ms)
+
+
+async def run(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking call on the I/O executor"""
+    loop = asyncio.get_running_loop()
+    with _stats_lock:
+        _stats.submitted += 1
+    return await loop.run_in_executor(
+        get_executor(), _timed, partial(func, *args, **kwargs), time.perf_counter()
+    )
+
+
+def _map(func: Callable[[Any], T], items: list) -> list[T | BaseException]:
+    results: list[T | BaseException] = []
+    for item in items:
+        try:
+            results.append(func(item))
+        except Exception as e:  # noqa: BLE001 - handed to the caller, as gather(return_exceptions=True) does
+            results.append(e)
+    return results
+
+
+async def run_batch(func: Callable[[Any], T], items: Iterable) -> list[T | BaseException]:
+    """Apply func to every item within a single executor task
+
+    A failing item doesn't fail the batch, its exception is returned in its place
+    """
+    items = list(items)
+    if not items:
+        return []
+    with _stats_lock:
+        _stats.batched_items += len(items)
+    return await run(_map, func, items)
+
+
+def _read_text(path) -> str:
+    with open(path, "r") as opened_file:
+        return opened_file.read()
+
+
+def _read_bytes(path) -> bytes:
+    with open(path, "rb") as opened_file:
+        return opened_file.read()
+
+
+async def read_text(path) -> str:
+    return await run(_read_text, path)
+
+
+async def read_bytes(path) -> bytes:
+    return await run(_read_bytes, path)
+
+
+async def read_texts(paths: Iterable) -> list[str | BaseException]:
+    return await run_batch(_read_text, paths)
+
+
+def stats() -> dict[str, Any]:
+    with _stats_lock:
+        return _stats.as_dict()
@@ -3,7 +3,7 @@ from inspect import iscoroutine
 import os
 from pathlib import Path
 
-import aiofiles
+from utils import io_executor
 from fastapi import Depends, FastAPI
 from models.core import (
     ActionType,
@@ -72,10 +72,9 @@ class PluginManager:
                 continue
 
             # Load plugin config file
-            async with aiofiles.open(config_file_path, "r") as config_file:
-                plugin_wrapper: PluginWrapper = PluginWrapper.model_validate_json(
-                    await config_file.read()
-                )
+            plugin_wrapper: PluginWrapper = PluginWrapper.model_validate_json(
+                await io_executor.read_text(config_file_path)
+            )
             plugin_wrapper.shortname = plugin_path.name
             if not plugin_wrapper.is_active:
                 continue
@@ -152,61 +151,57 @@ class PluginManager:
         return True
 
     async def before_action(self, event: Event):
-        spaces = await get_spaces()
-        if (
-            event.space_name not in spaces
-            or event.action_type not in self.plugins_wrappers
-        ):
-            return
+        await self.notify([event], EventListenTime.before)
 
-        space_plugins = Space.model_validate_json(spaces[event.space_name]).active_plugins
+    async def after_action(self, event: Event):
+        await self.notify([event], EventListenTime.after)
 
-        loop = asyncio.get_event_loop()
-        for plugin_model in self.plugins_wrappers[event.action_type]:
-            if (
-                plugin_model.shortname in space_plugins
-                and plugin_model.listen_time == EventListenTime.before
-                and plugin_model.filters
-                and self.matched_filters(plugin_model.filters, event)
-            ):
-                try:
-                    object = plugin_model.object
-                    if isinstance(object, PluginBase):
-                        plugin_execution = object.hook(event)
-                        if iscoroutine(plugin_execution) and self.is_pytest:
-                            await plugin_execution
-                        elif iscoroutine(plugin_execution):
-                            loop.create_task(plugin_execution)
-                except Exception as e:
-                    logger.error(f"Plugin:{plugin_model}:{str(e)}")
+    async def before_actions(self, events: list[Event]):
+        """Notify the plugins of the events of a batch, all of the same space and action"""
+        await self.notify(events, EventListenTime.before)
 
-    async def after_action(self, event: Event):
+    async def after_actions(self, events: list[Event]):
+        """Notify the plugins of the events of a batch, all of the same space and action"""
+        await self.notify(events, EventListenTime.after)
+
+    async def notify(self, events: list[Event], listen_time: EventListenTime):
+        if not events:
+            return
         spaces = await get_spaces()
+        space_name, action_type = events[0].space_name, events[0].action_type
         if (
-            event.space_name not in spaces
-            or event.action_type not in self.plugins_wrappers
+            space_name not in spaces
+            or action_type not in self.plugins_wrappers
         ):
             return
 
-        space_plugins = Space.model_validate_json(spaces[event.space_name]).active_plugins
+        space_plugins = Space.model_validate_json(spaces[space_name]).active_plugins
         loop = asyncio.get_event_loop()
-        for plugin_model in self.plugins_wrappers[event.action_type]:
+        for plugin_model in self.plugins_wrappers[action_type]:
             if (
-                plugin_model.shortname in space_plugins
-                and plugin_model.listen_time == EventListenTime.after
-                and plugin_model.filters
-                and self.matched_filters(plugin_model.filters, event)
+                plugin_model.shortname not in space_plugins
+                or plugin_model.listen_time != listen_time
+                or not plugin_model.filters
             ):
-                try:
-                    object = plugin_model.object
-                    if isinstance(object, PluginBase):
-                        plugin_execution = object.hook(event)
-                        if iscoroutine(plugin_execution) and self.is_pytest:
-                            await plugin_execution
-                        elif iscoroutine(plugin_execution):
-                            loop.create_task(plugin_execution)
-                except Exception as e:
-                    logger.error(f"Plugin:{plugin_model}:{str(e)}")
+                continue
+            plugin_filters = plugin_model.filters
+            matched = [event for event in events if self.matched_filters(plugin_filters, event)]
+            if not matched:
+                continue
+            try:
+                object = plugin_model.object
+                if isinstance(object, PluginBase):
+                    plugin_execution = (
+                        object.hook(matched[0])
+                        if len(matched) == 1
+                        else object.hook_many(matched)
+                    )
+                    if iscoroutine(plugin_execution) and self.is_pytest:
+                        await plugin_execution
+                    elif iscoroutine(plugin_execution):
+                        loop.create_task(plugin_execution)
+            except Exception as e:
+                logger.error(f"Plugin:{plugin_model}:{str(e)}")
 
 
 plugin_manager = PluginManager()
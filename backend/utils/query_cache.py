@@ -0,0 +1,162 @@
+""" Cache of query results, invalidated by write generations
+
+Each worker keeps the pages served for repeated queries in memory, keyed by the
+normalized query along with the user and a hash of their query policies, for
+settings.query_cache_ttl seconds at most.
+
+Writes bump generation counters kept in Redis, so that they're shared by all the
+workers:
+- the space generation, bumped by any write to the space (branch)
+- the subpath generation, bumped by the writes to the entries of the subpath,
+  and of its direct sub folders and entries' attachments
+- the tree generation, bumped when a folder is moved or deleted along with its content
+- the access generation, bumped by the writes to the users, roles, permissions and
+  groups of the management space, as they change what any user is allowed to see
+
+Subpath listings are stale once the generation of their subpath or the tree
+generation moved on, every other query once the space generation did, and all of
+them once the access generation did. The generations are read before running a
+query and cached along with its result, so a write during the query leaves it
+stale right away.
+"""
+
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+from fastapi.logger import logger
+from redis.exceptions import RedisError
+
+from models import api
+from utils.redis_services import RedisServices
+from utils.settings import settings
+
+GENERATION_PREFIX = "query_generation"
+ACCESS_GENERATION_KEY = f"{GENERATION_PREFIX}:access"
+# The management subpaths whose entries grant or restrict access
+ACCESS_SUBPATHS = {"users", "roles", "permissions", "groups"}
+# The results of these are cheap to get, or meant to differ on each call
+UNCACHED_TYPES = {api.QueryType.spaces, api.QueryType.random}
+
+# key: (expires at, generations, (total, records, next cursor))
+_cache: OrderedDict[str, tuple[float, list[int], tuple[int, list, str | None]]] = OrderedDict()
+
+
+def _subpath(subpath: str) -> str:
+    return subpath.strip("/")
+
+
+def _parent(subpath: str) -> str:
+    return subpath.rpartition("/")[0]
+
+
+def _space_key(space_name: str, branch_name: str | None) -> str:
+    return f"{GENERATION_PREFIX}:{space_name}:{branch_name or settings.default_branch}"
+
+
+def _generation_keys(query: api.Query) -> list[str]:
+    space_key = _space_key(query.space_name, query.branch_name)
+    if query.type == api.QueryType.subpath:
+        return [ACCESS_GENERATION_KEY, f"{space_key}:tree", f"{space_key}:/{_subpath(query.subpath)}"]
+    return [ACCESS_GENERATION_KEY, space_key]
+
+
+def _changes_access(space_name: str, subpath: str | None) -> bool:
+    return (
+        space_name == settings.management_space
+        and subpath is not None
+        and _subpath(subpath).partition("/")[0] in ACCESS_SUBPATHS
+    )
+
+
+def is_cacheable(query: api.Query) -> bool:
+    return settings.query_cache_size > 0 and query.type not in UNCACHED_TYPES
+
+
+def cache_key(query: api.Query, user_shortname: str, redis_query_policies: list) -> str:
+    content = json.dumps(
+        [query.model_dump(mode="json"), user_shortname, sorted(map(str, redis_query_policies))],
+        sort_keys=True,
+    )
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+async def _generations(keys: list[str]) -> list[int] | None:
+    try:
+        async with RedisServices() as redis_services:
+            values = await redis_services.mget(keys)
+    except RedisError as e:
+        logger.warning(f"Error at query_cache._generations: {e}")
+        return None
+    return [int(value or 0) for value in values]
+
+
+async def get(
+    query: api.Query, key: str
+) -> tuple[tuple[int, list, str | None] | None, list[int] | None]:
+    """The cached result of the query if still fresh, along with the current
+    generations to cache a new result with (None if they can't be read)"""
+    generations = await _generations(_generation_keys(query))
+    cached = _cache.get(key)
+    if not cached or generations is None:
+        return None, generations
+
+    expires_at, cached_generations, result = cached
+    if expires_at < time.monotonic() or cached_generations != generations:
+        _cache.pop(key, None)
+        return None, generations
+
+    _cache.move_to_end(key)
+    total, records, next_cursor = result
+    return (total, copy.deepcopy(records), next_cursor), generations
+
+
+def put(key: str, generations: list[int] | None, result: tuple[int, list, str | None]):
+    total, records, next_cursor = result
+    if generations is None or len(records) > settings.query_cache_max_records:
+        return
+
+    _cache[key] = (
+        time.monotonic() + settings.query_cache_ttl,
+        generations,
+        (total, copy.deepcopy(records), next_cursor),
+    )
+    _cache.move_to_end(key)
+    while len(_cache) > settings.query_cache_size:
+        _cache.popitem(last=False)
+
+
+async def bump(
+    space_name: str,
+    branch_name: str | None,
+    subpath: str | None = None,
+    shortname: str | None = None,
+    tree: bool = False,
+):
+    """Leave the cached results of the space stale, and the subpath listings affected
+    by a write to subpath (and to the content of its entry shortname, if given).
+    A write to the users, roles, permissions or groups leaves every cached result stale"""
+    if settings.query_cache_size <= 0:
+        return
+
+    space_key = _space_key(space_name, branch_name)
+    keys = [space_key]
+    if subpath is not None:
+        subpath = _subpath(subpath)
+        keys.extend({f"{space_key}:/{subpath}", f"{space_key}:/{_parent(subpath)}"})
+        if shortname:
+            keys.append(f"{space_key}:/{_subpath(f'{subpath}/{shortname}')}")
+    if tree:
+        keys.append(f"{space_key}:tree")
+    if _changes_access(space_name, subpath):
+        keys.append(ACCESS_GENERATION_KEY)
+
+    try:
+        async with RedisServices() as redis_services, redis_services.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.incr(key)
+            await pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Error at query_cache.bump: {e}")
@@ -0,0 +1,57 @@
+""" Opaque continuation tokens of paginated queries
+
+A query page that has more results after it hands back a cursor, to send as
+Query.cursor to get the next page instead of an offset. The cursor holds the
+position the query reached (e.g. the rows consumed from each index) along with a
+fingerprint of the query it belongs to, so it can't be replayed on another one.
+"""
+
+import base64
+import hashlib
+import json
+from typing import Any
+
+from fastapi import status
+
+from models import api
+from utils.internal_error_code import InternalErrorCode
+
+# Paging fields, a cursor stays valid while only these change
+PAGING_FIELDS = {"offset", "limit", "cursor"}
+
+
+def fingerprint(query: api.Query) -> str:
+    return hashlib.sha1(
+        query.model_dump_json(exclude=PAGING_FIELDS).encode()
+    ).hexdigest()[:16]
+
+
+def encode(query: api.Query, position: dict[str, Any]) -> str:
+    content = json.dumps(
+        {"query": fingerprint(query), **position}, separators=(",", ":"), default=str
+    )
+    return base64.urlsafe_b64encode(content.encode()).decode().rstrip("=")
+
+
+def decode(query: api.Query) -> dict[str, Any] | None:
+    """The position held by query.cursor, None if the query has no cursor"""
+    if not query.cursor:
+        return None
+    position: dict[str, Any] = {}
+    try:
+        position = json.loads(
+            base64.urlsafe_b64decode(query.cursor + "=" * (-len(query.cursor) % 4))
+        )
+        valid = isinstance(position, dict) and position.pop("query", None) == fingerprint(query)
+    except ValueError:
+        valid = False
+    if not valid:
+        raise api.Exception(
+            status.HTTP_400_BAD_REQUEST,
+            api.Error(
+                type="query",
+                code=InternalErrorCode.INVALID_DATA,
+                message="The cursor is invalid or belongs to another query",
+            ),
+        )
+    return position
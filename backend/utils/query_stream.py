@@ -0,0 +1,78 @@
+""" Streamed (NDJSON) query responses
+
+A query requested with `Accept: application/x-ndjson` is answered one JSON line
+per record, written as the records are served chunk by chunk, followed by a
+summary line holding the api.Response of the query without its records. So the
+memory used stays bounded by a chunk, whatever the size of the result.
+
+An error past the first chunk can't change the response status anymore, it's
+reported by a failed summary line instead.
+"""
+
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.logger import logger
+from redis.exceptions import RedisError
+from starlette.responses import StreamingResponse
+
+from models import api, core
+from utils.internal_error_code import InternalErrorCode
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# What serving a chunk past the first may fail with, other than an api.Exception
+_CHUNK_ERRORS: tuple[type[Exception], ...] = (RedisError, OSError, ValueError, KeyError, TypeError)
+
+
+def is_requested(accept: str | None) -> bool:
+    """Whether the Accept header of a query asks for a streamed response"""
+    return bool(accept) and NDJSON_MEDIA_TYPE in str(accept)
+
+
+def _record_line(record: core.Record | Any) -> str:
+    if isinstance(record, core.Record):
+        return record.model_dump_json(exclude_none=True) + "\n"
+    # Records reshaped by a jq filter
+    return json.dumps(jsonable_encoder(record)) + "\n"
+
+
+async def response(
+    chunks: AsyncIterator[tuple[int, list[core.Record], str | None]]
+) -> StreamingResponse:
+    """Stream the records of the query chunks, the first chunk is served before
+    responding so that its errors get their own status"""
+    first_chunk = await anext(chunks)
+
+    async def lines() -> AsyncIterator[str]:
+        total, records, next_cursor = first_chunk
+        returned = 0
+        summary: api.Response
+        try:
+            while True:
+                for record in records:
+                    yield _record_line(record)
+                returned += len(records)
+                try:
+                    total, records, next_cursor = await anext(chunks)
+                except StopAsyncIteration:
+                    break
+            summary = api.Response(
+                status=api.Status.success,
+                attributes={"total": total, "returned": returned, "next_cursor": next_cursor},
+            )
+        except api.Exception as e:
+            summary = api.Response(status=api.Status.failed, error=e.error)
+        except _CHUNK_ERRORS as e:
+            logger.error(f"Streamed query failed: {e}")
+            summary = api.Response(
+                status=api.Status.failed,
+                error=api.Error(
+                    type="query", code=InternalErrorCode.SOMETHING_WRONG, message=str(e)
+                ),
+            )
+        yield summary.model_dump_json(exclude_none=True) + "\n"
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -1,9 +1,12 @@
+import asyncio
+import hashlib
 import re
 import json
 import sys
 from typing import Any, Awaitable
 from redis.asyncio import Redis
 from redis.asyncio.connection import BlockingConnectionPool
+from redis.exceptions import RedisError
 from models.api import RedisReducer, SortType
 import models.core as core
 from models.enums import ActionType, RedisReducerName, ResourceType, LockAction
@@ -19,10 +22,14 @@ from redis.commands.search.query import Query
 from utils.helpers import branch_path, camel_case, resolve_schema_references
 from utils.internal_error_code import InternalErrorCode
 from utils.settings import settings
+from utils import storage_codec
 import models.api as api
 from fastapi import status
 from fastapi.logger import logger
 
+# Keys of the saved definitions of the indices
+INDEX_DEFINITION_PREFIX = "index_definition"
+
 
 class RedisServices(Redis):
 
@@ -226,6 +233,9 @@ class RedisServices(Redis):
         "view_acl",
     ]
     redis_indices: dict[str, dict[str, Search]] = {}
+    # Names of the existing indices (and of the aliases found), listed once then kept up to date
+    # by create_index and drop_index
+    known_indices: set[str] | None = None
     is_pytest = False
     
     def __new__(cls):
@@ -253,31 +263,130 @@ class RedisServices(Redis):
         space_branch_name: str,
         schema_name: str,
         redis_schema: tuple,
-        del_docs: bool = True,
     ):
         """
-        create redis schema index, drop it if exist first
+        create redis schema index, or update it if its definition changed
+
+        The index is an alias of its current version ({name}:v{n}). A new version is
+        built next to it, over the same docs, and swapped in once it indexed them all,
+        so the searches keep being served by the previous version in the meantime.
+        The definition of the version is saved along with it: an unchanged index is
+        kept as is, and one that only gets new fields is altered in place
         """
-        try:
-            await self.redis_indices[space_branch_name][schema_name].dropindex(
-                delete_documents=del_docs
-            )
-        except Exception as _:
-            pass
-            # logger.error(f"Error at redis_services.create_index: {e}")
+        name = f"{space_branch_name}:{schema_name}"
+        definition = self.index_definition(space_branch_name, schema_name, redis_schema)
+        current = await self.index_version(name)
+        saved_definition = await self.get_index_definition(name)
+        if current and saved_definition and saved_definition["version"] == current:
+            added_fields = self.added_index_fields(saved_definition, definition)
+            if added_fields is not None:
+                if added_fields:
+                    x = self.ft(current).alter_schema_add(
+                        [redis_schema[i] for i in added_fields]
+                    )
+                    if x and isinstance(x, Awaitable):
+                        await x
+                    await self.wait_indexing(current)
+                await self.save_index_definition(name, current, definition)
+                return
+
+        version = f"{name}:v{self.version_number(name, current) + 1}"
+        # Leftover of an interrupted rebuild
+        await self.drop_index(version)
 
-        await self.redis_indices[space_branch_name][schema_name].create_index(
+        await self.ft(version).create_index(
             redis_schema,
             definition=IndexDefinition(
-                prefix=[
-                    f"{space_branch_name}:{schema_name}:",
-                    f"{space_branch_name}:{schema_name}/",
-                ],
+                prefix=definition["prefix"],
                 index_type=IndexType.JSON,
             ),
         )
+        self.add_known_index(version)
+        try:
+            await self.wait_indexing(version)
+        except TimeoutError:
+            # The searches keep being served by the current version
+            await self.drop_index(version)
+            raise
+        await self.swap_index_alias(name, version, current)
+        self.add_known_index(name)
+        await self.save_index_definition(name, version, definition)
         # print(f"Created new index named {space_name}:{schema_name}\n")
 
+    @staticmethod
+    def index_definition(space_branch_name: str, schema_name: str, redis_schema: tuple) -> dict:
+        prefix = [
+            f"{space_branch_name}:{schema_name}:",
+            f"{space_branch_name}:{schema_name}/",
+        ]
+        fields = [[str(arg) for arg in field.redis_args()] for field in redis_schema]
+        return {
+            "prefix": prefix,
+            "fields": fields,
+            "hash": hashlib.sha1(json.dumps([prefix, fields]).encode()).hexdigest(),
+        }
+
+    @staticmethod
+    def added_index_fields(saved_definition: dict, definition: dict) -> list[int] | None:
+        """The positions of the fields the definition adds to the saved one,
+        None if it changes or removes any of them"""
+        if saved_definition["hash"] == definition["hash"]:
+            return []
+        if saved_definition["prefix"] != definition["prefix"]:
+            return None
+        saved_fields = {tuple(field) for field in saved_definition["fields"]}
+        fields = [tuple(field) for field in definition["fields"]]
+        if not saved_fields.issubset(fields):
+            return None
+        return [i for i, field in enumerate(fields) if field not in saved_fields]
+
+    async def get_index_definition(self, name: str) -> dict | None:
+        value = await self.get_key(f"{INDEX_DEFINITION_PREFIX}:{name}")
+        return json.loads(value) if value else None
+
+    async def save_index_definition(self, name: str, version: str, definition: dict):
+        await self.set_key(
+            f"{INDEX_DEFINITION_PREFIX}:{name}", json.dumps({"version": version, **definition})
+        )
+
+    async def index_version(self, name: str) -> str | None:
+        """The index the name resolves to: the version its alias points to,
+        or the index itself if it predates the versioning. None if there's none"""
+        try:
+            info = await self.ft(name).info()
+        except Exception:
+            return None
+        return str(info["index_name"])
+
+    @staticmethod
+    def version_number(name: str, version: str | None) -> int:
+        match = re.fullmatch(rf"{re.escape(name)}:v(\d+)", version or "")
+        return int(match.group(1)) if match else 0
+
+    async def wait_indexing(self, name: str):
+        """Wait until the index has indexed all the docs existing at its creation,
+        raising TimeoutError if it takes longer than settings.index_build_timeout"""
+        async with asyncio.timeout(settings.index_build_timeout):
+            while True:
+                info = await self.ft(name).info()
+                if int(info.get("indexing", 0)) == 0 and float(info.get("percent_indexed", 1)) >= 1:
+                    return
+                await asyncio.sleep(0.1)
+
+    async def swap_index_alias(self, name: str, version: str, current: str | None):
+        """Point the alias name to version, then drop the previous version keeping the docs"""
+        if current is None:
+            await self.execute_command("FT.ALIASADD", name, version)
+        elif current == name:
+            # An index predating the versioning, replaced by the alias in one transaction
+            async with self.pipeline(transaction=True) as pipe:
+                pipe.execute_command("FT.DROPINDEX", name)
+                pipe.execute_command("FT.ALIASADD", name, version)
+                await pipe.execute()
+        else:
+            await self.execute_command("FT.ALIASUPDATE", name, version)
+            await self.drop_index(current)
+
     def get_redis_index_fields(self, key_chain, property, redis_schema_definition):
         """
         takes a key and a value of a schema definition, and returns the redis schema index
@@ -429,7 +538,6 @@ class RedisServices(Redis):
         for_space: str | None = None,
         for_schemas: list | None = None,
         for_custom_indices: bool = True,
-        del_docs: bool = True,
     ):
         """
         Loop over all spaces, and for each one we create: (only if indexing_enabled is true for the space)
@@ -452,7 +560,9 @@ class RedisServices(Redis):
                 )
 
                 await self.create_index(
-                    f"{space_name}:{branch_name}", "meta", self.META_SCHEMA, del_docs
+                    f"{space_name}:{branch_name}",
+                    "meta",
+                    self.META_SCHEMA,
                 )
 
                 # CREATE REDIS INDEX FOR EACH SCHEMA DEFINITION INSIDE THE SPACE
@@ -480,7 +590,7 @@ class RedisServices(Redis):
 
                     # GET SCHEMA PROPERTIES AND
                     # GENERATE REDIS INDEX DEFINITION BY MAPPIN SCHEMA PROPERTIES TO REDIS INDEX FIELDS
-                    schema_content = json.loads(schema_path.read_text())
+                    schema_content = storage_codec.loads(schema_path.read_bytes())
                     schema_content = resolve_schema_references(schema_content)
                     redis_schema_definition = list(self.META_SCHEMA)
                     if "properties" in schema_content:
@@ -518,7 +628,6 @@ class RedisServices(Redis):
                             f"{space_name}:{branch_name}",
                             schema_shortname,
                             tuple(redis_schema_definition),
-                            del_docs,
                         )
 
         if for_custom_indices:
@@ -734,11 +843,15 @@ class RedisServices(Redis):
         await self.save_doc(docid, payload)
 
     async def get_payload_doc(self, doc_id: str, resource_type: ResourceType):
+        payload_redis_doc = await self.get_doc_by_id(doc_id)
+        return self.payload_doc_content(payload_redis_doc, resource_type)
+
+    def payload_doc_content(self, payload_redis_doc: dict | None, resource_type: ResourceType) -> dict:
+        """The payload attributes of a payload doc, without the meta and system ones"""
         resource_class = getattr(
             sys.modules["models.core"],
             camel_case(resource_type),
         )
-        payload_redis_doc = await self.get_doc_by_id(doc_id)
         payload_doc_content: dict = {}
         if not payload_redis_doc:
             return payload_doc_content
@@ -875,14 +988,13 @@ class RedisServices(Redis):
         return_fields: list = [],
     ):
         # Tries to get the index from the provided space
-        try:
-            ft_index = self.ft(f"{space_name}:{branch_name}:{schema_name}")
-            await ft_index.info()
-        except Exception as e:
+        index_name = f"{space_name}:{branch_name}:{schema_name}"
+        if not await self.index_exists(index_name):
             logger.error(
-                f"Error accessing index: {space_name}:{branch_name}:{schema_name}, at redis_services.search: {e}"
+                f"Error accessing index: {index_name}, at redis_services.search: index not found"
             )
             return {"data": [], "total": 0}
+        ft_index = self.ft(index_name)
 
         search_query = Query(
             query_string=self.prepare_query_string(search, filters, exact_subpath)
@@ -918,7 +1030,11 @@ class RedisServices(Redis):
                 }
             else:
                 return {}
-        except Exception:
+        except Exception as e:
+            if self.is_missing_index_error(e):
+                # Dropped since it was listed
+                self.forget_index(index_name)
+                return {"data": [], "total": 0}
             return {}
 
     async def aggregate(
@@ -937,11 +1053,10 @@ class RedisServices(Redis):
         load: list = [],
     ) -> list:
         # Tries to get the index from the provided space
-        try:
-            ft_index = self.ft(f"{space_name}:{branch_name}:{schema_name}")
-            await ft_index.info()
-        except Exception:
+        index_name = f"{space_name}:{branch_name}:{schema_name}"
+        if not await self.index_exists(index_name):
             return []
+        ft_index = self.ft(index_name)
 
         aggr_request = aggregation.AggregateRequest(
             self.prepare_query_string(search, filters, exact_subpath)
@@ -974,8 +1089,9 @@ class RedisServices(Redis):
             aggr_res = await ft_index.aggregate(aggr_request)  # type: ignore
             if aggr_res.get("results") and isinstance(aggr_res["results"], list):
                 return aggr_res["results"]
-        except Exception:
-            pass
+        except Exception as e:
+            if self.is_missing_index_error(e):
+                self.forget_index(index_name)
         return []
 
     def prepare_query_string(
@@ -1055,6 +1171,21 @@ class RedisServices(Redis):
             logger.warning(f"Error at redis_services.get_docs_by_ids: {e}")
         return []
 
+    async def get_docs_map(self, docs_ids: list[str]) -> dict[str, dict]:
+        """The docs of docs_ids fetched with a single JSON.MGET, by id, leaving out the missing ones"""
+        unique_ids = list(dict.fromkeys(docs_ids))
+        if not unique_ids:
+            return {}
+        docs: dict[str, dict] = {}
+        for doc_id, value in zip(unique_ids, await self.get_docs_by_ids(unique_ids)):
+            if isinstance(value, list):
+                value = value[0] if value else None
+            if isinstance(value, str):
+                value = json.loads(value)
+            if isinstance(value, dict):
+                docs[doc_id] = value
+        return docs
+
     async def get_content_by_id(self, doc_id: str) -> Any:
         try:
             return await self.get(doc_id)
@@ -1075,6 +1206,24 @@ class RedisServices(Redis):
         except Exception as e:
             logger.warning(f"Error at redis_services.delete_doc: {e}")
 
+    async def delete_docs_under(
+        self, space_name: str, branch_name: str | None, subpath: str
+    ) -> int:
+        """Delete the docs of the entries under subpath, at any depth, found by their
+        ids ending with the subpath of their entry. Returns the count of docs deleted"""
+        deleted = 0
+        doc_ids: list[str] = []
+        async for doc_id in self.scan_iter(
+            match=f"{space_name}:{branch_name}:*:{subpath.strip('/')}/*", count=1000
+        ):
+            doc_ids.append(doc_id)
+            if len(doc_ids) >= settings.reindex_pipeline_size:
+                deleted += await self.delete(*doc_ids)
+                doc_ids = []
+        if doc_ids:
+            deleted += await self.delete(*doc_ids)
+        return deleted
+
     async def move_payload_doc(
         self,
         space_name,
@@ -1151,6 +1300,9 @@ class RedisServices(Redis):
         return await self.expire(key, ttl)
 
     async def drop_index(self, name: str, delete_docs: bool = False):
+        self.forget_index(name)
+        # Along with the alias of the version
+        self.forget_index(re.sub(r":v\d+$", "", name))
         try:
             ft_index = self.ft(name)
             await ft_index.dropindex(delete_docs)
@@ -1162,3 +1314,36 @@ class RedisServices(Redis):
         x = self.ft().execute_command("FT._LIST")
         if x and isinstance(x, Awaitable):
             return await x
+
+    async def load_known_indices(self):
+        RedisServices.known_indices = set(await self.list_indices() or [])
+
+    def add_known_index(self, name: str):
+        if RedisServices.known_indices is not None:
+            RedisServices.known_indices.add(name)
+
+    def forget_index(self, name: str):
+        if RedisServices.known_indices is not None:
+            RedisServices.known_indices.discard(name)
+
+    async def index_exists(self, name: str) -> bool:
+        """Whether the index exists, as known to this process. An index unknown to it
+        (e.g. created by another worker) is checked with FT.INFO"""
+        if RedisServices.known_indices is None:
+            try:
+                await self.load_known_indices()
+            except RedisError as e:
+                logger.warning(f"Error at redis_services.index_exists: {e}")
+        if RedisServices.known_indices is not None and name in RedisServices.known_indices:
+            return True
+        try:
+            await self.ft(name).info()
+        except RedisError:
+            return False
+        self.add_known_index(name)
+        return True
+
+    @staticmethod
+    def is_missing_index_error(error: Exception) -> bool:
+        message = str(error).lower()
+        return "no such index" in message or "unknown index" in message
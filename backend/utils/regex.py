@@ -26,8 +26,9 @@ INVITATION = (
     "\\.([a-zA-Z\u0621-\u064A0-9\u0660-\u0669_+/=-]*)$"
 )
 
+# Entries of sharded subpaths sit under two levels of fan-out folders, .dm/ab/cd/{shortname}
 FILE_PATTERN = re.compile(
-    "\\.dm/([a-zA-Z\u0621-\u064A0-9\u0660-\u0669_]*)/meta\\.([a-zA-Z\u0621-\u064A]*)\\.json$"
+    "\\.dm/(?:[0-9a-f]{2}/[0-9a-f]{2}/)?([a-zA-Z\u0621-\u064A0-9\u0660-\u0669_]*)/meta\\.([a-zA-Z\u0621-\u064A]*)\\.json$"
 )
 PAYLOAD_FILE_PATTERN = re.compile("([a-zA-Z\u0621-\u064A0-9\u0660-\u0669_]*)\\.json$")
 # HISTORY_PATTERN = re.compile("([0-9\u0660-\u0669]*)\\.json$")
@@ -0,0 +1,203 @@
+""" Manifest of the indexed entries, for incremental reindexing
+
+Each indexed subpath gets a redis hash mapping the meta file of each of its entries
+(relative to the spaces folder) to the fingerprint of the files the entry's docs
+were generated from: the meta file, its json payload file and the files of its
+attachments, with the (mtime, size) of each and a checksum of their content,
+along with the ids of the docs generated.
+
+An incremental reindex leaves alone the entries whose files have the same stats,
+only updates the fingerprint of the ones whose content has the same checksum,
+and regenerates the docs of the others, deleting the docs they no longer generate.
+The entries whose meta file is gone get their docs deleted.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from collections.abc import Awaitable
+from pathlib import Path
+from typing import Any
+
+from models import core
+from utils import db
+from utils.helpers import camel_case
+from utils.redis_services import RedisServices
+from utils.settings import settings
+
+PREFIX = "reindex_manifest"
+
+
+def manifest_key(space_name: str, branch_name: str | None, subpath: str) -> str:
+    return f"{PREFIX}:{space_name}:{branch_name or settings.default_branch}:/{subpath.strip('/')}"
+
+
+def _class_type(locator: core.Locator):
+    return getattr(sys.modules["models.core"], camel_case(locator.type))
+
+
+def _relative(path: Path) -> str:
+    return str(path.relative_to(settings.spaces_folder))
+
+
+def meta_file(locator: core.Locator) -> Path:
+    path, filename = db.metapath(
+        locator.space_name,
+        locator.subpath,
+        locator.shortname,
+        _class_type(locator),
+        locator.branch_name,
+    )
+    return path / filename
+
+
+def entry_field(locator: core.Locator) -> str:
+    return _relative(meta_file(locator))
+
+
+def _attachments_files(locator: core.Locator) -> list[Path]:
+    entry_path = db.entry_dm_path(
+        locator.space_name, locator.subpath, locator.shortname, locator.branch_name
+    )
+    if not entry_path.is_dir():
+        return []
+
+    files: list[Path] = []
+    with os.scandir(entry_path) as entry_iterator:
+        for one in entry_iterator:
+            if not one.name.startswith("attachments.") or not one.is_dir():
+                continue
+            with os.scandir(one.path) as attachments_iterator:
+                files.extend(
+                    Path(attachment.path)
+                    for attachment in attachments_iterator
+                    if attachment.is_file()
+                )
+    return files
+
+
+def _entry_files(locator: core.Locator, payload_file: Path | None) -> list[Path]:
+    files = [meta_file(locator)]
+    if payload_file:
+        files.append(payload_file)
+    return files + sorted(_attachments_files(locator))
+
+
+def _stats(files: list[Path]) -> dict[str, list[int]]:
+    stats = {}
+    for path in files:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        stats[_relative(path)] = [stat.st_mtime_ns, stat.st_size]
+    return stats
+
+
+def is_unchanged(locator: core.Locator, record: dict) -> bool:
+    """Whether the files of the entry have the stats recorded, a cheap check not reading them"""
+    payload_file = settings.spaces_folder / record["payload"] if record.get("payload") else None
+    return bool(_stats(_entry_files(locator, payload_file)) == record["files"])
+
+
+def fingerprint(locator: core.Locator, payload_file: Path | None) -> dict[str, Any]:
+    files = _entry_files(locator, payload_file)
+    stats = _stats(files)
+    checksum = hashlib.sha1()
+    for path in files:
+        if _relative(path) not in stats:
+            continue
+        checksum.update(_relative(path).encode())
+        with open(path, "rb") as file:
+            while chunk := file.read(1024 * 1024):
+                checksum.update(chunk)
+    return {
+        "files": stats,
+        "checksum": checksum.hexdigest(),
+        "payload": _relative(payload_file) if payload_file else None,
+    }
+
+
+async def get_records(
+    redis_services: RedisServices, key: str, fields: list[str]
+) -> list[dict | None]:
+    if not fields:
+        return []
+    values = redis_services.hmget(key, fields)
+    if isinstance(values, Awaitable):
+        values = await values
+    return [json.loads(value) if value else None for value in values]
+
+
+async def _forget(redis_services: RedisServices, key: str, missing: list[tuple[str, dict]]):
+    async with redis_services.pipeline(transaction=False) as pipe:
+        for field, record in missing:
+            if record["doc_ids"]:
+                pipe.delete(*record["doc_ids"])
+            pipe.hdel(key, field)  # type: ignore
+        await pipe.execute()
+
+
+async def forget_subpath(
+    redis_services: RedisServices, space_name: str, branch_name: str | None, subpath: str
+):
+    """Delete the fingerprints recorded for subpath and the subpaths under it, as their
+    docs are deleted along with a folder"""
+    key = manifest_key(space_name, branch_name, subpath)
+    keys = [key] + [one async for one in redis_services.scan_iter(match=f"{key}/*")]
+    await redis_services.delete(*keys)
+
+
+async def recorded_doc_ids(redis_services: RedisServices, space_name: str | None = None) -> set[str]:
+    """The ids of the docs the fingerprints of the space (or of all the spaces) refer to"""
+    doc_ids: set[str] = set()
+    async for key in redis_services.scan_iter(match=f"{PREFIX}:{space_name or '*'}:*"):
+        async for _, value in redis_services.hscan_iter(key):
+            doc_ids.update(json.loads(value)["doc_ids"])
+    return doc_ids
+
+
+async def sweep_superseded(
+    redis_services: RedisServices, previous_doc_ids: set[str], space_name: str | None = None
+) -> int:
+    """Delete the docs recorded before a reindex that no fingerprint refers to anymore.
+    The docs never recorded (e.g. indexed by the server since) are left alone.
+    Returns the count of docs deleted"""
+    superseded = list(
+        previous_doc_ids - await recorded_doc_ids(redis_services, space_name)
+    )
+    deleted = 0
+    for start in range(0, len(superseded), settings.reindex_pipeline_size):
+        deleted += await redis_services.delete(
+            *superseded[start: start + settings.reindex_pipeline_size]
+        )
+    return deleted
+
+
+async def forget_missing(
+    redis_services: RedisServices,
+    space_name: str | None = None,
+    subpaths: list | None = None,
+) -> int:
+    """Delete the docs of the entries whose meta file is gone, along with their fingerprints.
+    Returns the count of entries forgotten"""
+    forgotten = 0
+    async for key in redis_services.scan_iter(match=f"{PREFIX}:{space_name or '*'}:*"):
+        subpath = key.split(":/", 1)[1]
+        if subpaths and not any(subpath.startswith(one.strip("/")) for one in subpaths):
+            continue
+
+        missing: list[tuple[str, dict]] = []
+        async for field, value in redis_services.hscan_iter(key):
+            if (settings.spaces_folder / field).is_file():
+                continue
+            missing.append((field, json.loads(value)))
+            if len(missing) >= settings.reindex_pipeline_size:
+                await _forget(redis_services, key, missing)
+                forgotten += len(missing)
+                missing = []
+        if missing:
+            await _forget(redis_services, key, missing)
+            forgotten += len(missing)
+    return forgotten
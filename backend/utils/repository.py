@@ -1,16 +1,21 @@
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
 from datetime import datetime
+from enum import Enum
+import heapq
+import itertools
 import json
 import os
 from pathlib import Path
 import re
 import sys
 from typing import Any
-from uuid import uuid4
+from uuid import UUID, uuid4
 import jq  # type: ignore
 from fastapi.encoders import jsonable_encoder
 from pydantic.fields import Field
 from models.enums import ContentType, Language, ResourceType
-from utils.access_control import access_control
+from utils.access_control import AccessCandidate, access_control
 from utils.internal_error_code import InternalErrorCode
 from utils.jwt import generate_jwt
 from utils.plugin_manager import plugin_manager
@@ -20,8 +25,15 @@ import utils.regex as regex
 import models.core as core
 import models.api as api
 import utils.db as db
+from utils import subpath_manifest
 from utils.redis_services import RedisServices
-import aiofiles
+from utils import io_executor
+from utils import storage_codec
+from utils import sharding
+from utils import history_store
+from utils import events_log
+from utils import query_cursor
+from utils import query_cache
 from fastapi import status
 from fastapi.logger import logger
 from utils.helpers import (
@@ -30,10 +42,8 @@ from utils.helpers import (
     camel_case,
     flatten_all,
     snake_case,
-    str_to_datetime,
 )
 from utils.custom_validations import validate_payload_with_schema
-import subprocess
 # import redis.commands.search.reducers as reducers
 
 
@@ -52,7 +62,7 @@ def parse_redis_response(rows: list) -> list:
 
 
 async def serve_query(
-    query: api.Query, logged_in_user: str, redis_query_policies: list = []
+    query: api.Query, logged_in_user: str, redis_query_policies: list | None = None
 ) -> tuple[int, list[core.Record]]:
     """Given a query return the total and the records
 
@@ -66,8 +76,77 @@ async def serve_query(
     Total, Records
 
     """
+    total, records, _ = await serve_query_page(query, logged_in_user, redis_query_policies)
+    return total, records
+
+
+def _pages_by_cursor(query: api.Query) -> bool:
+    """Whether every page of the query hands back the cursor of the next one"""
+    if query.jq_filter:
+        return False
+    if query.type == api.QueryType.subpath:
+        return True
+    return query.type == api.QueryType.search and (
+        len(query.filter_schema_names) == 1
+        or (len(query.filter_schema_names) > 1 and bool(query.sort_by))
+    )
+
+
+async def serve_query_chunks(
+    query: api.Query, logged_in_user: str, redis_query_policies: list | None = None
+) -> AsyncIterator[tuple[int, list[core.Record], str | None]]:
+    """serve_query_page in chunks of at most settings.query_stream_chunk_size records,
+    following the cursor of each chunk, so that only one chunk is held in memory at a time.
+    Queries that don't page by cursor are served in a single chunk"""
+    if not _pages_by_cursor(query):
+        yield await serve_query_page(query, logged_in_user, redis_query_policies)
+        return
+
+    remaining = query.limit
+    chunk_query = query
+    while True:
+        chunk_query = chunk_query.model_copy(
+            update={"limit": min(remaining, settings.query_stream_chunk_size)}
+        )
+        total, records, next_cursor = await serve_query_page(
+            chunk_query, logged_in_user, redis_query_policies
+        )
+        remaining -= len(records)
+        if not next_cursor or remaining <= 0:
+            yield total, records, next_cursor
+            return
+        yield total, records, None
+        chunk_query = chunk_query.model_copy(update={"cursor": next_cursor})
+
+
+async def serve_query_page(
+    query: api.Query, logged_in_user: str, redis_query_policies: list | None = None
+) -> tuple[int, list[core.Record], str | None]:
+    """serve_query, along with the cursor of the next page (None on the last page or
+    when the query type doesn't support cursors). Served from the query cache while
+    no write made the cached result stale"""
+    if redis_query_policies is None:
+        redis_query_policies = []
+    if not query_cache.is_cacheable(query):
+        return await run_query_page(query, logged_in_user, redis_query_policies)
+
+    cache_key = query_cache.cache_key(query, logged_in_user, redis_query_policies)
+    cached, generations = await query_cache.get(query, cache_key)
+    if cached:
+        return cached
+    result = await run_query_page(query, logged_in_user, redis_query_policies)
+    query_cache.put(cache_key, generations, result)
+    return result
+
+
+async def run_query_page(
+    query: api.Query, logged_in_user: str, redis_query_policies: list | None = None
+) -> tuple[int, list[core.Record], str | None]:
+    if redis_query_policies is None:
+        redis_query_policies = []
     records: list[core.Record] = []
     total: int = 0
+    next_cursor: str | None = None
     spaces = await get_spaces()
     match query.type:
         case api.QueryType.spaces:
@@ -101,37 +180,41 @@ async def serve_query(
                 )
 
         case api.QueryType.search:
-            search_res, total = await redis_query_search(query, logged_in_user, redis_query_policies)
             res_data: list = []
-            for redis_document in search_res:
-                res_data.append(json.loads(redis_document))
-            if len(query.filter_schema_names) > 1:
-                if query.sort_by:
-                    res_data = sorted(
-                        res_data,
-                        key=lambda d: d[query.sort_by]
-                        if query.sort_by in d
-                        else d.get("payload", {})[query.sort_by]
-                        if query.sort_by in d.get("payload", {})
-                        else "",
-                        reverse=(query.sort_type == api.SortType.descending),
-                    )
-                res_data = res_data[query.offset: (query.limit + query.offset)]
+            if len(query.filter_schema_names) > 1 and query.sort_by:
+                cursor_position = query_cursor.decode(query)
+                res_data, total, positions = await redis_query_search_merged(
+                    query,
+                    logged_in_user,
+                    redis_query_policies,
+                    cursor_position["positions"] if cursor_position else None,
+                )
+                if sum(positions) < total:
+                    next_cursor = query_cursor.encode(query, {"positions": positions})
+            elif len(query.filter_schema_names) == 1:
+                res_data, total, next_cursor = await redis_query_search_page(
+                    query, logged_in_user, redis_query_policies
+                )
+            else:
+                search_res, total = await redis_query_search(query, logged_in_user, redis_query_policies)
+                for redis_document in search_res:
+                    res_data.append(json.loads(redis_document))
+                if len(query.filter_schema_names) > 1:
+                    res_data = res_data[query.offset: (query.limit + query.offset)]
 
             async with RedisServices() as redis_services:
-                for redis_doc_dict in res_data:
-                    try:
-                        resource_base_record = await get_record_from_redis_doc(
-                            space_name=query.space_name,
-                            branch_name=query.branch_name,
-                            doc=redis_doc_dict,
-                            retrieve_json_payload=query.retrieve_json_payload,
-                            retrieve_attachments=query.retrieve_attachments,
-                            validate_schema=query.validate_schema,
-                            filter_types=query.filter_types,
-                        )
-                    except Exception:
-                        # Incase of schema validation error
+                docs_extras = await get_redis_docs_extras(
+                    redis_services,
+                    query.space_name,
+                    query.branch_name,
+                    res_data,
+                    query.retrieve_json_payload,
+                )
+                for redis_doc_dict, doc_extras in zip(res_data, docs_extras):
+                    resource_base_record = await _query_doc_record(
+                        query, redis_doc_dict, doc_extras
+                    )
+                    if not resource_base_record:
                         continue
 
                     # Don't repeat the same entry comming from different indices
@@ -154,254 +237,18 @@ async def serve_query(
                     records.append(resource_base_record)
 
         case api.QueryType.subpath:
-            subpath = query.subpath
-            if subpath[0] == "/":
-                subpath = "." + subpath
-            path = (
-                settings.spaces_folder
-                / query.space_name
-                / branch_path(query.branch_name)
-                / subpath
-            )
-
-            if query.include_fields is None:
-                query.include_fields = []
-
-            # Gel all matching entries
-            # entries_glob = ".dm/*/meta.*.json"
-
-            meta_path = path / ".dm"
-            if meta_path.is_dir():
-                path_iterator = os.scandir(meta_path)
-                async with RedisServices() as redis_services:
-                    for entry in path_iterator:
-                        if not entry.is_dir():
-                            continue
-
-                        subpath_iterator = os.scandir(entry)
-                        for one in subpath_iterator:
-                            # for one in path.glob(entries_glob):
-                            match = regex.FILE_PATTERN.search(str(one.path))
-                            if not match or not one.is_file():
-                                continue
-
-                            shortname = match.group(1)
-                            resource_name = match.group(2).lower()
-                            if (
-                                query.filter_types
-                                and ResourceType(resource_name) not in query.filter_types
-                            ):
-                                continue
-
-                            if (
-                                query.filter_shortnames
-                                and shortname not in query.filter_shortnames
-                            ):
-                                continue
-
-                            resource_class = getattr(
-                                sys.modules["models.core"], camel_case(
-                                    resource_name)
-                            )
-
-                            async with aiofiles.open(one, "r") as meta_file:
-                                resource_obj = resource_class.model_validate_json(
-                                    await meta_file.read()
-                                )
-
-                            if query.filter_tags and (
-                                not resource_obj.tags
-                                or not any(
-                                    item in resource_obj.tags
-                                    for item in query.filter_tags
-                                )
-                            ):
-                                continue
-
-                            # apply check access
-                            if not await access_control.check_access(
-                                user_shortname=logged_in_user,
-                                space_name=query.space_name,
-                                subpath=query.subpath,
-                                resource_type=ResourceType(resource_name),
-                                action_type=core.ActionType.view,
-                                resource_is_active=resource_obj.is_active,
-                                resource_owner_shortname=resource_obj.owner_shortname,
-                                resource_owner_group=resource_obj.owner_group_shortname,
-                                entry_shortname=shortname,
-                            ):
-                                continue
-                            total += 1
-                            if len(records) >= query.limit or total < query.offset:
-                                continue
-
-                            resource_base_record = resource_obj.to_record(
-                                query.subpath,
-                                shortname,
-                                query.include_fields,
-                                query.branch_name,
-                            )
-                            if resource_base_record:
-                                locked_data = await redis_services.get_lock_doc(
-                                    query.space_name,
-                                    query.branch_name,
-                                    query.subpath,
-                                    resource_obj.shortname,
-                                )
-                                if locked_data:
-                                    resource_base_record.attributes[
-                                        "locked"
-                                    ] = locked_data
-
-                            if (
-                                query.retrieve_json_payload
-                                and resource_obj.payload
-                                and resource_obj.payload.content_type
-                                and resource_obj.payload.content_type
-                                == ContentType.json
-                                and (path / resource_obj.payload.body).is_file()
-                            ):
-                                async with aiofiles.open(
-                                    path / resource_obj.payload.body, "r"
-                                ) as payload_file_content:
-                                    resource_base_record.attributes[
-                                        "payload"
-                                    ].body = json.loads(
-                                        await payload_file_content.read()
-                                    )
-
-                            if (
-                                resource_obj.payload
-                                and resource_obj.payload.schema_shortname
-                            ):
-                                try:
-                                    payload_body = resource_base_record.attributes[
-                                        "payload"
-                                    ].body
-                                    if not payload_body or isinstance(payload_body, str):
-                                        async with aiofiles.open(
-                                            path / resource_obj.payload.body, "r"
-                                        ) as payload_file_content:
-                                            payload_body = json.loads(
-                                                await payload_file_content.read()
-                                            )
-
-                                    if query.validate_schema:
-                                        await validate_payload_with_schema(
-                                            payload_data=payload_body,
-                                            space_name=query.space_name,
-                                            branch_name=query.branch_name,
-                                            schema_shortname=resource_obj.payload.schema_shortname,
-                                        )
-                                except Exception:
-                                    continue
-
-                            resource_base_record.attachments = (
-                                await get_entry_attachments(
-                                    subpath=f"{query.subpath}/{shortname}",
-                                    branch_name=query.branch_name,
-                                    attachments_path=(meta_path / shortname),
-                                    filter_types=query.filter_types,
-                                    include_fields=query.include_fields,
-                                    retrieve_json_payload=query.retrieve_json_payload,
-                                )
-                            )
-                            records.append(resource_base_record)
-
-                        subpath_iterator.close()
-                    if path_iterator:
-                        path_iterator.close()
-
-            # Get all matching sub folders
-            # apply check access
-
-            if meta_path.is_dir():
-                subfolders_iterator = os.scandir(path)
-                for one in subfolders_iterator:
-                    if not one.is_dir():
-                        continue
-
-                    subfolder_meta = Path(one.path + "/.dm/meta.folder.json")
-
-                    match = regex.FOLDER_PATTERN.search(str(subfolder_meta))
-
-                    if not match or not subfolder_meta.is_file():
-                        continue
-
-                    shortname = match.group(1)
-                    if not await access_control.check_access(
-                        user_shortname=logged_in_user,
-                        space_name=query.space_name,
-                        subpath=f"{query.subpath}/{shortname}",
-                        resource_type=ResourceType.folder,
-                        action_type=core.ActionType.query,
-                        entry_shortname=shortname
-                    ):
-                        continue
-                    if (
-                        query.filter_shortnames
-                        and shortname not in query.filter_shortnames
-                    ):
-                        continue
-                    total += 1
-                    if len(records) >= query.limit or total < query.offset:
-                        continue
-
-                    folder_obj = core.Folder.model_validate_json(
-                        subfolder_meta.read_text())
-                    folder_record = folder_obj.to_record(
-                        query.subpath,
-                        shortname,
-                        query.include_fields,
-                        query.branch_name,
-                    )
-                    if (
-                        query.retrieve_json_payload
-                        and folder_obj.payload
-                        and folder_obj.payload.content_type
-                        and folder_obj.payload.content_type == ContentType.json
-                        and isinstance(folder_obj.payload.body, str)
-                        and (path / folder_obj.payload.body).is_file()
-                    ):
-                        async with aiofiles.open(
-                            path / folder_obj.payload.body, "r"
-                        ) as payload_file_content:
-                            folder_record.attributes["payload"].body = json.loads(
-                                await payload_file_content.read()
-                            )
-                            if os.path.exists(meta_path / shortname):
-                                folder_record.attachments = await get_entry_attachments(
-                                    subpath=f"{query.subpath if query.subpath != '/' else ''}/{shortname}",
-                                    branch_name=query.branch_name,
-                                    attachments_path=(meta_path / shortname),
-                                    filter_types=query.filter_types,
-                                    include_fields=query.include_fields,
-                                    retrieve_json_payload=query.retrieve_json_payload,
-                                )
-                    records.append(folder_record)
-
-                if subfolders_iterator:
-                    subfolders_iterator.close()
-
-            if query.sort_by:
-                sort_reverse: bool = (
-                    query.sort_type is not None
-                    and query.sort_type == api.SortType.descending
+            indexed_result = None
+            if (
+                query.space_name in spaces
+                and core.Space.model_validate_json(spaces[query.space_name]).indexing_enabled
+            ):
+                indexed_result = await serve_subpath_query_from_index(
+                    query, logged_in_user, redis_query_policies
                 )
-                if query.sort_by in core.Record.model_fields:
-                    records = sorted(
-                        records,
-                        key=lambda record: record.__getattribute__(
-                            str(query.sort_by)),
-                        reverse=sort_reverse,
-                    )
-                else:
-                    records = sorted(
-                        records,
-                        key=lambda record: record.attributes[str(
-                            query.sort_by)],
-                        reverse=sort_reverse,
-                    )
+            if indexed_result is not None:
+                total, records, next_cursor = indexed_result
+            else:
+                total, records, next_cursor = await serve_subpath_query(query, logged_in_user)
 
         case api.QueryType.counters:
             if not await access_control.check_access(
@@ -474,13 +321,16 @@ async def serve_query(
                 ids = []
                 for row in rows:
                     ids.extend(row[3])
-                docs = await redis_services.get_docs_by_ids(ids)
+                docs = [doc[0] for doc in await redis_services.get_docs_by_ids(ids)]
                 total = len(ids)
+                payload_docs = await redis_services.get_docs_map(
+                    [doc["payload_doc_id"] for doc in docs if doc.get("payload_doc_id")]
+                    if query.retrieve_json_payload else []
+                )
                 for doc in docs:
-                    doc = doc[0]
                     if query.retrieve_json_payload and doc.get("payload_doc_id", None):
-                        doc["payload"]["body"] = await redis_services.get_payload_doc(
-                            doc["payload_doc_id"], doc["resource_type"]
+                        doc["payload"]["body"] = redis_services.payload_doc_content(
+                            payload_docs.get(doc["payload_doc_id"]), doc["resource_type"]
                         )
                     record = core.Record(
                         shortname=doc["shortname"],
@@ -490,9 +340,8 @@ async def serve_query(
                         subpath=doc["subpath"],
                         attributes={"payload": doc.get("payload")},
                     )
-                    entry_path = (
-                        settings.spaces_folder
-                        / f"{query.space_name}/{branch_path(doc['branch_name'])}/{doc['subpath']}/.dm/{doc['shortname']}"
+                    entry_path = db.entry_dm_path(
+                        query.space_name, doc["subpath"], doc["shortname"], doc["branch_name"]
                     )
                     if query.retrieve_attachments and entry_path.is_dir():
                         record.attachments = await get_entry_attachments(
@@ -532,30 +381,17 @@ async def serve_query(
                     ),
                 )
 
-            path = Path(f"{settings.spaces_folder}/{query.space_name}/{branch_path(query.branch_name)}"
-                        f"{query.subpath}/.dm/{query.filter_shortnames[0]}/history.jsonl")
+            path = db.entry_dm_path(
+                query.space_name, query.subpath, query.filter_shortnames[0], query.branch_name
+            ) / "history.jsonl"
 
+            await io_executor.run(db.rehydrate_history, path)
             if path.is_file():
-                cmd = f"tail -n +{query.offset} {path} | head -n {query.limit} | tac"
-                result = list(
-                    filter(
-                        None,
-                        subprocess.run(
-                            [cmd], capture_output=True, text=True, shell=True
-                        ).stdout.split("\n"),
-                    )
-                )
-                total = int(
-                    subprocess.run(
-                        [f"wc -l < {path}"],
-                        capture_output=True,
-                        text=True,
-                        shell=True,
-                    ).stdout,
-                    10,
+                total, history_lines = await io_executor.run(
+                    history_store.read_page, path, query.offset, query.limit
                 )
-                for line in result:
-                    action_obj = json.loads(line)
+                for history_line in history_lines:
+                    action_obj = json.loads(history_line)
 
                     records.append(
                         core.Record(
@@ -568,92 +404,32 @@ async def serve_query(
                     )
 
         case api.QueryType.events:
-            trimmed_subpath = query.subpath
-            if trimmed_subpath[0] == "/":
-                trimmed_subpath = trimmed_subpath[1:]
-
-            path = Path(
-                f"{settings.spaces_folder}/{query.space_name}/{branch_path(query.branch_name)}/.dm/events.jsonl")
-            if path.is_file():
-                result = []
-                if query.search:
-                    p = subprocess.Popen(
-                        ["grep", f'"{query.search}"', path], stdout=subprocess.PIPE
-                    )
-                    p = subprocess.Popen(
-                        ["tail", "-n", f"{query.limit + query.offset}"],
-                        stdin=p.stdout,
-                        stdout=subprocess.PIPE,
-                    )
-                    p = subprocess.Popen(
-                        ["tac"], stdin=p.stdout, stdout=subprocess.PIPE
-                    )
-                    if query.offset > 0:
-                        p = subprocess.Popen(
-                            ["sed", f"1,{query.offset}d"],
-                            stdin=p.stdout,
-                            stdout=subprocess.PIPE,
-                        )
-                    r, _ = p.communicate()
-                    result = list(filter(None, r.decode("utf-8").split("\n")))
-                else:
-                    cmd = f"(tail -n {query.limit + query.offset} {path}; echo) | tac"
-                    if query.offset > 0:
-                        cmd += f" | sed '1,{query.offset}d'"
-                    result = list(
-                        filter(
-                            None,
-                            subprocess.run(
-                                [cmd], capture_output=True, text=True, shell=True
-                            ).stdout.split("\n"),
+            total, result = await io_executor.run(
+                events_log.query,
+                settings.spaces_folder / query.space_name / branch_path(query.branch_name) / ".dm",
+                query.offset,
+                query.limit,
+                query.from_date,
+                query.to_date,
+                query.search,
+            )
+            if result:
+                action_objs = [json.loads(line) for line in result]
+                actions_allowed = await access_control.check_access_many(
+                    logged_in_user,
+                    query.space_name,
+                    [
+                        AccessCandidate(
+                            subpath=action_obj.get(
+                                "resource", {}).get("subpath", "/"),
+                            resource_type=action_obj["resource"]["type"],
+                            action_type=core.ActionType(action_obj["request"]),
                         )
-                    )
-
-                if query.search:
-                    p1 = subprocess.Popen(
-                        ["grep", f'"{query.search}"', path], stdout=subprocess.PIPE
-                    )
-                    p2 = subprocess.Popen(
-                        ["wc", "-l"], stdin=p1.stdout, stdout=subprocess.PIPE
-                    )
-                    r, _ = p2.communicate()
-                    total = int(
-                        r.decode(),
-                        10,
-                    )
-                else:
-                    total = int(
-                        subprocess.run(
-                            [f"wc -l < {path}"],
-                            capture_output=True,
-                            text=True,
-                            shell=True,
-                        ).stdout,
-                        10,
-                    )
-                for line in result:
-                    action_obj = json.loads(line)
-
-                    if (
-                        query.from_date
-                        and str_to_datetime(action_obj["timestamp"]) < query.from_date
-                    ):
-                        continue
-
-                    if (
-                        query.to_date
-                        and str_to_datetime(action_obj["timestamp"]) > query.to_date
-                    ):
-                        break
-
-                    if not await access_control.check_access(
-                        user_shortname=logged_in_user,
-                        space_name=query.space_name,
-                        subpath=action_obj.get(
-                            "resource", {}).get("subpath", "/"),
-                        resource_type=action_obj["resource"]["type"],
-                        action_type=core.ActionType(action_obj["request"]),
-                    ):
+                        for action_obj in action_objs
+                    ],
+                )
+                for action_obj, is_allowed in zip(action_objs, actions_allowed):
+                    if not is_allowed:
                         continue
 
                     records.append(
@@ -685,7 +461,651 @@ async def serve_query(
             .input([record.to_dict() for record in records])
             .all()
         )
-    return total, records
+    return total, records, next_cursor
+
+
+def _read_subpath_meta_files(
+    meta_path: Path,
+    sharded: bool,
+    filter_types: list | None,
+    filter_shortnames: list | None,
+) -> list[tuple[str, str, bytes]]:
+    """(shortname, resource_type, meta content) of the entries under a subpath's .dm"""
+    entries_meta: list[tuple[str, str, bytes]] = []
+    for entry in sharding.entry_folders(meta_path, sharded):
+        subpath_iterator = os.scandir(entry)
+        for one in subpath_iterator:
+            # for one in path.glob(entries_glob):
+            match = regex.FILE_PATTERN.search(str(one.path))
+            if not match or not one.is_file():
+                continue
+
+            shortname = match.group(1)
+            resource_name = match.group(2).lower()
+            if filter_types and ResourceType(resource_name) not in filter_types:
+                continue
+
+            if filter_shortnames and shortname not in filter_shortnames:
+                continue
+
+            with open(one, "rb") as meta_file:
+                entries_meta.append((shortname, resource_name, meta_file.read()))
+
+        subpath_iterator.close()
+    return entries_meta
+
+
+class _ListingCandidate:
+    """An entry of a sorted subpath listing, ordered so that the heap top is the one to drop first"""
+
+    __slots__ = ("descending", "key", "order", "resource_obj", "shortname")
+
+    def __init__(
+        self, key: tuple, order: int, descending: bool, shortname: str, resource_obj: core.Meta
+    ):
+        self.key = key
+        self.order = order
+        self.descending = descending
+        self.shortname = shortname
+        self.resource_obj = resource_obj
+
+    def __lt__(self, other: "_ListingCandidate") -> bool:
+        if self.key == other.key:
+            # Ties keep the listing order, as a stable sort would
+            return self.order > other.order
+        if self.descending:
+            return bool(self.key < other.key)
+        return bool(other.key < self.key)
+
+
+def _cursor_value(value: Any) -> Any:
+    """The sort value as held in a cursor, dates as timestamps like in the subpath manifest"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def _listing_sort_by(query: api.Query) -> str:
+    """The field a listing is ordered on, the shortname when unsorted so that its
+    cursors also resume after the entry they ended on"""
+    return query.sort_by or "shortname"
+
+
+def _listing_sort_key(sort_by: str, shortname: str, resource_obj: core.Meta) -> tuple:
+    """The value of the record field or attribute sort_by of the entry, without building its record,
+    with the shortname breaking the ties"""
+    value: Any
+    if sort_by == "resource_type":
+        value = snake_case(type(resource_obj).__name__)
+    elif sort_by in ("subpath", "branch_name"):
+        # The same for the whole listing
+        value = None
+    else:
+        value = _cursor_value(getattr(resource_obj, sort_by, None))
+    return value is None, value, shortname
+
+
+def _is_listing_keyset(position: dict[str, Any]) -> bool:
+    """Whether the position is a sort key reached listing the files, rather than one
+    reached on the space's index, which also counts the rows before it"""
+    return "after" in position and "before" not in position
+
+
+def _listing_offset(query: api.Query) -> int:
+    """The count of entries a listing skips for query.offset, which counts from 1"""
+    return max(query.offset - 1, 0)
+
+
+def _listing_page_start(query: api.Query) -> tuple[int, tuple | None]:
+    """The count of listed entries to skip before the page, or the sort key the page
+    starts after when query.cursor is a keyset position"""
+    position = query_cursor.decode(query)
+    if not position:
+        return _listing_offset(query), None
+    if _is_listing_keyset(position):
+        return 0, tuple(position["after"])
+    # A position reached on the space's index, before falling back to the files
+    return position.get("offset", position.get("before", 0) + position.get("ties", 0)), None
+
+
+def _is_after(key: tuple, after: tuple | None, descending: bool) -> bool:
+    if after is None:
+        return True
+    return key < after if descending else key > after
+
+
+def _listing_next_cursor(
+    query: api.Query, consumed: int, total: int, last_key: tuple | None
+) -> str | None:
+    """The cursor of the listing page following the first `consumed` entries, the last
+    of them at the sort key last_key"""
+    if not consumed or consumed >= total or last_key is None:
+        return None
+    return query_cursor.encode(query, {"after": list(last_key)})
+
+
+def _keep_top(candidates: list[_ListingCandidate], candidate: _ListingCandidate, size: int):
+    """Keep the best `size` candidates of the listing in a bounded heap"""
+    if len(candidates) < size:
+        heapq.heappush(candidates, candidate)
+    elif size:
+        heapq.heappushpop(candidates, candidate)
+
+
+async def serve_subpath_query(
+    query: api.Query, logged_in_user: str
+) -> tuple[int, list[core.Record], str | None]:
+    """List the entries and the sub folders of query.subpath from the file system,
+    along with the cursor of the next page"""
+    records: list[core.Record] = []
+    total: int = 0
+
+    subpath = query.subpath
+    if subpath[0] == "/":
+        subpath = "." + subpath
+    path = (
+        settings.spaces_folder
+        / query.space_name
+        / branch_path(query.branch_name)
+        / subpath
+    )
+
+    if query.include_fields is None:
+        query.include_fields = []
+
+    meta_path = path / ".dm"
+    if not meta_path.is_dir():
+        return total, records, None
+
+    sharded = db.is_sharded(query.space_name, query.subpath)
+    manifest_entries = await subpath_manifest.subpath_entries(path, sharded)
+    if manifest_entries is not None and (
+        not query.sort_by or query.sort_by in subpath_manifest.SORT_KEYS
+    ):
+        return await serve_subpath_query_from_manifest(
+            query, logged_in_user, path, list(manifest_entries.values())
+        )
+
+    # Gel all matching entries, read in a single I/O task
+    entries_meta = await io_executor.run(
+        _read_subpath_meta_files,
+        meta_path,
+        sharded,
+        query.filter_types,
+        query.filter_shortnames,
+    )
+    # The entries are ranked on their sort key only, keeping the best candidates of the
+    # page in a bounded heap, and the records of the final page alone are built.
+    # A keyset cursor leaves out the entries up to the sort key it's positioned at
+    sort_by = _listing_sort_by(query)
+    sort_reverse: bool = (
+        query.sort_type is not None
+        and query.sort_type == api.SortType.descending
+    )
+    page_start, after_key = _listing_page_start(query)
+    candidates: list[_ListingCandidate] = []
+    # The listed entries before the page
+    passed: int = 0
+
+    entries: list[tuple[str, str, core.Meta]] = []
+    for shortname, resource_name, meta_content in entries_meta:
+        resource_class = getattr(
+            sys.modules["models.core"], camel_case(resource_name)
+        )
+        resource_obj = storage_codec.load_model(resource_class, meta_content)
+
+        if query.filter_tags and (
+            not resource_obj.tags
+            or not any(
+                item in resource_obj.tags
+                for item in query.filter_tags
+            )
+        ):
+            continue
+        entries.append((shortname, resource_name, resource_obj))
+
+    # apply check access
+    entries_allowed = await access_control.check_access_many(
+        logged_in_user,
+        query.space_name,
+        [
+            AccessCandidate(
+                subpath=query.subpath,
+                resource_type=ResourceType(resource_name),
+                action_type=core.ActionType.view,
+                resource_is_active=resource_obj.is_active,
+                resource_owner_shortname=resource_obj.owner_shortname,
+                resource_owner_group=resource_obj.owner_group_shortname,
+                entry_shortname=shortname,
+                acl=resource_obj.acl or [],
+            )
+            for shortname, resource_name, resource_obj in entries
+        ],
+    )
+
+    for (shortname, resource_name, resource_obj), is_allowed in zip(
+        entries, entries_allowed
+    ):
+        if not is_allowed:
+            continue
+        total += 1
+        sort_key = _listing_sort_key(sort_by, shortname, resource_obj)
+        if not _is_after(sort_key, after_key, sort_reverse):
+            passed += 1
+            continue
+        _keep_top(
+            candidates,
+            _ListingCandidate(sort_key, total, sort_reverse, shortname, resource_obj),
+            page_start + query.limit,
+        )
+
+    # Get all matching sub folders
+    subfolders: list[tuple[str, Path]] = []
+    subfolders_iterator = os.scandir(path)
+    for one in subfolders_iterator:
+        if not one.is_dir():
+            continue
+
+        subfolder_meta = Path(one.path + "/.dm/meta.folder.json")
+
+        match = regex.FOLDER_PATTERN.search(str(subfolder_meta))
+
+        if not match or not subfolder_meta.is_file():
+            continue
+
+        shortname = match.group(1)
+        if (
+            query.filter_shortnames
+            and shortname not in query.filter_shortnames
+        ):
+            continue
+        subfolders.append((shortname, subfolder_meta))
+
+    if subfolders_iterator:
+        subfolders_iterator.close()
+
+    # apply check access
+    subfolders_allowed = await access_control.check_access_many(
+        logged_in_user,
+        query.space_name,
+        [
+            AccessCandidate(
+                subpath=f"{query.subpath}/{shortname}",
+                resource_type=ResourceType.folder,
+                action_type=core.ActionType.query,
+                entry_shortname=shortname,
+            )
+            for shortname, _ in subfolders
+        ],
+    )
+    for (shortname, subfolder_meta), is_allowed in zip(subfolders, subfolders_allowed):
+        if not is_allowed:
+            continue
+        total += 1
+
+        folder_obj = storage_codec.load_model(core.Folder, subfolder_meta.read_bytes())
+        sort_key = _listing_sort_key(sort_by, shortname, folder_obj)
+        if not _is_after(sort_key, after_key, sort_reverse):
+            passed += 1
+            continue
+        _keep_top(
+            candidates,
+            _ListingCandidate(sort_key, total, sort_reverse, shortname, folder_obj),
+            page_start + query.limit,
+        )
+
+    # The entries and folders of the page, in order, built as records once all known
+    page_candidates = sorted(candidates, reverse=True)[page_start:]
+    page: list[tuple[str, core.Meta]] = [
+        (candidate.shortname, candidate.resource_obj) for candidate in page_candidates
+    ]
+    consumed = passed + page_start + len(page)
+    last_key = page_candidates[-1].key if page_candidates else None
+
+    records = await get_subpath_page_records(query, path, page)
+    return total, records, _listing_next_cursor(query, consumed, total, last_key)
+
+
+_REDIS_TAG_ESCAPE = str.maketrans({":": r"\:", "/": r"\/", "-": r"\-", " ": r"\ "})
+
+
+def _listing_filters_clause(query: api.Query) -> str:
+    """The types and tags filters of a listing searched in the index. As when listing
+    the files, they only apply to the entries, every sub folder is listed"""
+    conditions: list[str] = []
+    if query.filter_types:
+        conditions.append(f"@resource_type:({'|'.join(query.filter_types)})")
+    if query.filter_tags:
+        conditions.append(f"@tags:{{{'|'.join(query.filter_tags).translate(_REDIS_TAG_ESCAPE)}}}")
+    if not conditions:
+        return ""
+    return f"(@resource_type:({ResourceType.folder}) | ({' '.join(conditions)}))"
+
+
+async def serve_subpath_query_from_index(
+    query: api.Query, logged_in_user: str, redis_query_policies: list
+) -> tuple[int, list[core.Record], str | None] | None:
+    """List the direct children of query.subpath with a single search of the space's meta index,
+    filtered by the user's query policies. None if the index can't answer it (e.g. the
+    index is missing or the sort field isn't sortable), for the caller to fall back to disk"""
+    records: list[core.Record] = []
+    position = query_cursor.decode(query)
+    if position and _is_listing_keyset(position):
+        # Continues a listing served from the files
+        return None
+    async with RedisServices() as redis_services:
+        if not await redis_services.index_exists(f"{query.space_name}:{query.branch_name}:meta"):
+            return None
+
+        async def search_at(clause: str, offset: int, limit: int, sort_by: str | None) -> dict | None:
+            redis_res: dict | None = await redis_services.search(
+                space_name=query.space_name,
+                branch_name=query.branch_name,
+                search=_listing_filters_clause(query) + clause,
+                filters={
+                    "shortname": query.filter_shortnames or [],
+                    "subpath": [query.subpath],
+                    "query_policies": list(redis_query_policies),
+                    "user_shortname": logged_in_user,
+                },
+                exact_subpath=True,
+                limit=limit,
+                offset=offset,
+                sort_by=sort_by or _listing_sort_by(query),
+                sort_type=query.sort_type or api.SortType.ascending,
+            )
+            return redis_res
+
+        page = await _search_keyset_page(query, position, search_at, _listing_offset(query))
+        if not page:
+            return None
+
+        docs, total, next_position = page
+        docs_extras = await get_redis_docs_extras(
+            redis_services,
+            query.space_name,
+            query.branch_name,
+            docs,
+            query.retrieve_json_payload,
+        )
+
+    for doc, doc_extras in zip(docs, docs_extras):
+        resource_base_record = await _query_doc_record(query, doc, doc_extras)
+        if not resource_base_record:
+            continue
+
+        resource_base_record.attributes = alter_dict_keys(
+            jsonable_encoder(resource_base_record.attributes, exclude_none=True),
+            query.include_fields,
+            query.exclude_fields,
+        )
+        records.append(resource_base_record)
+
+    return (
+        total,
+        records,
+        query_cursor.encode(query, next_position) if next_position else None,
+    )
+
+
+async def serve_subpath_query_from_manifest(
+    query: api.Query,
+    logged_in_user: str,
+    path: Path,
+    manifest_entries: list[dict[str, Any]],
+) -> tuple[int, list[core.Record], str | None]:
+    """List the subpath using its manifest, filtering, sorting and checking access on
+    the manifest attributes so that only the meta files of the returned page are loaded"""
+    total: int = 0
+
+    sort_reverse: bool = (
+        query.sort_type is not None
+        and query.sort_type == api.SortType.descending
+    )
+
+    def sort_key(item: dict[str, Any]) -> tuple:
+        value = item[_listing_sort_by(query)]
+        return value is None, value, item["shortname"]
+
+    page_start, after_key = _listing_page_start(query)
+    manifest_entries = sorted(manifest_entries, key=sort_key, reverse=sort_reverse)
+
+    listed_items: list[tuple[dict[str, Any], AccessCandidate]] = []
+    for item in manifest_entries:
+        shortname = item["shortname"]
+        resource_type = ResourceType(item["resource_type"])
+        if (
+            query.filter_shortnames
+            and shortname not in query.filter_shortnames
+        ):
+            continue
+
+        if resource_type == ResourceType.folder:
+            listed_items.append((item, AccessCandidate(
+                subpath=f"{query.subpath}/{shortname}",
+                resource_type=ResourceType.folder,
+                action_type=core.ActionType.query,
+                entry_shortname=shortname,
+            )))
+            continue
+
+        if query.filter_types and resource_type not in query.filter_types:
+            continue
+
+        if query.filter_tags and (
+            not item["tags"]
+            or not any(tag in item["tags"] for tag in query.filter_tags)
+        ):
+            continue
+
+        listed_items.append((item, AccessCandidate(
+            subpath=query.subpath,
+            resource_type=resource_type,
+            action_type=core.ActionType.view,
+            resource_is_active=item["is_active"],
+            resource_owner_shortname=item["owner_shortname"],
+            resource_owner_group=item["owner_group_shortname"],
+            entry_shortname=shortname,
+        )))
+
+    # apply check access
+    items_allowed = await access_control.check_access_many(
+        logged_in_user,
+        query.space_name,
+        [access_candidate for _, access_candidate in listed_items],
+    )
+
+    page: list[tuple[str, core.Meta]] = []
+    consumed: int = 0
+    last_key: tuple | None = None
+    for (item, access_candidate), is_allowed in zip(listed_items, items_allowed):
+        if not is_allowed:
+            continue
+        shortname = item["shortname"]
+        resource_type = access_candidate.resource_type
+
+        total += 1
+        if (
+            len(page) >= query.limit
+            or total <= page_start
+            or (after_key and not _is_after(sort_key(item), after_key, sort_reverse))
+        ):
+            continue
+
+        resource_class = getattr(
+            sys.modules["models.core"], camel_case(resource_type)
+        )
+        try:
+            resource_obj = await db.load(
+                space_name=query.space_name,
+                subpath=query.subpath,
+                shortname=shortname,
+                class_type=resource_class,
+                branch_name=query.branch_name,
+            )
+        except api.Exception:
+            # The manifest is behind the files, drop the entry from this listing
+            total -= 1
+            continue
+        page.append((shortname, resource_obj))
+        consumed = total
+        last_key = sort_key(item)
+
+    return (
+        total,
+        await get_subpath_page_records(query, path, page),
+        _listing_next_cursor(query, consumed, total, last_key),
+    )
+
+
+async def get_subpath_page_records(
+    query: api.Query,
+    path: Path,
+    page: list[tuple[str, core.Meta]],
+) -> list[core.Record]:
+    """Build the records of a listing page, reading the lock docs of all its entries
+    with a single JSON.MGET"""
+    async with RedisServices() as redis_services:
+        lock_docs_ids = [
+            redis_services.generate_doc_id(
+                query.space_name, query.branch_name, "lock", shortname, query.subpath
+            )
+            for shortname, _ in page
+        ]
+        lock_docs = await redis_services.get_docs_map(
+            [
+                lock_doc_id
+                for lock_doc_id, (_, resource_obj) in zip(lock_docs_ids, page)
+                if not isinstance(resource_obj, core.Folder)
+            ]
+        )
+
+    records: list[core.Record] = []
+    for lock_doc_id, (shortname, resource_obj) in zip(lock_docs_ids, page):
+        resource_base_record: core.Record | None
+        if isinstance(resource_obj, core.Folder):
+            resource_base_record = await get_subpath_folder_record(
+                query, path, resource_obj, shortname
+            )
+        else:
+            resource_base_record = await get_subpath_entry_record(
+                query, path, resource_obj, shortname, lock_docs.get(lock_doc_id)
+            )
+        if resource_base_record:
+            records.append(resource_base_record)
+    return records
+
+
+async def get_subpath_entry_record(
+    query: api.Query,
+    path: Path,
+    resource_obj: core.Meta,
+    shortname: str,
+    locked_data: dict | None,
+) -> core.Record | None:
+    """Build the record of a subpath entry, None if its payload doesn't pass the schema validation"""
+    resource_base_record = resource_obj.to_record(
+        query.subpath,
+        shortname,
+        query.include_fields or [],
+        query.branch_name,
+    )
+    if resource_base_record and locked_data:
+        resource_base_record.attributes["locked"] = locked_data
+
+    if (
+        query.retrieve_json_payload
+        and resource_obj.payload
+        and resource_obj.payload.content_type
+        and resource_obj.payload.content_type
+        == ContentType.json
+        and isinstance(resource_obj.payload.body, str)
+        and (path / resource_obj.payload.body).is_file()
+    ):
+        resource_base_record.attributes[
+            "payload"
+        ].body = storage_codec.loads(
+            await io_executor.read_bytes(path / resource_obj.payload.body)
+        )
+
+    if (
+        resource_obj.payload
+        and resource_obj.payload.schema_shortname
+    ):
+        try:
+            payload_body = resource_base_record.attributes[
+                "payload"
+            ].body
+            if (
+                not payload_body or isinstance(payload_body, str)
+            ) and isinstance(resource_obj.payload.body, str):
+                payload_body = storage_codec.loads(
+                    await io_executor.read_bytes(path / resource_obj.payload.body)
+                )
+
+            if query.validate_schema and isinstance(payload_body, dict):
+                await validate_payload_with_schema(
+                    payload_data=payload_body,
+                    space_name=query.space_name,
+                    branch_name=query.branch_name,
+                    schema_shortname=resource_obj.payload.schema_shortname,
+                )
+        except Exception:
+            return None
+
+    resource_base_record.attachments = (
+        await get_entry_attachments(
+            subpath=f"{query.subpath}/{shortname}",
+            branch_name=query.branch_name,
+            attachments_path=db.entry_dm_path(
+                query.space_name, query.subpath, shortname, query.branch_name
+            ),
+            filter_types=query.filter_types,
+            include_fields=query.include_fields,
+            retrieve_json_payload=query.retrieve_json_payload,
+        )
+    )
+    return resource_base_record
+
+
+async def get_subpath_folder_record(
+    query: api.Query,
+    path: Path,
+    folder_obj: core.Meta,
+    shortname: str,
+) -> core.Record:
+    meta_path = path / ".dm"
+    folder_record = folder_obj.to_record(
+        query.subpath,
+        shortname,
+        query.include_fields or [],
+        query.branch_name,
+    )
+    if (
+        query.retrieve_json_payload
+        and folder_obj.payload
+        and folder_obj.payload.content_type
+        and folder_obj.payload.content_type == ContentType.json
+        and isinstance(folder_obj.payload.body, str)
+        and (path / folder_obj.payload.body).is_file()
+    ):
+        folder_record.attributes["payload"].body = storage_codec.loads(
+            await io_executor.read_bytes(path / folder_obj.payload.body)
+        )
+        if os.path.exists(meta_path / shortname):
+            folder_record.attachments = await get_entry_attachments(
+                subpath=f"{query.subpath if query.subpath != '/' else ''}/{shortname}",
+                branch_name=query.branch_name,
+                attachments_path=(meta_path / shortname),
+                filter_types=query.filter_types,
+                include_fields=query.include_fields,
+                retrieve_json_payload=query.retrieve_json_payload,
+            )
+    return folder_record
 
 
 async def get_last_updated_entry(
@@ -712,19 +1132,21 @@ async def get_last_updated_entry(
     return records[0] if records else None
 
 
-async def get_entry_attachments(
-    subpath: str,
-    attachments_path: Path,
-    branch_name: str | None = None,
-    filter_types: list | None = None,
-    include_fields: list | None = None,
-    filter_shortnames: list | None = None,
-    retrieve_json_payload: bool = False,
-) -> dict:
-    if not attachments_path.is_dir():
-        return {}
+def _attachment_meta_files(attachments_path: Path) -> list[tuple[str, str, str]]:
+    """(resource_type, shortname, meta file path) of each attachment under attachments_path"""
+    manifest_entries = subpath_manifest.read_attachments_entries(attachments_path)
+    if manifest_entries is not None:
+        return [
+            (
+                item["resource_type"],
+                item["shortname"],
+                f"{attachments_path}/attachments.{item['resource_type']}/meta.{item['shortname']}.json",
+            )
+            for item in manifest_entries.values()
+        ]
+
+    meta_files: list[tuple[str, str, str]] = []
     attachments_iterator = os.scandir(attachments_path)
-    attachments_dict: dict[str, list] = {}
     for attachment_entry in attachments_iterator:
         # TODO: Filter types on the parent attachment type folder layer
         if not attachment_entry.is_dir():
@@ -735,54 +1157,87 @@ async def get_entry_attachments(
             match = regex.ATTACHMENT_PATTERN.search(str(attachments_file.path))
             if not match or not attachments_file.is_file():
                 continue
+            meta_files.append((match.group(1).lower(), match.group(2), attachments_file.path))
+        attachments_files.close()
+    attachments_iterator.close()
+    return meta_files
 
-            attach_shortname = match.group(2)
-            attach_resource_name = match.group(1).lower()
-            if filter_shortnames and attach_shortname not in filter_shortnames:
-                continue
 
-            if filter_types and ResourceType(attach_resource_name) not in filter_types:
-                continue
+def _read_attachment_meta_files(
+    attachments_path: Path,
+    filter_types: list | None,
+    filter_shortnames: list | None,
+) -> list[tuple[str, str, str, bytes]]:
+    """(resource_type, shortname, meta file path, meta content) of the matching attachments"""
+    attachments_meta: list[tuple[str, str, str, bytes]] = []
+    for attach_resource_name, attach_shortname, attachments_file in _attachment_meta_files(
+        attachments_path
+    ):
+        if filter_shortnames and attach_shortname not in filter_shortnames:
+            continue
 
-            resource_class = getattr(
-                sys.modules["models.core"], camel_case(attach_resource_name)
+        if filter_types and ResourceType(attach_resource_name) not in filter_types:
+            continue
+
+        with open(attachments_file, "rb") as meta_file:
+            attachments_meta.append(
+                (attach_resource_name, attach_shortname, attachments_file, meta_file.read())
             )
-            resource_obj = None
-            async with aiofiles.open(attachments_file, "r") as meta_file:
-                try:
-                    resource_obj = resource_class.model_validate_json(await meta_file.read())
-                except Exception as e:
-                    raise Exception(
-                        f"Bad attachment ... {attachments_file=}") from e
-
-            resource_record_obj = resource_obj.to_record(
-                subpath, attach_shortname, include_fields, branch_name
+    return attachments_meta
+
+
+async def get_entry_attachments(
+    subpath: str,
+    attachments_path: Path,
+    branch_name: str | None = None,
+    filter_types: list | None = None,
+    include_fields: list | None = None,
+    filter_shortnames: list | None = None,
+    retrieve_json_payload: bool = False,
+) -> dict:
+    if not attachments_path.is_dir():
+        return {}
+    attachments_dict: dict[str, list] = {}
+    attachments_meta = await io_executor.run(
+        _read_attachment_meta_files, attachments_path, filter_types, filter_shortnames
+    )
+    for attach_resource_name, attach_shortname, attachments_file, meta_content in attachments_meta:
+        resource_class = getattr(
+            sys.modules["models.core"], camel_case(attach_resource_name)
+        )
+        resource_obj = None
+        try:
+            resource_obj = storage_codec.load_model(resource_class, meta_content)
+        except Exception as e:
+            raise Exception(
+                f"Bad attachment ... {attachments_file=}") from e
+
+        resource_record_obj = resource_obj.to_record(
+            subpath, attach_shortname, include_fields, branch_name
+        )
+        attachment_entry_path = os.path.dirname(attachments_file)
+        if (
+            retrieve_json_payload
+            and resource_obj
+            and resource_record_obj
+            and resource_obj.payload
+            and resource_obj.payload.content_type
+            and resource_obj.payload.content_type == ContentType.json
+            and Path(
+                f"{attachment_entry_path}/{resource_obj.payload.body}"
+            ).is_file()
+        ):
+            resource_record_obj.attributes["payload"].body = storage_codec.loads(
+                await io_executor.read_bytes(
+                    f"{attachment_entry_path}/{resource_obj.payload.body}"
+                )
             )
-            if (
-                retrieve_json_payload
-                and resource_obj
-                and resource_record_obj
-                and resource_obj.payload
-                and resource_obj.payload.content_type
-                and resource_obj.payload.content_type == ContentType.json
-                and Path(
-                    f"{attachment_entry.path}/{resource_obj.payload.body}"
-                ).is_file()
-            ):
-                async with aiofiles.open(
-                    f"{attachment_entry.path}/{resource_obj.payload.body}", "r"
-                ) as payload_file_content:
-                    resource_record_obj.attributes["payload"].body = json.loads(
-                        await payload_file_content.read()
-                    )
 
-            if attach_resource_name in attachments_dict:
-                attachments_dict[attach_resource_name].append(
-                    resource_record_obj)
-            else:
-                attachments_dict[attach_resource_name] = [resource_record_obj]
-        attachments_files.close()
-    attachments_iterator.close()
+        if attach_resource_name in attachments_dict:
+            attachments_dict[attach_resource_name].append(
+                resource_record_obj)
+        else:
+            attachments_dict[attach_resource_name] = [resource_record_obj]
 
     # SORT ALTERATION ATTACHMENTS BY ALTERATION.CREATED_AT
     for attachment_name, attachments in attachments_dict.items():
@@ -802,11 +1257,14 @@ async def get_entry_attachments(
 
 async def redis_query_aggregate(
     query: api.Query,
-    redis_query_policies: list = [],
+    redis_query_policies: list | None = None,
 ) -> list:
     if not query.aggregation_data:
         return []
 
+    if redis_query_policies is None:
+        redis_query_policies = []
+
     if len(query.filter_schema_names) > 1:
         raise api.Exception(
             status.HTTP_400_BAD_REQUEST,
@@ -815,25 +1273,7 @@ async def redis_query_aggregate(
             ),
         )
 
-    created_at_search = ""
-    if query.from_date and query.to_date:
-        created_at_search = (
-            "[" + f"{query.from_date.timestamp()} {query.to_date.timestamp()}" + "]"
-        )
-
-    elif query.from_date:
-        created_at_search = (
-            "["
-            + f"{query.from_date.timestamp()} {datetime(2199, 12, 31).timestamp()}"
-            + "]"
-        )
-
-    elif query.to_date:
-        created_at_search = (
-            "["
-            + f"{datetime(2010, 1, 1).timestamp()} {query.to_date.timestamp()}"
-            + "]"
-        )
+    created_at_search = _created_at_search(query)
 
     async with RedisServices() as redis_services:
         value = await redis_services.aggregate(
@@ -862,35 +1302,76 @@ async def redis_query_aggregate(
             return []
 
 
-async def redis_query_search(
-    query: api.Query, user_shortname: str, redis_query_policies: list = []
-) -> tuple:
-    search_res: list = []
-    total = 0
-
-    if not query.filter_schema_names:
-        query.filter_schema_names = ["meta"]
-
-    created_at_search = ""
-
+def _created_at_search(query: api.Query) -> str:
     if query.from_date and query.to_date:
-        created_at_search = (
+        return (
             "[" + f"{query.from_date.timestamp()} {query.to_date.timestamp()}" + "]"
         )
 
     elif query.from_date:
-        created_at_search = (
+        return (
             "["
             + f"{query.from_date.timestamp()} {datetime(2199, 12, 31).timestamp()}"
             + "]"
         )
 
     elif query.to_date:
-        created_at_search = (
+        return (
             "["
             + f"{datetime(2010, 1, 1).timestamp()} {query.to_date.timestamp()}"
             + "]"
         )
+    return ""
+
+
+async def _search_schemas(
+    redis_services: RedisServices,
+    query: api.Query,
+    user_shortname: str,
+    redis_query_policies: list,
+    pages: list[tuple[int, int]],
+    search_clause: str = "",
+    sort_by: str | None = None,
+) -> list[dict]:
+    """Search the index of each of query.filter_schema_names concurrently,
+    each at its own (offset, limit) page, sorted by sort_by if given instead of query.sort_by"""
+    created_at_search = _created_at_search(query)
+    return list(await asyncio.gather(*(
+        redis_services.search(
+            space_name=query.space_name,
+            branch_name=query.branch_name,
+            schema_name=schema_name,
+            search=str(query.search) + search_clause,
+            filters={
+                "resource_type": query.filter_types or [],
+                "shortname": query.filter_shortnames or [],
+                "tags": query.filter_tags or [],
+                "subpath": [query.subpath],
+                "query_policies": redis_query_policies,
+                "user_shortname": user_shortname,
+                "created_at": created_at_search,
+            },
+            exact_subpath=query.exact_subpath,
+            limit=limit,
+            offset=offset,
+            highlight_fields=list(query.highlight_fields.keys()),
+            sort_by=sort_by or query.sort_by,
+            sort_type=query.sort_type or api.SortType.ascending,
+        )
+        for schema_name, (offset, limit) in zip(query.filter_schema_names, pages)
+    )))
+
+
+async def redis_query_search(
+    query: api.Query, user_shortname: str, redis_query_policies: list | None = None
+) -> tuple:
+    search_res: list = []
+    total = 0
+    if redis_query_policies is None:
+        redis_query_policies = []
+
+    if not query.filter_schema_names:
+        query.filter_schema_names = ["meta"]
 
     limit = query.limit
     offset = query.offset
@@ -899,33 +1380,228 @@ async def redis_query_search(
         offset = 0
 
     async with RedisServices() as redis_services:
-        for schema_name in query.filter_schema_names:
-            redis_res = await redis_services.search(
-                space_name=query.space_name,
-                branch_name=query.branch_name,
-                schema_name=schema_name,
-                search=str(query.search),
-                filters={
-                    "resource_type": query.filter_types or [],
-                    "shortname": query.filter_shortnames or [],
-                    "tags": query.filter_tags or [],
-                    "subpath": [query.subpath],
-                    "query_policies": redis_query_policies,
-                    "user_shortname": user_shortname,
-                    "created_at": created_at_search,
-                },
-                exact_subpath=query.exact_subpath,
-                limit=limit,
-                offset=offset,
-                highlight_fields=list(query.highlight_fields.keys()),
-                sort_by=query.sort_by,
-                sort_type=query.sort_type or api.SortType.ascending,
+        redis_results = await _search_schemas(
+            redis_services,
+            query,
+            user_shortname,
+            redis_query_policies,
+            [(offset, limit)] * len(query.filter_schema_names),
+        )
+    for redis_res in redis_results:
+        if redis_res:
+            search_res.extend(redis_res["data"])
+            total += redis_res["total"]
+    return search_res, total
+
+
+def _is_numeric(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _decoded_docs(redis_res: dict) -> list[dict]:
+    return [json.loads(redis_document) for redis_document in redis_res.get("data", [])]
+
+
+async def _search_keyset_page(
+    query: api.Query,
+    position: dict[str, Any] | None,
+    search_at: Callable[[str, int, int, str | None], Awaitable[dict | None]],
+    offset: int,
+) -> tuple[list[dict], int, dict[str, Any] | None] | None:
+    """A search page at position, with its total and the position of the next page,
+    searching with search_at(clause, offset, limit, sort_by), the first page at offset.
+    None if a search failed
+
+    Sorted on a numeric field, the rows of a same value are ordered by shortname, and a
+    keyset position holds the value and shortname the previous page ended on, the count
+    of that value's rows it returned and of the rows before that value. The next page
+    then resumes within the rows of that value, and past them, instead of paging past
+    all the previous rows. Other sorts go by offset, the index having no range queries
+    on text or tag fields.
+    """
+    sort_by = str(query.sort_by)
+    if not (position and "after" in position):
+        offset = position["offset"] if position else offset
+        redis_res = await search_at("", offset, query.limit, None)
+        if not redis_res:
+            return None
+        docs = _decoded_docs(redis_res)
+        total = redis_res["total"]
+        return await _settle_last_value(query, docs, total, offset, 0, search_at, offset == 0)
+
+    after_value, after_shortname = position["after"]
+    descending = query.sort_type == api.SortType.descending
+    tie_res, rest_res = await asyncio.gather(
+        search_at(
+            f" @{sort_by}:[{after_value} {after_value}]", position["ties"], query.limit, "shortname"
+        ),
+        search_at(
+            f" @{sort_by}:[-inf ({after_value}]" if descending else f" @{sort_by}:[({after_value} +inf]",
+            0,
+            query.limit,
+            None,
+        ),
+    )
+    if not tie_res or not rest_res:
+        return None
+    tie_docs = _decoded_docs(tie_res)
+    before = position["before"] + tie_res["total"]
+    total = before + rest_res["total"]
+    if len(tie_docs) == query.limit:
+        # Still within the rows of the value the previous page ended on
+        ties = position["ties"] + len(tie_docs)
+        next_position = None
+        if position["before"] + ties < total:
+            next_position = {
+                "after": [after_value, tie_docs[-1]["shortname"]],
+                "ties": ties,
+                "before": position["before"],
+            }
+        return _after_shortname(tie_docs, after_shortname, descending), total, next_position
+
+    rest_docs, _, next_position = await _settle_last_value(
+        query, _decoded_docs(rest_res)[: query.limit - len(tie_docs)], total, 0, before, search_at, True
+    )
+    return _after_shortname(tie_docs, after_shortname, descending) + rest_docs, total, next_position
+
+
+def _after_shortname(docs: list[dict], shortname: str, descending: bool) -> list[dict]:
+    """The rows of a same value that come after shortname, leaving out any added before
+    it since the previous page"""
+    return [doc for doc in docs if (doc["shortname"] < shortname if descending else doc["shortname"] > shortname)]
+
+
+async def _settle_last_value(
+    query: api.Query,
+    docs: list[dict],
+    total: int,
+    offset: int,
+    before: int,
+    search_at: Callable[[str, int, int, str | None], Awaitable[dict | None]],
+    starts_range: bool,
+) -> tuple[list[dict], int, dict[str, Any] | None]:
+    """The docs of a page read at offset in a range of rows ranked after `before` others,
+    with the rows of the value it ends on ordered by shortname, and the next page position
+
+    starts_range tells whether the page starts at the first row of its range, otherwise
+    the rows of its only value may start on a previous page and it goes on by offset.
+    """
+    consumed = before + offset + len(docs)
+    if not docs or consumed >= total:
+        return docs, total, None
+
+    sort_by = str(query.sort_by)
+    last_value = docs[-1].get(sort_by) if query.sort_by else None
+    ties = 0
+    for doc in reversed(docs):
+        if doc.get(sort_by) != last_value:
+            break
+        ties += 1
+    if not _is_numeric(last_value) or (ties == len(docs) and not starts_range):
+        return docs, total, {"offset": consumed}
+
+    tie_res = await search_at(f" @{sort_by}:[{last_value} {last_value}]", 0, ties, "shortname")
+    tie_docs = _decoded_docs(tie_res) if tie_res else []
+    if len(tie_docs) != ties:
+        # Changed since, as ranked by the page search
+        return docs, total, {"offset": consumed}
+    return (
+        docs[: len(docs) - ties] + tie_docs,
+        total,
+        {"after": [last_value, tie_docs[-1]["shortname"]], "ties": ties, "before": consumed - ties},
+    )
+
+
+async def redis_query_search_page(
+    query: api.Query, user_shortname: str, redis_query_policies: list | None = None
+) -> tuple[list[dict], int, str | None]:
+    """A page of a search of a single schema, at query.cursor if given, along with the
+    decoded docs, the total and the cursor of the next page"""
+    position = query_cursor.decode(query)
+    async with RedisServices() as redis_services:
+        async def search_at(clause: str, offset: int, limit: int, sort_by: str | None) -> dict | None:
+            [redis_res] = await _search_schemas(
+                redis_services,
+                query,
+                user_shortname,
+                redis_query_policies or [],
+                [(offset, limit)],
+                clause,
+                sort_by,
             )
+            return redis_res
 
-            if redis_res:
-                search_res.extend(redis_res["data"])
-                total += redis_res["total"]
-    return search_res, total
+        page = await _search_keyset_page(query, position, search_at, query.offset)
+
+    if not page:
+        return [], 0, None
+    docs, total, next_position = page
+    return docs, total, query_cursor.encode(query, next_position) if next_position else None
+
+
+def _search_sort_key(sort_by: str):
+    def sort_key(doc: dict) -> Any:
+        if sort_by in doc:
+            return doc[sort_by]
+        if sort_by in doc.get("payload", {}):
+            return doc["payload"][sort_by]
+        return ""
+    return sort_key
+
+
+async def redis_query_search_merged(
+    query: api.Query,
+    user_shortname: str,
+    redis_query_policies: list | None = None,
+    positions: list[int] | None = None,
+) -> tuple[list[dict], int, list[int]]:
+    """A sorted page of a search over several schemas, merging the sorted results of
+    their indices, searched concurrently, and stopping at the end of the page
+
+    positions are the rows of each index consumed by the previous pages, as returned
+    by the previous call, so that each index is only searched for a page's worth of
+    rows. Without them the page starts at query.offset. Returns the decoded docs of
+    the page, the total of all the indices and the positions reached.
+    """
+    if positions is None:
+        starts = [0] * len(query.filter_schema_names)
+        skip = query.offset
+    else:
+        starts = positions
+        skip = 0
+
+    async with RedisServices() as redis_services:
+        redis_results = await _search_schemas(
+            redis_services,
+            query,
+            user_shortname,
+            redis_query_policies or [],
+            [(start, skip + query.limit) for start in starts],
+        )
+
+    total = 0
+    streams: list[list[tuple[int, dict]]] = []
+    for index, redis_res in enumerate(redis_results):
+        if redis_res:
+            total += redis_res["total"]
+        streams.append([
+            (index, json.loads(redis_document))
+            for redis_document in (redis_res or {}).get("data", [])
+        ])
+
+    sort_key = _search_sort_key(str(query.sort_by))
+    merged = list(itertools.islice(
+        heapq.merge(
+            *streams,
+            key=lambda item: sort_key(item[1]),
+            reverse=query.sort_type == api.SortType.descending,
+        ),
+        skip + query.limit,
+    ))
+    reached = list(starts)
+    for index, _ in merged:
+        reached[index] += 1
+    return [doc for _, doc in merged[skip:]], total, reached
 
 
 def is_entry_exist(
@@ -1134,11 +1810,10 @@ async def validate_subpath_data(
         folders_report.setdefault(folder_name, {})
 
         # VALIDATE FOLDER ENTRIES
-        folder_entries = os.scandir(folder.path)
+        folder_entries = sharding.entry_folders(
+            folder.path, db.is_sharded(space_name, folder_name)
+        )
         for entry in folder_entries:
-            if entry.is_file():
-                continue
-
             entry_files = os.scandir(entry)
             entry_match = None
             for file in entry_files:
@@ -1464,10 +2139,7 @@ async def generate_payload_string(
     attachments: dict[str, list] = await get_entry_attachments(
         subpath=f"{subpath}/{shortname}",
         branch_name=branch_name,
-        attachments_path=(
-            settings.spaces_folder
-            / f"{space_name}/{branch_path(branch_name)}/{subpath}/.dm/{shortname}"
-        ),
+        attachments_path=db.entry_dm_path(space_name, subpath, shortname, branch_name),
         retrieve_json_payload=True,
         include_fields=[
             "shortname",
@@ -1497,16 +2169,8 @@ async def generate_payload_string(
     return payload_string.strip(",")
 
 
-async def get_record_from_redis_doc(
-    space_name: str,
-    doc: dict,
-    retrieve_json_payload: bool = False,
-    retrieve_attachments: bool = False,
-    validate_schema: bool = False,
-    filter_types: list | None = None,
-    branch_name: str = Field(
-        default=settings.default_branch, pattern=regex.SHORTNAME),
-) -> core.Record:
+def _split_redis_doc(doc: dict) -> tuple[type[core.Meta], dict, dict]:
+    """The resource class of a redis doc, and its meta and inline payload attributes"""
     meta_doc_content = {}
     payload_doc_content = {}
     resource_class = getattr(
@@ -1519,25 +2183,89 @@ async def get_record_from_redis_doc(
             meta_doc_content[key] = value
         elif key not in RedisServices.SYS_ATTRIBUTES:
             payload_doc_content[key] = value
+    return resource_class, meta_doc_content, payload_doc_content
 
-    async with RedisServices() as redis_services:
-        # Get payload doc
-        if (
-            not payload_doc_content
-            and retrieve_json_payload
-            and "payload_doc_id" in doc
-        ):
-            payload_doc_content = await redis_services.get_payload_doc(
-                doc["payload_doc_id"], doc["resource_type"]
+
+async def get_redis_docs_extras(
+    redis_services: RedisServices,
+    space_name: str,
+    branch_name: str | None,
+    docs: list[dict],
+    retrieve_json_payload: bool,
+) -> list[tuple[dict, dict | None]]:
+    """The lock doc of each redis doc, and its payload when not inline in the doc and
+    asked for (None otherwise), all read with a single JSON.MGET"""
+    lock_docs_ids = [
+        redis_services.generate_doc_id(
+            space_name, branch_name, "lock", doc["shortname"], doc["subpath"]
+        )
+        for doc in docs
+    ]
+    payload_docs_ids = [
+        doc.get("payload_doc_id")
+        if retrieve_json_payload and not _split_redis_doc(doc)[2]
+        else None
+        for doc in docs
+    ]
+    found_docs = await redis_services.get_docs_map(
+        lock_docs_ids + [doc_id for doc_id in payload_docs_ids if doc_id]
+    )
+    return [
+        (
+            found_docs.get(lock_doc_id, {}),
+            redis_services.payload_doc_content(
+                found_docs.get(payload_doc_id), doc["resource_type"]
             )
+            if payload_doc_id
+            else None,
+        )
+        for doc, lock_doc_id, payload_doc_id in zip(docs, lock_docs_ids, payload_docs_ids)
+    ]
 
-        # Get lock data
-        locked_data = await redis_services.get_lock_doc(
-            space_name,
-            branch_name,
-            doc["subpath"],
-            doc["shortname"],
+
+async def _query_doc_record(
+    query: api.Query, doc: dict, doc_extras: tuple[dict, dict | None]
+) -> core.Record | None:
+    """The record of a doc found for the query, None if it fails the schema validation"""
+    try:
+        return await get_record_from_redis_doc(
+            space_name=query.space_name,
+            branch_name=query.branch_name,
+            doc=doc,
+            retrieve_json_payload=query.retrieve_json_payload,
+            retrieve_attachments=query.retrieve_attachments,
+            validate_schema=query.validate_schema,
+            filter_types=query.filter_types,
+            doc_extras=doc_extras,
         )
+    except Exception:
+        # Incase of schema validation error
+        return None
+
+
+async def get_record_from_redis_doc(
+    space_name: str,
+    doc: dict,
+    retrieve_json_payload: bool = False,
+    retrieve_attachments: bool = False,
+    validate_schema: bool = False,
+    filter_types: list | None = None,
+    branch_name: str = Field(
+        default=settings.default_branch, pattern=regex.SHORTNAME),
+    doc_extras: tuple[dict, dict | None] | None = None,
+) -> core.Record:
+    """doc_extras are the lock doc and payload of the doc from get_redis_docs_extras,
+    read here if not given"""
+    resource_class, meta_doc_content, payload_doc_content = _split_redis_doc(doc)
+
+    if doc_extras is None:
+        async with RedisServices() as redis_services:
+            [doc_extras] = await get_redis_docs_extras(
+                redis_services, space_name, branch_name, [doc], retrieve_json_payload
+            )
+    locked_data, fetched_payload = doc_extras
+    if fetched_payload is not None:
+        payload_doc_content = fetched_payload
 
     meta_doc_content["created_at"] = datetime.fromtimestamp(
         meta_doc_content["created_at"]
@@ -1557,9 +2285,8 @@ async def get_record_from_redis_doc(
         resource_base_record.attributes["locked"] = locked_data
 
     # Get attachments
-    entry_path = (
-        settings.spaces_folder
-        / f"{space_name}/{branch_path(doc['branch_name'])}/{doc['subpath']}/.dm/{meta_doc_content['shortname']}"
+    entry_path = db.entry_dm_path(
+        space_name, doc["subpath"], meta_doc_content["shortname"], doc["branch_name"]
     )
     if retrieve_attachments and entry_path.is_dir():
         resource_base_record.attachments = await get_entry_attachments(
@@ -64,6 +64,24 @@ class Settings(BaseSettings):
     ldap_root_dn: str = ""
     ldap_pass: str = ""
     max_query_limit: int = 10000
+    meta_cache_size: int = 10000  # Max parsed meta files kept in memory, 0 to disable
+    subpath_manifest_enabled: bool = False  # Maintain .dm/manifest.jsonl listings per subpath
+    subpath_manifest_verify_interval: int = 60  # Seconds after which a manifest is checked against its files again
+    fsync_writes: bool = False  # Make meta, payload, history and events writes durable
+    group_commit_window_ms: int = 5  # Window within which the fsyncs of concurrent writes are batched
+    io_workers: int = 16  # Threads of the dedicated file I/O executor
+    bulk_import_batch_size: int = 1000  # Records created together per CSV import batch
+    upload_chunk_size: int = 1024 * 1024  # Bytes of an uploaded payload held in memory at a time
+    events_segment_size: int = 64 * 1024 * 1024  # Events log segments roll over daily or past this many bytes
+    compression_level: int = 3  # zstd level of compressed payloads and archived history logs
+    query_stream_chunk_size: int = 500  # Records served at a time by streamed (NDJSON) queries
+    query_cache_size: int = 1000  # Query results cached in memory per worker, 0 to disable
+    query_cache_ttl: int = 30  # Seconds a cached query result is served for at most
+    query_cache_max_records: int = 1000  # Query results with more records aren't cached
+    reindex_chunk_size: int = 1000  # Entries parsed per task while reindexing
+    reindex_pipeline_size: int = 500  # Docs written per Redis pipeline while reindexing
+    reindex_workers: int = 0  # Processes parsing entries while reindexing, 0 for one per CPU
+    index_build_timeout: int = 600  # Seconds a rebuilt index may take to index the docs before its swap
     session_inactivity_ttl: int = 60 * 10
 
     google_client_id: str = ""
@@ -0,0 +1,51 @@
+""" Fan-out layout of the entries of large subpaths
+
+The folder of an entry (its meta, history and attachments) normally sits right
+under the .dm folder of its subpath. The subpaths a space lists in
+Space.sharded_subpaths spread these folders over two levels of fan-out folders
+named after the sha1 of the shortname instead, .dm/ab/cd/{shortname}, so that
+no folder ends up with millions of children.
+"""
+
+import hashlib
+import os
+from collections.abc import Iterator
+from pathlib import Path
+
+SHARD_LEVELS = 2
+
+
+def subpath_key(subpath: str) -> str:
+    """Normalized form of a subpath, as listed in Space.sharded_subpaths"""
+    return "/".join(part for part in subpath.split("/") if part not in ("", "."))
+
+
+def shard_of(shortname: str) -> str:
+    digest = hashlib.sha1(shortname.encode()).hexdigest()
+    return "/".join(digest[level * 2: level * 2 + 2] for level in range(SHARD_LEVELS))
+
+
+def entry_folder(dm_path: Path, shortname: str, sharded: bool) -> Path:
+    if sharded:
+        return dm_path / shard_of(shortname) / shortname
+    return dm_path / shortname
+
+
+def _sub_folders(path: str) -> Iterator[os.DirEntry[str]]:
+    with os.scandir(path) as iterator:
+        for one in iterator:
+            if one.is_dir():
+                yield one
+
+
+def _entry_folders(path: str, levels: int) -> Iterator[os.DirEntry[str]]:
+    for one in _sub_folders(path):
+        if levels:
+            yield from _entry_folders(one.path, levels - 1)
+        else:
+            yield one
+
+
+def entry_folders(dm_path: Path | str, sharded: bool) -> Iterator[os.DirEntry[str]]:
+    """Lazily iterate the entry folders under a subpath's .dm folder, one fan-out folder at a time"""
+    return _entry_folders(str(dm_path), SHARD_LEVELS if sharded else 0)
@@ -0,0 +1,125 @@
+""" On-disk encoding of meta and payload files
+
+JSON stays the default. A space can opt into a compact binary codec
+(Space.storage_codec), its files then start with a version header,
+MAGIC followed by one byte naming the codec, so readers decode any file
+transparently whatever the space setting was when it got written.
+
+Large payloads can also be zstd compressed (Space.compression_threshold),
+compressed content starts with COMPRESSED_MAGIC and wraps any of the above.
+"""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, TypeVar
+
+import msgpack  # type: ignore
+import zstandard
+from pydantic import BaseModel
+
+from models.enums import StorageCodec
+from utils.settings import settings
+
+MAGIC = b"DMC1"
+COMPRESSED_MAGIC = b"DMZ1"
+
+_CODEC_IDS: dict[StorageCodec, bytes] = {
+    StorageCodec.msgpack: b"m",
+}
+
+ModelChild = TypeVar("ModelChild", bound=BaseModel)
+
+# Raised when decoding invalid or corrupted stored data
+DECODE_ERRORS: tuple[type[Exception], ...] = (ValueError, zstandard.ZstdError, msgpack.UnpackException)
+
+
+def is_encoded(raw: str | bytes) -> bool:
+    """Whether raw isn't plain JSON"""
+    return isinstance(raw, bytes) and raw[: len(MAGIC)] in (MAGIC, COMPRESSED_MAGIC)
+
+
+def is_compressed(raw: str | bytes) -> bool:
+    return isinstance(raw, bytes) and raw[: len(COMPRESSED_MAGIC)] == COMPRESSED_MAGIC
+
+
+def compress(raw: str | bytes) -> bytes:
+    if isinstance(raw, str):
+        raw = raw.encode()
+    compressor = zstandard.ZstdCompressor(level=settings.compression_level)
+    return COMPRESSED_MAGIC + compressor.compress(raw)
+
+
+def decompress(raw: bytes) -> bytes:
+    if not is_compressed(raw):
+        return raw
+    return zstandard.ZstdDecompressor().decompress(raw[len(COMPRESSED_MAGIC):])
+
+
+def _encode(data: Any, codec: StorageCodec) -> bytes:
+    match codec:
+        case StorageCodec.msgpack:
+            packed = msgpack.packb(data, use_bin_type=True)
+            # Only None with an autoreset=False Packer
+            assert isinstance(packed, bytes)
+            return MAGIC + _CODEC_IDS[codec] + packed
+    raise ValueError(f"Unsupported storage codec {codec}")
+
+
+def dumps(data: Any, codec: StorageCodec = StorageCodec.json) -> str | bytes:
+    """Serialize JSON compatible data"""
+    if codec == StorageCodec.json:
+        return json.dumps(data)
+    return _encode(data, codec)
+
+
+def loads(raw: str | bytes) -> Any:
+    """Deserialize data written by dumps with any codec"""
+    if not is_encoded(raw):
+        return json.loads(raw)
+
+    assert isinstance(raw, bytes)
+    if is_compressed(raw):
+        return loads(decompress(raw))
+    codec_id = raw[len(MAGIC): len(MAGIC) + 1]
+    body = raw[len(MAGIC) + 1:]
+    if codec_id == _CODEC_IDS[StorageCodec.msgpack]:
+        return msgpack.unpackb(body, raw=False)
+    raise ValueError(f"Unknown storage codec id {codec_id!r}")
+
+
+def dump_model(model: BaseModel, codec: StorageCodec = StorageCodec.json) -> str | bytes:
+    if codec == StorageCodec.json:
+        return model.model_dump_json(exclude_none=True)
+    return _encode(model.model_dump(mode="json", exclude_none=True), codec)
+
+
+def load_model(class_type: type[ModelChild], raw: str | bytes) -> ModelChild:
+    if isinstance(raw, bytes) and is_compressed(raw):
+        raw = decompress(raw)
+    if not is_encoded(raw):
+        return class_type.model_validate_json(raw)
+    return class_type.model_validate(loads(raw))
+
+
+def is_encoded_file(file_path) -> bool:
+    with open(file_path, "rb") as opened_file:
+        return opened_file.read(len(MAGIC)) in (MAGIC, COMPRESSED_MAGIC)
+
+
+def compress_file(src_path: Path, dest_path: Path):
+    """zstd compress src_path into dest_path (a standard .zst file, without header)"""
+    tmp_path = dest_path.with_name(f".{dest_path.name}.{os.getpid()}.tmp")
+    compressor = zstandard.ZstdCompressor(level=settings.compression_level)
+    with open(src_path, "rb") as src, open(tmp_path, "wb") as dest:
+        compressor.copy_stream(src, dest)
+    shutil.copystat(src_path, tmp_path)
+    os.replace(tmp_path, dest_path)
+
+
+def decompress_file(src_path: Path, dest_path: Path):
+    tmp_path = dest_path.with_name(f".{dest_path.name}.{os.getpid()}.tmp")
+    with open(src_path, "rb") as src, open(tmp_path, "wb") as dest:
+        zstandard.ZstdDecompressor().copy_stream(src, dest)
+    os.replace(tmp_path, dest_path)
@@ -0,0 +1,402 @@
+""" Per-subpath directory manifest
+
+A compact sidecar index (.dm/manifest.jsonl) that lists the entries of a subpath
+(or the attachments of an entry) along with the attributes needed to filter, sort
+and check access on them, so listings don't have to walk and parse every meta file.
+
+The file is append-only, each line is either an entry:
+    {"shortname", "resource_type", "created_at", "updated_at", "is_active",
+     "owner_shortname", "owner_group_shortname", "tags", "mtime"}
+a removal marker:
+    {"shortname", "resource_type", "deleted": true}
+or the signature of the listed folders (their mtimes) as last seen:
+    {"signature": [...]}
+and it gets compacted once the stale lines outweigh the live ones.
+
+Files can change behind the server's back (git pull, rsync, manual edits): a
+manifest whose folders no longer match its signature, or that wasn't checked for
+settings.subpath_manifest_verify_interval seconds, is verified against the files,
+re-parsing only the meta files whose mtime changed. Writes to a manifest are
+serialized across processes with a lock file, and run on the I/O executor.
+"""
+
+import fcntl
+import json
+import os
+import sys
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from fastapi.logger import logger
+
+from models import core
+from utils import io_executor, sharding, storage_codec
+from utils.helpers import camel_case, snake_case
+from utils.regex import ATTACHMENT_PATTERN, FILE_PATTERN, FOLDER_PATTERN
+from utils.settings import settings
+
+MANIFEST_FILENAME = "manifest.jsonl"
+LOCK_FILENAME = ".manifest.lock"
+
+# Query sort keys that can be served straight from the manifest
+SORT_KEYS = ("shortname", "created_at", "updated_at")
+
+_META_FILE_ERRORS: tuple[type[Exception], ...] = (OSError, *storage_codec.DECODE_ERRORS)
+
+
+class _Manifest(NamedTuple):
+    mtime_ns: int
+    size: int
+    lines_count: int
+    entries: dict[str, dict[str, Any]]
+    signature: list[int] | None
+    # time.monotonic() of the last check against the files, by this process
+    verified_at: float
+
+
+# Parsed manifests keyed by their path. The entries are never changed in place,
+# an update replaces them, so that they can be iterated while being updated
+_manifests: dict[str, _Manifest] = {}
+
+
+def _cache_key(file_path: Path) -> str:
+    return os.path.normpath(file_path)
+
+
+def entry_key(resource_type: str, shortname: str) -> str:
+    return f"{resource_type}/{shortname}"
+
+
+def manifest_entry(meta: core.Meta, mtime_ns: int | None = None) -> dict[str, Any]:
+    return {
+        "shortname": meta.shortname,
+        "resource_type": snake_case(type(meta).__name__),
+        "created_at": meta.created_at.timestamp(),
+        "updated_at": meta.updated_at.timestamp(),
+        "is_active": meta.is_active,
+        "owner_shortname": meta.owner_shortname,
+        "owner_group_shortname": meta.owner_group_shortname,
+        "tags": meta.tags,
+        "mtime": mtime_ns,
+    }
+
+
+def _fold_lines(content: str) -> tuple[int, dict[str, dict[str, Any]], list[int] | None]:
+    entries: dict[str, dict[str, Any]] = {}
+    signature = None
+    lines_count = 0
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        lines_count += 1
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            # A partially written line, the next compaction drops it
+            continue
+        if "signature" in item:
+            signature = item["signature"]
+            continue
+        key = entry_key(item["resource_type"], item["shortname"])
+        if item.get("deleted"):
+            entries.pop(key, None)
+        else:
+            entries[key] = item
+    return lines_count, entries, signature
+
+
+def read(dm_path: Path) -> _Manifest | None:
+    """Return the manifest stored under dm_path, None if it was not built"""
+    file_path = dm_path / MANIFEST_FILENAME
+    try:
+        stat = os.stat(file_path)
+    except (FileNotFoundError, NotADirectoryError):
+        _manifests.pop(_cache_key(file_path), None)
+        return None
+
+    cached = _manifests.get(_cache_key(file_path))
+    if cached and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+        return cached
+
+    lines_count, entries, signature = _fold_lines(file_path.read_text())
+    manifest = _Manifest(
+        stat.st_mtime_ns,
+        stat.st_size,
+        lines_count,
+        entries,
+        signature,
+        cached.verified_at if cached else 0.0,
+    )
+    _manifests[_cache_key(file_path)] = manifest
+    return manifest
+
+
+@contextmanager
+def _locked(dm_path: Path) -> Iterator[None]:
+    """Hold the lock of the manifest under dm_path, against other threads and processes"""
+    with open(dm_path / LOCK_FILENAME, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _signature_folders(dm_path: Path) -> list[Path]:
+    """The folders whose mtime changes when an entry listed by the manifest is added or removed"""
+    if dm_path.name == ".dm":
+        # A subpath's manifest: its entry folders and its sub folders
+        return [dm_path, dm_path.parent]
+    # An entry's attachments manifest
+    return [dm_path, *sorted(one for one in dm_path.glob("attachments.*") if one.is_dir())]
+
+
+def _signature(dm_path: Path) -> list[int]:
+    mtimes = []
+    for path in _signature_folders(dm_path):
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except (FileNotFoundError, NotADirectoryError):
+            mtimes.append(0)
+    return mtimes
+
+
+def _write(
+    dm_path: Path,
+    entries: dict[str, dict[str, Any]],
+    signature: list[int] | None,
+    verified_at: float,
+):
+    """Rewrite the manifest, to be called holding its lock"""
+    file_path = dm_path / MANIFEST_FILENAME
+    tmp_path = dm_path / f".{MANIFEST_FILENAME}.{os.getpid()}.tmp"
+    lines = [json.dumps(one) for one in entries.values()]
+    # Replacing the file changes the mtime of its folder, part of the signature. Unless the
+    # folders changed since the signature was taken, the one to record is the one after it
+    unchanged = signature is not None and _signature(dm_path) == signature
+    tmp_path.write_text("".join(f"{line}\n" for line in lines))
+    os.replace(tmp_path, file_path)
+    if signature is not None:
+        if unchanged:
+            signature = _signature(dm_path)
+        lines.append(json.dumps({"signature": signature}))
+        with open(file_path, "a") as manifest_file:
+            manifest_file.write(f"{lines[-1]}\n")
+    stat = os.stat(file_path)
+    _manifests[_cache_key(file_path)] = _Manifest(
+        stat.st_mtime_ns, stat.st_size, len(lines), entries, signature, verified_at
+    )
+
+
+def _append(dm_path: Path, item: dict[str, Any]):
+    if not dm_path.is_dir():
+        return
+
+    with _locked(dm_path):
+        manifest = read(dm_path)
+        if manifest is None:
+            # Not built yet, it will be generated from the files on first use
+            return
+
+        key = entry_key(item["resource_type"], item["shortname"])
+        entries = dict(manifest.entries)
+        if item.get("deleted"):
+            if key not in entries:
+                return
+            entries.pop(key, None)
+        else:
+            entries[key] = item
+
+        # The folders changed along with the entry
+        signature = _signature(dm_path)
+        lines = [item]
+        if signature != manifest.signature:
+            lines.append({"signature": signature})
+        lines_count = manifest.lines_count + len(lines)
+        if lines_count > 2 * len(entries) + 100:
+            _write(dm_path, entries, signature, manifest.verified_at)
+            return
+
+        file_path = dm_path / MANIFEST_FILENAME
+        with open(file_path, "a") as manifest_file:
+            manifest_file.write("".join(f"{json.dumps(line)}\n" for line in lines))
+        stat = os.stat(file_path)
+        _manifests[_cache_key(file_path)] = manifest._replace(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            lines_count=lines_count,
+            entries=entries,
+            signature=signature,
+        )
+
+
+async def upsert(dm_path: Path, meta: core.Meta, meta_file: Path | None = None):
+    """Record the meta (whose file is meta_file, if known) in the manifest under dm_path"""
+    if not settings.subpath_manifest_enabled:
+        await io_executor.run(discard, dm_path)
+        return
+    await io_executor.run(_upsert, dm_path, meta, meta_file)
+
+
+def _upsert(dm_path: Path, meta: core.Meta, meta_file: Path | None):
+    mtime_ns = None
+    if meta_file:
+        try:
+            mtime_ns = os.stat(meta_file).st_mtime_ns
+        except FileNotFoundError:
+            pass
+    _append(dm_path, manifest_entry(meta, mtime_ns))
+
+
+async def remove(dm_path: Path, resource_type: str, shortname: str):
+    if not settings.subpath_manifest_enabled:
+        await io_executor.run(discard, dm_path)
+        return
+    await io_executor.run(
+        _append,
+        dm_path,
+        {"shortname": shortname, "resource_type": resource_type, "deleted": True},
+    )
+
+
+def discard(dm_path: Path):
+    """Drop the manifest so it gets rebuilt from the files when it's used again"""
+    file_path = dm_path / MANIFEST_FILENAME
+    _manifests.pop(_cache_key(file_path), None)
+    if file_path.is_file():
+        os.remove(file_path)
+
+
+def _load_meta_file(file_path: str, resource_type: str) -> core.Meta | None:
+    resource_class = getattr(sys.modules["models.core"], camel_case(resource_type), None)
+    if not resource_class:
+        return None
+    try:
+        with open(file_path, "rb") as meta_file:
+            meta: core.Meta = storage_codec.load_model(resource_class, meta_file.read())
+            return meta
+    except _META_FILE_ERRORS as e:
+        logger.warning(f"Invalid meta file {file_path} left out of its manifest: {e}")
+        return None
+
+
+def _subpath_meta_files(subpath_path: Path, sharded: bool) -> Iterator[tuple[str, str, str]]:
+    """(resource_type, shortname, meta file path) of the entries and the sub folders of a subpath"""
+    dm_path = subpath_path / ".dm"
+    if dm_path.is_dir():
+        for entry in sharding.entry_folders(dm_path, sharded):
+            with os.scandir(entry) as entry_iterator:
+                for one in entry_iterator:
+                    match = FILE_PATTERN.search(one.path)
+                    if match and one.is_file():
+                        yield match.group(2).lower(), match.group(1), one.path
+
+    if subpath_path.is_dir():
+        with os.scandir(subpath_path) as subfolders_iterator:
+            for one in subfolders_iterator:
+                if not one.is_dir():
+                    continue
+                folder_meta = f"{one.path}/.dm/meta.folder.json"
+                match = FOLDER_PATTERN.search(folder_meta)
+                if match and os.path.isfile(folder_meta):
+                    yield "folder", match.group(1), folder_meta
+
+
+def _attachments_meta_files(entry_path: Path) -> Iterator[tuple[str, str, str]]:
+    """(resource_type, shortname, meta file path) of the attachments of an entry (.dm/{shortname})"""
+    if not entry_path.is_dir():
+        return
+
+    with os.scandir(entry_path) as attachments_iterator:
+        for attachment_entry in attachments_iterator:
+            if not attachment_entry.is_dir():
+                continue
+            with os.scandir(attachment_entry) as attachment_files:
+                for one in attachment_files:
+                    match = ATTACHMENT_PATTERN.search(one.path)
+                    if match and one.is_file():
+                        yield match.group(1).lower(), match.group(2), one.path
+
+
+def _scan(
+    entries: dict[str, dict[str, Any]], meta_files: Iterator[tuple[str, str, str]]
+) -> tuple[dict[str, dict[str, Any]], bool]:
+    """The entries of the meta files, re-parsing only the ones whose mtime doesn't match
+    the given entries. Returns them along with whether they differ from the given ones"""
+    scanned: dict[str, dict[str, Any]] = {}
+    changed = False
+    for resource_type, shortname, file_path in meta_files:
+        key = entry_key(resource_type, shortname)
+        try:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        item = entries.get(key)
+        if not item or item.get("mtime") != mtime_ns:
+            meta = _load_meta_file(file_path, resource_type)
+            if not meta:
+                continue
+            item = manifest_entry(meta, mtime_ns)
+            item["shortname"] = shortname
+            changed = True
+        scanned[key] = item
+    return scanned, changed or len(scanned) != len(entries)
+
+
+def _entries(dm_path: Path, meta_files: Iterator[tuple[str, str, str]]) -> dict[str, dict[str, Any]]:
+    """The entries of the manifest under dm_path, built or verified against the files if due"""
+    manifest = read(dm_path)
+    if (
+        manifest
+        and manifest.signature == _signature(dm_path)
+        and time.monotonic() - manifest.verified_at < settings.subpath_manifest_verify_interval
+    ):
+        return manifest.entries
+
+    with _locked(dm_path):
+        manifest = read(dm_path)
+        # Taken before the scan, a change made during it is caught by the next check
+        signature = _signature(dm_path)
+        entries, changed = _scan(manifest.entries if manifest else {}, meta_files)
+        if manifest is None or changed or manifest.signature != signature:
+            _write(dm_path, entries, signature, time.monotonic())
+        else:
+            _manifests[_cache_key(dm_path / MANIFEST_FILENAME)] = manifest._replace(
+                verified_at=time.monotonic()
+            )
+        return entries
+
+
+def read_subpath_entries(subpath_path: Path, sharded: bool = False) -> dict[str, dict[str, Any]] | None:
+    """The manifest entries of a subpath, built on first use. None if manifests are disabled.
+    Does blocking I/O, see subpath_entries"""
+    if not settings.subpath_manifest_enabled:
+        return None
+
+    dm_path = subpath_path / ".dm"
+    meta_files = _subpath_meta_files(subpath_path, sharded)
+    if not dm_path.is_dir():
+        # Nowhere to keep a manifest, the sub folders are listed as they are
+        return _scan({}, meta_files)[0]
+    return _entries(dm_path, meta_files)
+
+
+def read_attachments_entries(entry_path: Path) -> dict[str, dict[str, Any]] | None:
+    """The manifest entries of an entry's attachments, built on first use. None if manifests are disabled.
+    Does blocking I/O, see attachments_entries"""
+    if not settings.subpath_manifest_enabled:
+        return None
+    if not entry_path.is_dir():
+        return {}
+    return _entries(entry_path, _attachments_meta_files(entry_path))
+
+
+async def subpath_entries(subpath_path: Path, sharded: bool = False) -> dict[str, dict[str, Any]] | None:
+    return await io_executor.run(read_subpath_entries, subpath_path, sharded)
+
+
+async def attachments_entries(entry_path: Path) -> dict[str, dict[str, Any]] | None:
+    return await io_executor.run(read_attachments_entries, entry_path)